@@ -1,21 +1,94 @@
 import os
 import re
+import time
 import logging
-from openai import OpenAI
-from difflib import get_close_matches
-import json  # Ensure json is imported
-
-client = OpenAI(api_key=os.environ['OPENAI_API_KEY'])
-
-# Define `build_vocab_from_memory` here
-def build_vocab_from_memory(memory):
-    """Builds a vocabulary from characters, items, and locations in memory."""
-    vocab = {}
-    for entity_type in ["characters", "items", "locations"]:
-        if entity_type in memory:
-            for name in memory[entity_type]:
-                vocab[name] = [name.lower()]
-    return vocab
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services.transport import openai_client
+from audio.llm_cache import LLMCache, prompt_key, CACHE_PATH
+from audio.response_parser import MemoryUpdateParser, DecisionParser, SceneAnalysisParser
+
+# Token budget for the memory excerpt sent with each memory update
+MEMORY_CONTEXT_TOKENS = int(os.environ.get("MEMORY_CONTEXT_TOKENS", 1000))
+# Token budget for the summarized campaign history sent with each memory update
+HISTORY_CONTEXT_TOKENS = int(os.environ.get("HISTORY_CONTEXT_TOKENS", 400))
+# Token budget for earlier transcripts about the entities a segment mentions
+RECALL_CONTEXT_TOKENS = int(os.environ.get("RECALL_CONTEXT_TOKENS", 300))
+# Stream completions and stop reading as soon as the parser has what it needs
+STREAM_RESPONSES = os.environ.get("STREAM_LLM_RESPONSES", "1") != "0"
+MODEL = "gpt-3.5-turbo"
+# How each segment is analyzed:
+#   "combined"   - one request returns the memory update and the image decision
+#   "concurrent" - the memory update and image decision requests run side by side
+#   "sequential" - memory update first, then the decision on the updated memory
+ANALYSIS_MODE = os.environ.get("ANALYSIS_MODE", "combined")
+ANALYSIS_MODES = ("combined", "concurrent", "sequential")
+
+# Completions are cached on disk by prompt and memory version; LLM_CACHE=0 always asks the model
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "1") != "0"
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", CACHE_PATH)
+
+_llm_cache = None
+_llm_cache_configured = False
+_llm_cache_lock = threading.Lock()
+
+
+def set_llm_cache(path=LLM_CACHE_PATH, **options):
+    """Use the response cache at `path` (None disables caching). Extra options go to LLMCache."""
+    global _llm_cache, _llm_cache_configured
+    with _llm_cache_lock:
+        _llm_cache = LLMCache(path, **options) if path else None
+        _llm_cache_configured = True
+    return _llm_cache
+
+
+def get_llm_cache():
+    """The shared response cache, opened on first use; None when caching is off."""
+    if not _llm_cache_configured:
+        set_llm_cache(LLM_CACHE_PATH if LLM_CACHE_ENABLED else None)
+    return _llm_cache
+
+
+def complete(prompt, parser, stream=None, memory_version=None, use_cache=True):
+    """Send a chat completion and feed the reply into `parser`.
+
+    When streaming, the stream is closed as soon as `parser.done`, so no more
+    tokens are generated (or billed) once the answer is known. Replies are
+    looked up in the response cache first (unless `use_cache` is False); what
+    was read is stored under the prompt and `memory_version`, and since the
+    parsers are deterministic a cut-short reply replays to the same result.
+    Returns the text that was read.
+    """
+    cache = get_llm_cache() if use_cache else None
+    if cache is not None:
+        key = prompt_key(MODEL, prompt, memory_version)
+        cached = cache.get(key)
+        if cached is not None:
+            logging.info("LLM response cache hit")
+            parser.feed(cached)
+            return cached.strip()
+
+    stream = STREAM_RESPONSES if stream is None else stream
+    start = time.perf_counter()
+    if not stream:
+        response = openai_client().chat.completions.create(model=MODEL, messages=[{"role": "user", "content": prompt}])
+        parser.feed(response.choices[0].message.content)
+    else:
+        response = openai_client().chat.completions.create(
+            model=MODEL, messages=[{"role": "user", "content": prompt}], stream=True)
+        try:
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parser.feed(chunk.choices[0].delta.content)
+                    if parser.done:
+                        logging.info(f"Stopped reading the response after {time.perf_counter() - start:.2f}s")
+                        break
+        finally:
+            response.close()
+
+    if cache is not None:
+        cache.put(key, MODEL, parser.text)
+    return parser.text.strip()
 
 # Function to sanitize text
 def sanitize_text(text):
@@ -23,8 +96,15 @@ def sanitize_text(text):
     text = re.sub(r'[“”]', '"', text)
     return text
 
-# Unified memory function for managing characters, items, and locations
-def update_memory(transcription, memory_manager):
+def memory_update_prompt(transcription, memory_manager, decide_image=False):
+    """Build the memory-update prompt; with `decide_image` it also asks for the image decision."""
+    # Only the entities this transcription mentions, plus the most recently updated ones,
+    # are sent in full, so the prompt stays the same size as the campaign grows
+    memory_context, other_names = memory_manager.select_context(transcription, MEMORY_CONTEXT_TOKENS)
+    # Older activity is summarized in tiers, so the history has a fixed size however long the campaign
+    history = memory_manager.history.render(HISTORY_CONTEXT_TOKENS, events=False)
+    # What was said before about the entities mentioned now, word for word, from the transcript store
+    recalled = memory_manager.recall(transcription, RECALL_CONTEXT_TOKENS)
     prompt = (
         "You are managing a dynamic memory table for a Dungeons and Dragons game (DND). "
         "The memory table includes characters, items, locations, and recent activity. "
@@ -90,155 +170,169 @@ def update_memory(transcription, memory_manager):
         
         "### End of Examples ###\n\n"
         
+        + ("Story so far (for context only; do not repeat it in the recent activity):\n" + history + "\n\n"
+           if history else "") +
+        ("Earlier transcriptions mentioning these names (for context only):\n" + recalled + "\n\n"
+         if recalled else "") +
         "Here is the transcription: " + transcription + "\n\n"
-        "Here is the current memory table: " + str(memory_manager.get_memory()) + "\n\n"
+        "Here is the current memory table: " + str(memory_context) + "\n\n"
+        "Other known entities (details omitted, refer to them by exact name if they appear): "
+        + (", ".join(other_names) or "none") + "\n\n"
+        "Only include entities that are new or whose details changed; the others are kept as they are.\n\n"
         "Based on this transcription, update the memory table accordingly."
     )
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
+    if decide_image:
+        prompt += (
+            "\n\nAfter the recent activity, add one final line: 'generate image: ' followed by a one-line "
+            "image prompt for the scene, or 'no image' if the scene has not changed enough for a new picture."
         )
-        
-         # Retrieve and log the raw AI response
-        ai_response = response.choices[0].message.content.strip()
+    return prompt
+
+# Unified memory function for managing characters, items, and locations
+def update_memory(transcription, memory_manager):
+    """Ask the model for a memory update. Returns the parsed sections, or None if the request failed."""
+    prompt = memory_update_prompt(transcription, memory_manager)
+    try:
+        parser = MemoryUpdateParser()
+        ai_response = complete(prompt, parser, memory_version=memory_manager.version)
         logging.info(f"Raw AI response for memory update: {ai_response}")
 
-        # Manual parsing of the response, assuming the format remains consistent
-        updated_memory = {'characters': {}, 'items': {}, 'locations': {}, 'recent_activity_summary': []}
+        # Sections the reply did not contain stay as they are in memory
+        return parser.result()
 
-        # Parse characters
-        characters_match = re.search(r"Characters:\s*({.*?})", ai_response, re.DOTALL)
-        if characters_match:
-            characters_str = characters_match.group(1)
-            updated_memory['characters'] = eval(characters_str)  # Convert string to dictionary
+    except Exception as e:
+        logging.error(f"Error in update_memory: {e}")
+        # Not the current table: applying that again would re-add its activity window as a new event
+        return None
 
-        # Parse items
-        items_match = re.search(r"Items:\s*({.*?})", ai_response, re.DOTALL)
-        if items_match:
-            items_str = items_match.group(1)
-            updated_memory['items'] = eval(items_str)
+def image_decision_prompt(transcription, scene_memory):
+    return (
+        "You are an AI art companion for a Dungeons and Dragons game. "
+        "Please generate a detailed scene based on recent transcription and memory details:\n\n"
+        f"Recent Transcription: {transcription}\n\n"
+        f"Characters:\n{str(scene_memory['characters'])}\n\n"
+        f"Items:\n{str(scene_memory['items'])}\n\n"
+        f"Locations:\n{str(scene_memory['locations'])}\n\n"
+        "Respond with either 'generate image: ' followed by a one-line image prompt for the scene, "
+        "or 'no image' if the scene has not changed enough for a new picture."
+    )
 
-        # Parse locations
-        locations_match = re.search(r"Locations:\s*({.*?})", ai_response, re.DOTALL)
-        if locations_match:
-            locations_str = locations_match.group(1)
-            updated_memory['locations'] = eval(locations_str)
+def decide_image(transcription, scene_memory, memory_version=None):
+    """Ask whether the scene needs a new image. Returns the settled DecisionParser."""
+    image_prompt = image_decision_prompt(transcription, scene_memory)
+    logging.info(f"Sending prompt to OpenAI: {image_prompt[:200]}...")
+    # A streamed reply is abandoned as soon as the decision is known
+    parser = DecisionParser()
+    ai_response = complete(image_prompt, parser, memory_version=memory_version)
+    parser.finish()
+    logging.info(f"Raw AI response: {ai_response}")
+    return parser
 
-        # Parse recent activity
-        recent_activity_match = re.search(r"Recent activity:\s*\[(.*?)\]", ai_response, re.DOTALL)
-        if recent_activity_match:
-            recent_activity_str = recent_activity_match.group(1)
-            updated_memory['recent_activity_summary'] = [entry.strip() for entry in recent_activity_str.split(',')]
+def analyze_scene(transcription, memory_manager):
+    """Memory update and image decision in a single request. Returns (memory update, DecisionParser)."""
+    parser = SceneAnalysisParser()
+    ai_response = complete(memory_update_prompt(transcription, memory_manager, decide_image=True), parser,
+                           memory_version=memory_manager.version)
+    parser.finish()
+    logging.info(f"Raw AI response for scene analysis: {ai_response}")
+    return parser.memory.result(), parser.decision
 
-        # Return the parsed memory table
-        return updated_memory
+def enhance_prompt(prompt, scene_memory):
+    """Expand entity names in an image prompt with their descriptions."""
+    for category in ("characters", "items", "locations"):
+        for name, description in scene_memory[category].items():
+            prompt = prompt.replace(name, f"{name} ({description})")
+    return prompt
+
+def analyze_text_for_image(text, memory_manager, mode=None, executor=None):
+    """Update memory from a transcript and return an image prompt, or "none".
+
+    `mode` is one of ANALYSIS_MODES (default ANALYSIS_MODE). Combined and
+    concurrent modes take the second request off the critical path; the
+    result is still "none" whenever no entity changed. In concurrent mode the
+    decision request runs on `executor` (the caller's, e.g. one per pipeline),
+    or on a thread of its own without one.
+    """
+    mode = mode or ANALYSIS_MODE
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode '{mode}'. Available: {', '.join(ANALYSIS_MODES)}")
 
-    except Exception as e:
-        logging.error(f"Error in update_memory: {e}")
-        return memory_manager.get_memory()  # Return original memory in case of an error
-
-def correct_spelling(term, vocab):
-    matches = get_close_matches(term.lower(), [key for key in vocab.keys()], n=1, cutoff=0.8)
-    return matches[0] if matches else term
-
-# Spell-check function using dynamic vocabulary
-def context_aware_spell_check(transcription, vocab):
-    words = transcription.split()
-    corrected_words = []
-    
-    for word in words:
-        if word in vocab:
-            corrected_words.append(word)
-        else:
-            close_matches = get_close_matches(word, vocab.keys(), n=1, cutoff=0.8)
-            if close_matches:
-                best_match = close_matches[0]
-                corrected_words.append(best_match)
-                logging.info(f"Corrected '{word}' to '{best_match}'")
-            else:
-                corrected_words.append(word)
-    
-    return " ".join(corrected_words)
-
-def analyze_text_for_image(text, memory_manager):
     # Step 1: Sanitize and correct spelling in the transcription
     sanitized_text = sanitize_text(text)
     logging.info(f"Analyzing text: {sanitized_text[:100]}...")
 
-    # Build the vocabulary from the memory for spelling correction
-    dnd_vocab = build_vocab_from_memory(memory_manager.get_memory())
-
-    # Correct transcription
-    corrected_words = [correct_spelling(word, dnd_vocab) for word in sanitized_text.split()]
-    corrected_text = ' '.join(corrected_words)
-    corrected_transcription = context_aware_spell_check(corrected_text, dnd_vocab)
+    # Correct misheard entity names using the memory manager's entity index
+    corrected_transcription, corrections = memory_manager.entity_index.correct(sanitized_text)
+    for original, name in corrections:
+        logging.info(f"Corrected '{original}' to '{name}'")
     logging.info(f"Final Corrected Transcription: {corrected_transcription}")
 
     # Get current memory state
-    current_memory_table = memory_manager.get_memory()
-    logging.info(f"Current memory before update: {current_memory_table}")
+    current_version, current_memory_table = memory_manager.snapshot()
+    logging.info(f"Memory before update: version {current_version}, "
+                 f"{sum(len(current_memory_table[c]) for c in ('characters', 'items', 'locations'))} entities")
 
     try:
         # Update memory based on transcription
-        updated_memory_table = update_memory(corrected_transcription, memory_manager)
+        decision = None
+        if mode == "combined":
+            updated_memory_table, decision = analyze_scene(corrected_transcription, memory_manager)
+        elif mode == "concurrent":
+            # The decision sees memory as it was before this update; that is the price of overlapping them
+            scene_memory, _ = memory_manager.select_context(corrected_transcription, MEMORY_CONTEXT_TOKENS)
+            own_executor = executor is None
+            if own_executor:
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-decision")
+            try:
+                pending_decision = executor.submit(decide_image, corrected_transcription, scene_memory,
+                                                   current_version)
+                updated_memory_table = update_memory(corrected_transcription, memory_manager)
+                decision = pending_decision.result()
+            finally:
+                if own_executor:
+                    executor.shutdown(wait=False)
+        else:
+            updated_memory_table = update_memory(corrected_transcription, memory_manager)
+        if updated_memory_table is None:
+            logging.warning("Memory update failed, leaving memory unchanged.")
+            return "none"
         if not isinstance(updated_memory_table, dict):
             logging.error("Expected updated_memory_table to be a dictionary.")
             return "none"
+        memory_manager.apply_update(updated_memory_table)
+
+        # A correction is accepted once the model kept the entity in its update;
+        # remember the misspelling so next time it resolves through the exact alias path
+        for original, name in corrections:
+            if any(name in updated_memory_table.get(category, {}) for category in ("characters", "items", "locations")):
+                memory_manager.entity_index.learn_alias(original, name)
         
-        # Check for differences in memory to determine image generation
-        if updated_memory_table == current_memory_table:
-            logging.info("No changes detected, skipping image generation.")
+        # Only generate when a character, item or location was added, changed or removed
+        delta = memory_manager.diff(current_version)
+        if not delta:
+            logging.info("No entity changes detected, skipping image generation.")
             return "none"
         else:
-            logging.info("Memory updated, preparing to generate image.")
-
-        # Build the image prompt using updated memory
-        image_prompt = (
-            "You are an AI art companion for a Dungeons and Dragons game. "
-            "Please generate a detailed scene based on recent transcription and memory details:\n\n"
-            f"Recent Transcription: {corrected_transcription}\n\n"
-            f"Characters:\n{str(updated_memory_table.get('characters', {}))}\n\n"
-            f"Items:\n{str(updated_memory_table.get('items', {}))}\n\n"
-            f"Locations:\n{str(updated_memory_table.get('locations', {}))}\n"
-        )
-        
-        # Log the prompt being sent
-        logging.info(f"Sending prompt to OpenAI: {image_prompt[:200]}...")
+            logging.info(f"Memory updated ({delta}), preparing to generate image.")
 
-        # Make the OpenAI API request
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": image_prompt}],
-        )
-
-        # Process the AI's response
-        ai_response = response.choices[0].message.content.strip()
-        logging.info(f"Raw AI response: {ai_response}")
+        # Describe the scene from the updated memory, scoped to this transcript like the update prompt
+        scene_memory, _ = memory_manager.select_context(corrected_transcription, MEMORY_CONTEXT_TOKENS)
+        if decision is None:
+            decision = decide_image(corrected_transcription, scene_memory, memory_manager.version)
 
         # Determine action based on AI's response
-        if "generate image" in ai_response.lower():
-            prompt_start = ai_response.lower().find("generate image:") + len("generate image:")
-            initial_prompt = ai_response[prompt_start:].strip()
-            logging.info(f"Initial AI-generated prompt: {initial_prompt}")
-
+        if decision.decision == "generate":
+            logging.info(f"Initial AI-generated prompt: {decision.prompt}")
             # Enhance prompt with character/item/location descriptions
-            for name, description in updated_memory_table.get("characters", {}).items():
-                initial_prompt = initial_prompt.replace(name, f"{name} ({description})")
-            for name, description in updated_memory_table.get("items", {}).items():
-                initial_prompt = initial_prompt.replace(name, f"{name} ({description})")
-            for name, description in updated_memory_table.get("locations", {}).items():
-                initial_prompt = initial_prompt.replace(name, f"{name} ({description})")
-
-            logging.info(f"Final enhanced prompt for image generation: {initial_prompt}")
-            return initial_prompt
+            final_prompt = enhance_prompt(decision.prompt, scene_memory)
+            logging.info(f"Final enhanced prompt for image generation: {final_prompt}")
+            return final_prompt
 
-        elif "no image" in ai_response.lower():
+        elif decision.decision == "none":
             logging.info("AI decided not to generate a new image.")
             return "none"
         else:
-            logging.warning(f"Unexpected response format: {ai_response}")
+            logging.warning(f"Unexpected response format: {decision.text}")
             return "none"
 
     except Exception as e:
@@ -1,25 +1,45 @@
 import pyaudio
 import wave
 import time
+import logging
+import numpy as np
+from audio.ring_buffer import RingBuffer
+from audio.resample import Resampler, TARGET_RATE
 
 # Set up parameters for audio recording
 FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 44100
 CHUNK = 8192  # Increased CHUNK size from 4096 to 8192
+RING_SECONDS = 60  # How much unread audio the callback ring buffer can hold
 
 class AudioRecorder:
-    def __init__(self, recording_callback=None):
-        """Initialize the AudioRecorder with an optional callback for recording status."""
+    def __init__(self, recording_callback=None, ring_seconds=RING_SECONDS, target_rate=TARGET_RATE):
+        """Initialize the AudioRecorder with an optional callback for recording status.
+
+        Streaming capture is resampled to `target_rate` before it is buffered; pass
+        target_rate=None to keep the full capture rate (e.g. for archiving).
+        """
         self.frames = []
         self.stream = None
         self.audio = None  # Don't initialize PyAudio here
         self.recording_callback = recording_callback  # Store the callback
+        self.rate = target_rate or RATE  # Sample rate of the audio returned by read_segment()
+        self.resampler = Resampler(RATE, self.rate) if self.rate != RATE else None
+        self.ring = RingBuffer(int(self.rate * ring_seconds) * CHANNELS)
+        self.input_overflows = 0  # Overflows reported by PortAudio itself
+        self.streaming = False
+
+    def _get_audio(self):
+        """Create the PyAudio instance once and reuse it for every stream."""
+        if self.audio is None:
+            self.audio = pyaudio.PyAudio()
+        return self.audio
 
     def start_recording(self):
         """Start recording audio in one continuous stream."""
         self.frames = []
-        self.audio = pyaudio.PyAudio()  # Initialize PyAudio on each start
+        self._get_audio()
         try:
             self.stream = self.audio.open(format=FORMAT, channels=CHANNELS,
                                           rate=RATE, input=True,
@@ -38,7 +58,7 @@ class AudioRecorder:
             try:
                 data = self.stream.read(CHUNK, exception_on_overflow=False)
                 self.frames.append(data)
-                print(f"Recorded chunk of size: {len(data)} bytes")  # Debugging log to ensure chunks are captured
+                logging.debug(f"Recorded chunk of size: {len(data)} bytes")  # Rate limited; the capture loop must not block on I/O
             except OSError as e:
                 print(f"Buffer overflow error: {e}. Retrying in 100ms...")
                 time.sleep(0.1)
@@ -70,10 +90,91 @@ class AudioRecorder:
             return True
         return False
 
+    def _stream_callback(self, in_data, frame_count, time_info, status):
+        """PyAudio callback: copy the block into the ring buffer and return immediately."""
+        if status & pyaudio.paInputOverflow:
+            self.input_overflows += 1
+        samples = np.frombuffer(in_data, dtype=np.int16)
+        if self.resampler:
+            samples = self.resampler.process(samples)
+        self.ring.write(samples)
+        return (None, pyaudio.paContinue)
+
+    def start_stream(self):
+        """Open one long-lived callback stream that feeds the ring buffer."""
+        if self.streaming:
+            return True
+        self.ring.clear()
+        if self.resampler:
+            self.resampler.reset()
+        try:
+            self.stream = self._get_audio().open(format=FORMAT, channels=CHANNELS,
+                                                 rate=RATE, input=True,
+                                                 frames_per_buffer=CHUNK,
+                                                 stream_callback=self._stream_callback)
+            self.stream.start_stream()
+            self.streaming = True
+            print("Streaming capture started...")
+            if self.recording_callback:
+                self.recording_callback(True)
+            return True
+        except OSError as e:
+            print(f"Error starting stream: {e}")
+            if self.recording_callback:
+                self.recording_callback(False)
+            return False
+
+    def read_segment(self):
+        """Return all audio captured since the last call as a zero-copy int16 view.
+
+        The stream keeps running, so nothing is lost between segments. The view is
+        only valid until the ring buffer wraps; copy or save it before then.
+        """
+        return self.ring.read()
+
+    def stop_stream(self):
+        """Stop the callback stream. Unread audio stays available via read_segment()."""
+        if self.stream and self.streaming:
+            try:
+                self.stream.stop_stream()
+                self.stream.close()
+                print("Streaming capture stopped!")
+            except OSError as e:
+                print(f"Error stopping stream: {e}")
+        self.stream = None
+        self.streaming = False
+        if self.recording_callback:
+            self.recording_callback(False)
+
+    def save_segment(self, filename, samples):
+        """Save int16 samples (e.g. from read_segment) as a .wav file."""
+        if len(samples) == 0:
+            print("No audio frames captured!")
+            return False
+        with wave.open(filename, 'wb') as wf:
+            wf.setnchannels(CHANNELS)
+            wf.setsampwidth(pyaudio.get_sample_size(FORMAT))
+            wf.setframerate(self.rate)
+            wf.writeframes(np.ascontiguousarray(samples).tobytes())
+        print(f"Audio saved as {filename}")
+        return True
+
+    def stats(self):
+        """Return capture health counters."""
+        return {
+            "overruns": self.ring.overruns,
+            "dropped_frames": self.ring.dropped_frames,
+            "input_overflows": self.input_overflows,
+            "buffered_frames": self.ring.available(),
+        }
+
     def close(self):
         """Terminate the PyAudio session."""
+        if self.streaming:
+            self.stop_stream()
         if self.audio:
             try:
                 self.audio.terminate()
             except Exception as e:
                 print(f"Error terminating PyAudio: {e}")
+            self.audio = None
@@ -0,0 +1,107 @@
+import argparse
+import random
+import time
+from difflib import get_close_matches
+from audio.entity_index import EntityIndex
+
+SYLLABLES = ["ar", "bel", "cor", "dra", "el", "fen", "gor", "hal", "is", "jor", "kal", "lor", "mor",
+             "nar", "or", "pel", "quin", "ra", "sil", "tor", "ul", "vor", "wyn", "xan", "yor", "zel"]
+FILLER = ("the party walks into the tavern and asks about the old road while the bard plays a song "
+          "near the fire as rain falls outside and someone orders another round").split()
+
+
+def make_name(rng):
+    word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+    return word.capitalize()
+
+
+def make_entities(rng, count):
+    """Single-word names plus a share of two- and three-word ones ("Amulet of Kings")."""
+    names = set()
+    while len(names) < count:
+        words = rng.choice([1, 1, 1, 2, 3])
+        names.add(" ".join(make_name(rng) for _ in range(words)))
+    return sorted(names)
+
+
+def misspell(rng, word):
+    if len(word) < 5:
+        return word.lower()
+    i = rng.randrange(1, len(word) - 1)
+    op = rng.choice(["swap", "drop", "double"])
+    if op == "swap":
+        word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    elif op == "drop":
+        word = word[:i] + word[i + 1:]
+    else:
+        word = word[:i] + word[i] + word[i:]
+    return word.lower()
+
+
+def make_transcript(rng, names, words, mention_rate=0.1):
+    out = []
+    while len(out) < words:
+        if rng.random() < mention_rate:
+            name = rng.choice(names)
+            out.extend(misspell(rng, w) if rng.random() < 0.5 else w for w in name.split())
+        else:
+            out.append(rng.choice(FILLER))
+    return " ".join(out)
+
+
+def old_correct(text, names):
+    """What analyze_text_for_image did before: two per-word get_close_matches passes."""
+    vocab = {name: [name.lower()] for name in names}
+    words = [get_close_matches(w.lower(), list(vocab.keys()), n=1, cutoff=0.8) or [w] for w in text.split()]
+    words = [w[0] for w in words]
+    corrected = []
+    for word in words:
+        if word in vocab:
+            corrected.append(word)
+        else:
+            corrected.append((get_close_matches(word, vocab.keys(), n=1, cutoff=0.8) or [word])[0])
+    return " ".join(corrected)
+
+
+def run(entities, words, seed=0):
+    rng = random.Random(seed)
+    names = make_entities(rng, entities)
+    text = make_transcript(rng, names, words)
+
+    start = time.perf_counter()
+    index = EntityIndex()
+    for name in names:
+        index.add(name, "characters")
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_text, corrections = index.correct(text)
+    new_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    old_text = old_correct(text, names)
+    old_time = time.perf_counter() - start
+
+    # Agreement on the positions the old code touched; the index also fixes multi-word names it could not
+    old_words, new_words, raw_words = old_text.split(), new_text.split(), text.split()
+    same = len(old_words) == len(new_words) and len(old_words) == len(raw_words)
+    agree = sum(o == n for o, n in zip(old_words, new_words)) / len(old_words) if same else None
+
+    print(f"{entities} entities, {len(raw_words)} words")
+    print(f"  index build          {build * 1000:9.1f} ms")
+    print(f"  indexed correction   {new_time * 1000:9.1f} ms ({len(corrections)} corrections)")
+    print(f"  old difflib scans    {old_time * 1000:9.1f} ms")
+    print(f"  speedup              {old_time / new_time:9.1f}x")
+    if agree is not None:
+        print(f"  word agreement       {agree:9.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare indexed entity matching with the old difflib scans.")
+    parser.add_argument("--entities", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--words", type=int, default=2000, help="transcript length in words")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for count in args.entities:
+        run(count, args.words, args.seed)
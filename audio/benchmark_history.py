@@ -0,0 +1,58 @@
+import argparse
+import logging
+import random
+import time
+from audio.memory_manager import MemoryManager
+from audio.text_summarize import RollingSummary, extractive_summary, estimate_tokens, HISTORY_TOKEN_BUDGET
+from audio.benchmark_entity_index import make_name, FILLER
+from replay.bench_util import percentile
+
+
+def slow_summary(seconds):
+    """An extractive summarizer that takes as long as a model call."""
+    def summarize(entries, level):
+        time.sleep(seconds)
+        return extractive_summary(entries, level)
+    return summarize
+
+
+def run(segments, events_per_segment, segment_seconds, summary_seconds, budget, seed=0):
+    """Feed a long campaign's activity through the memory manager and watch the history size."""
+    rng = random.Random(seed)
+    names = [make_name(rng) for _ in range(40)]
+    memory_manager = MemoryManager(RollingSummary(slow_summary(summary_seconds)))
+    all_events = []
+    timings = []
+    print(f"{'segment':>8}{'events':>8}{'all tok':>9}{'history tok':>13}{'tiers (e/s/s)':>15}{'compactions':>13}")
+    for segment in range(1, segments + 1):
+        events = [f"{rng.choice(names)} " + " ".join(rng.choice(FILLER) for _ in range(12)) + "."
+                  for _ in range(events_per_segment)]
+        all_events.extend(events)
+        start = time.perf_counter()
+        memory_manager.apply_update({"recent_activity_summary": events})
+        timings.append(time.perf_counter() - start)
+        time.sleep(segment_seconds)  # Compaction catches up while the table talks
+        if segment == 1 or segment % (segments // 10 or 1) == 0:
+            history = memory_manager.history
+            rendered = history.render(budget, events=False) + memory_manager.memory_table["recent_activity_summary"]
+            stats = history.stats()
+            print(f"{segment:>8}{len(all_events):>8}{estimate_tokens(' '.join(all_events)):>9}"
+                  f"{estimate_tokens(rendered):>13}"
+                  f"{'%d/%d/%d' % (stats['events'], stats['scenes'], stats['sessions']):>15}{stats['compactions']:>13}")
+    print(f"apply_update with activity: p50 {percentile(timings, 50) * 1000:.2f} ms, "
+          f"max {max(timings) * 1000:.2f} ms (summaries take {summary_seconds * 1000:.0f} ms each)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the size of the prompt history as a campaign grows.")
+    parser.add_argument("--segments", type=int, default=500)
+    parser.add_argument("--events-per-segment", type=int, default=2)
+    parser.add_argument("--segment-seconds", type=float, default=0.02, help="time between segments")
+    parser.add_argument("--summary-seconds", type=float, default=0.005,
+                        help="simulated model latency (a real session is ~20 s per segment, ~2 s per summary)")
+    parser.add_argument("--budget", type=int, default=HISTORY_TOKEN_BUDGET)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # The manager logs every change
+    run(args.segments, args.events_per_segment, args.segment_seconds, args.summary_seconds, args.budget, args.seed)
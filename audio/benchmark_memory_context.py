@@ -0,0 +1,52 @@
+import argparse
+import logging
+import random
+import time
+from audio.memory_manager import MemoryManager, ENTITY_CATEGORIES, CONTEXT_TOKEN_BUDGET, estimate_tokens
+from audio.benchmark_entity_index import make_name, FILLER
+
+DESCRIPTION_WORDS = 30  # Typical length of a description the model writes
+
+
+def describe(rng):
+    return " ".join(rng.choice(FILLER) for _ in range(DESCRIPTION_WORDS)).capitalize() + "."
+
+
+def run(sessions, per_session, mentions, budget, seed=0):
+    """Grow a campaign session by session and compare full-table and scoped prompt sizes."""
+    rng = random.Random(seed)
+    memory_manager = MemoryManager()
+    names = []
+    print(f"{'session':>8}{'entities':>10}{'full tok':>10}{'scoped tok':>12}{'select ms':>11}")
+    for session in range(1, sessions + 1):
+        for _ in range(per_session):
+            name = make_name(rng)
+            names.append(name)
+            memory_manager.update_memory(rng.choice(ENTITY_CATEGORIES), name, describe(rng))
+
+        # A segment that mentions a few entities, some from earlier sessions
+        words = [rng.choice(FILLER) for _ in range(40)]
+        for name in rng.sample(names, min(mentions, len(names))):
+            words.insert(rng.randrange(len(words)), name.lower())
+        transcript = " ".join(words)
+
+        full = estimate_tokens(str(memory_manager.get_memory()))
+        start = time.perf_counter()
+        context, other_names = memory_manager.select_context(transcript, budget)
+        elapsed = time.perf_counter() - start
+        scoped = estimate_tokens(str(context) + ", ".join(other_names))
+        if session == 1 or session % 5 == 0:
+            print(f"{session:>8}{len(names):>10}{full:>10}{scoped:>12}{elapsed * 1000:>11.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure memory-update prompt size as a campaign grows.")
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--entities-per-session", type=int, default=15)
+    parser.add_argument("--mentions", type=int, default=3, help="entities named in each transcript")
+    parser.add_argument("--budget", type=int, default=CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)  # The manager logs every change
+    run(args.sessions, args.entities_per_session, args.mentions, args.budget, args.seed)
@@ -0,0 +1,113 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from audio.memory_manager import MemoryManager, ENTITY_CATEGORIES
+from audio.memory_store import MemoryStore, SNAPSHOT_EVERY
+from audio.benchmark_entity_index import make_name
+from audio.benchmark_memory_context import describe
+from replay.bench_util import percentile
+
+
+def timed_load(path):
+    """Seconds until the table is loaded, and until its names are indexed too."""
+    start = time.perf_counter()
+    memory_manager = MemoryManager(store=MemoryStore(path))
+    loaded = time.perf_counter() - start
+    memory_manager.wait()
+    indexed = time.perf_counter() - start
+    entities = sum(len(memory_manager.memory_table[c]) for c in ENTITY_CATEGORIES)
+    memory_manager.close()
+    return loaded, indexed, entities
+
+
+def reader(path, seconds, results):
+    """Another process following the campaign while it is written."""
+    logging.disable(logging.INFO)
+    memory_manager = MemoryManager(store=MemoryStore(path))
+    refreshes, errors, lag = 0, 0, []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        try:
+            memory_manager.refresh()
+            refreshes += 1
+            lag.append(time.perf_counter() - start)
+        except Exception as e:
+            errors += 1
+            logging.warning(f"Reader error: {e}")
+        time.sleep(0.01)
+    results.put((refreshes, errors, percentile(lag, 50), percentile(lag, 99), memory_manager.version))
+
+
+def run(entities, batch, snapshot_every, seed=0):
+    rng = random.Random(seed)
+    workdir = tempfile.mkdtemp(prefix="dnd_memory_store_")
+    path = os.path.join(workdir, "campaign_memory.db")
+    names = set()
+    while len(names) < entities:
+        names.add(make_name(rng))
+    rows = [(rng.choice(ENTITY_CATEGORIES), name, describe(rng)) for name in sorted(names)]
+
+    # Single updates, in memory only and journaled
+    for label, store in (("in memory", None), ("journaled", MemoryStore(path, snapshot_every))):
+        memory_manager = MemoryManager(store=store)
+        timings = []
+        start = time.perf_counter()
+        for category, name, description in rows:
+            t = time.perf_counter()
+            memory_manager.update_memory(category, name, description)
+            timings.append(time.perf_counter() - t)
+        total = time.perf_counter() - start
+        print(f"update_memory x{entities} {label:<10} total {total:.2f}s  p50 {percentile(timings, 50) * 1e6:.0f} us"
+              f"  p99 {percentile(timings, 99) * 1e6:.0f} us")
+    memory_manager.close()
+
+    # Batched updates, the way analyze_text_for_image applies a parsed reply, with a reader process following
+    results = multiprocessing.Queue()
+    follower = multiprocessing.Process(target=reader, args=(path, 3.0, results))
+    follower.start()
+    time.sleep(0.5)
+    memory_manager = MemoryManager(store=MemoryStore(path, snapshot_every))
+    timings = []
+    for i in range(0, entities, batch):
+        update = {category: {} for category in ENTITY_CATEGORIES}
+        for category, name, _ in rows[i:i + batch]:
+            update[category][name] = describe(rng)
+        t = time.perf_counter()
+        memory_manager.apply_update(update)
+        timings.append(time.perf_counter() - t)
+    print(f"apply_update of {batch} changed entities: p50 {percentile(timings, 50) * 1000:.2f} ms"
+          f"  p99 {percentile(timings, 99) * 1000:.2f} ms  ({memory_manager.store.stats()})")
+    version = memory_manager.version
+    follower.join()
+    refreshes, errors, lag50, lag99, reader_version = results.get()
+    print(f"reader process: {refreshes} refreshes, {errors} errors, p50 {lag50 * 1000:.2f} ms, "
+          f"p99 {lag99 * 1000:.2f} ms, caught up to version {reader_version}")
+
+    # Startup: newest snapshot, then the same plus a journal just short of the next snapshot
+    memory_manager.close()
+    loaded, indexed, count = timed_load(path)
+    print(f"load {count} entities from a snapshot: {loaded * 1000:.1f} ms ({indexed * 1000:.1f} ms until indexed)")
+    memory_manager = MemoryManager(store=MemoryStore(path, snapshot_every))
+    for category, name, _ in rows[:snapshot_every - 1]:
+        memory_manager.update_memory(category, name, describe(rng))
+    journal = memory_manager.store.stats()["journal_entries"]
+    memory_manager.close()
+    loaded, indexed, count = timed_load(path)
+    print(f"load {count} entities from a snapshot + {journal} journal entries: {loaded * 1000:.1f} ms "
+          f"({indexed * 1000:.1f} ms until indexed)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure journaled memory updates and campaign load times.")
+    parser.add_argument("--entities", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=10, help="entities changed per apply_update")
+    parser.add_argument("--snapshot-every", type=int, default=SNAPSHOT_EVERY)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    run(args.entities, args.batch, args.snapshot_every, args.seed)
@@ -0,0 +1,81 @@
+import argparse
+import glob
+import os
+import time
+import numpy as np
+import speech_recognition as sr
+from audio.resample import Resampler, TARGET_RATE
+from audio.transcribe_audio import samples_to_audio_data
+from replay.bench_util import ROOT, load_wav
+
+
+def upload_bytes(audio):
+    """Size of the FLAC body recognize_google() would POST for this audio."""
+    return len(audio.get_flac_data(convert_width=2))
+
+
+def timed_recognize(recognizer, audio):
+    start = time.perf_counter()
+    try:
+        text = recognizer.recognize_google(audio)
+    except (sr.UnknownValueError, sr.RequestError):
+        text = None
+    return time.perf_counter() - start, text
+
+
+def run(paths, target_rate=TARGET_RATE, live=False):
+    recognizer = sr.Recognizer()
+    totals = {"raw_full": 0, "raw_target": 0, "flac_full": 0, "flac_target": 0,
+              "rtt_full": 0.0, "rtt_target": 0.0, "resample_cpu": 0.0, "seconds": 0.0}
+    mismatches = 0
+
+    for path in paths:
+        samples, rate = load_wav(path)
+        totals["seconds"] += len(samples) / rate
+
+        # Resample in callback-sized blocks, the way AudioRecorder does it
+        start = time.perf_counter()
+        resampler = Resampler(rate, target_rate)
+        low = np.concatenate([resampler.process(samples[i:i + 8192]) for i in range(0, len(samples), 8192)])
+        totals["resample_cpu"] += time.perf_counter() - start
+
+        full_audio = samples_to_audio_data(samples, rate)
+        low_audio = samples_to_audio_data(low, target_rate)
+        totals["raw_full"] += len(full_audio.frame_data)
+        totals["raw_target"] += len(low_audio.frame_data)
+        totals["flac_full"] += upload_bytes(full_audio)
+        totals["flac_target"] += upload_bytes(low_audio)
+
+        if live:
+            rtt_full, text_full = timed_recognize(recognizer, full_audio)
+            rtt_low, text_low = timed_recognize(recognizer, low_audio)
+            totals["rtt_full"] += rtt_full
+            totals["rtt_target"] += rtt_low
+            if (text_full or "").lower() != (text_low or "").lower():
+                mismatches += 1
+            print(f"{os.path.basename(path)}: {rtt_full * 1000:.0f} ms -> {rtt_low * 1000:.0f} ms")
+
+    n = max(len(paths), 1)
+    print(f"Files: {len(paths)}  audio: {totals['seconds']:.1f} s")
+    print(f"Buffered PCM: {totals['raw_full'] / 1e6:.2f} MB -> {totals['raw_target'] / 1e6:.2f} MB "
+          f"({totals['raw_full'] / max(totals['raw_target'], 1):.2f}x smaller)")
+    print(f"Upload (FLAC): {totals['flac_full'] / 1e6:.2f} MB -> {totals['flac_target'] / 1e6:.2f} MB "
+          f"({totals['flac_full'] / max(totals['flac_target'], 1):.2f}x smaller)")
+    print(f"Resampler CPU: {1000.0 * totals['resample_cpu'] / max(totals['seconds'], 1e-9):.2f} ms "
+          f"per second of audio")
+    if live:
+        print(f"Google round trip: {1000.0 * totals['rtt_full'] / n:.0f} ms -> "
+              f"{1000.0 * totals['rtt_target'] / n:.0f} ms mean per segment "
+              f"({mismatches} transcripts differ)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure upload size and round trip before/after resampling.")
+    parser.add_argument("paths", nargs="*", help="wav files (default: the checked-in recordings)")
+    parser.add_argument("--target-rate", type=int, default=TARGET_RATE)
+    parser.add_argument("--live", action="store_true", help="also time real Google recognition calls")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(ROOT, "segment_*.wav")) +
+                                 glob.glob(os.path.join(ROOT, "recording_*.wav")))
+    run(paths, args.target_rate, args.live)
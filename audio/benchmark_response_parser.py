@@ -0,0 +1,149 @@
+import argparse
+import logging
+import os
+import random
+import re
+import sys
+from audio.response_parser import MemoryUpdateParser, DecisionParser, MEMORY_SECTIONS
+from replay.stub_services import LOG_RECORD
+from replay.bench_util import ROOT
+
+# A logged entity section: "Characters: {'Nigel': '...'}", the dict ending a line (it may span several)
+ENTITY_SECTION = re.compile(r"^(characters|items|locations)\s*:\s*(\{.*?\})\s*$", re.IGNORECASE | re.MULTILINE | re.DOTALL)
+# A name is the quoted string opening the dict or following a comma, before a colon
+ENTITY_NAME = re.compile(r"""[{,]\s*(['"])(.+?)\1\s*:""")
+GENERATED = "AI decided to generate a new image with prompt:"
+NOT_GENERATED = "AI decided not to generate a new image."
+UNEXPECTED = "Unexpected response format:"
+
+
+def log_records(path):
+    records, current = [], None
+    with open(path, errors="replace") as f:
+        for line in f:
+            if LOG_RECORD.match(line):
+                current = [LOG_RECORD.sub("", line, count=1)]
+                records.append(current)
+            elif current is not None:
+                current.append(line)
+    return ["".join(record).strip() for record in records]
+
+
+def entity_names(response):
+    """Entity names per table key, picked out with a regex rather than the parser under test."""
+    names = {}
+    for header, literal in ENTITY_SECTION.findall(response):
+        found = [name.strip() for _, name in ENTITY_NAME.findall(literal)]
+        if found or not literal[1:-1].strip():
+            names[MEMORY_SECTIONS[header.lower()]] = sorted(found)
+    return names
+
+
+def logged_cases(path):
+    """(response, expected outcome) pairs for both parsers, from a dnd_text_log.txt.
+
+    A memory response is expected to yield the entity names of its sections.
+    A decision response is expected to yield what the app logged next: the
+    prompt it generated with, that it made no image, or that the reply was
+    not understood.
+    """
+    memory, decisions = [], []
+    records = log_records(path)
+    for i, message in enumerate(records):
+        for marker in ("Raw AI response for memory update:", "Raw AI response for scene analysis:",
+                       "Updated memory table:"):
+            if message.startswith(marker):
+                response = message[len(marker):].strip()
+                memory.append((response, entity_names(response)))
+                break
+        else:
+            for marker in ("Received AI response:", "Raw AI response:"):
+                if message.startswith(marker) and i + 1 < len(records):
+                    following = records[i + 1]
+                    if following.startswith(GENERATED):
+                        expected = ("generate", following[len(GENERATED):].strip())
+                    elif following.startswith(NOT_GENERATED):
+                        expected = ("none", None)
+                    elif following.startswith(UNEXPECTED):
+                        expected = ("unexpected", None)
+                    else:
+                        break
+                    decisions.append((message[len(marker):].strip(), expected))
+                    break
+    return memory, decisions
+
+
+def chunked(text, rng, max_chunk=12):
+    """Split text the way a token stream arrives: small, uneven pieces."""
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, max_chunk)
+        yield text[position:position + size]
+        position += size
+
+
+def outcome(parser):
+    if isinstance(parser, DecisionParser):
+        return parser.decision, parser.prompt
+    return parser.result()
+
+
+def entity_outcome(parser):
+    return {key: sorted(value) for key, value in parser.result().items() if key in ("characters", "items",
+                                                                                      "locations")}
+
+
+def check(cases, parser_class, rng, rounds):
+    """Feed every response whole and in random chunks; both must parse identically.
+
+    The whole parse must also match the expected outcome from logged_cases().
+    Returns (wrong results, mismatches, share of characters read before the
+    parser was done).
+    """
+    wrong, mismatches, consumed, total = 0, 0, 0, 0
+    for response, logged in cases:
+        whole = parser_class()
+        whole.feed(response)
+        if isinstance(whole, DecisionParser):
+            whole.finish()
+        expected = outcome(whole)
+        got = expected if isinstance(whole, DecisionParser) else entity_outcome(whole)
+        if got != logged:
+            wrong += 1
+            print(f"  WRONG on {response[:60]!r}: {got} != {logged}")
+        for _ in range(rounds):
+            streamed = parser_class()
+            read = 0
+            for piece in chunked(response, rng):
+                read += len(piece)
+                streamed.feed(piece)
+                if streamed.done:
+                    break
+            if isinstance(streamed, DecisionParser):
+                streamed.finish()
+            if outcome(streamed) != expected:
+                mismatches += 1
+                print(f"  MISMATCH on {response[:60]!r}: {outcome(streamed)} != {expected}")
+            consumed += read
+            total += len(response)
+    return wrong, mismatches, consumed / total if total else 1.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check the streaming response parsers against the responses captured in dnd_text_log.txt.")
+    parser.add_argument("--log", default=os.path.join(ROOT, "dnd_text_log.txt"))
+    parser.add_argument("--rounds", type=int, default=20, help="random chunkings per response")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)  # Malformed sections are expected in the captured log
+    memory, decisions = logged_cases(args.log)
+    rng = random.Random(args.seed)
+    failed = False
+    for kind, parser_class, cases in (("memory", MemoryUpdateParser, memory), ("decision", DecisionParser, decisions)):
+        wrong, mismatches, consumed = check(cases, parser_class, rng, args.rounds)
+        failed = failed or wrong > 0 or mismatches > 0 or not cases
+        print(f"{kind:<9} {len(cases):>3} responses, {wrong} wrong, {mismatches} mismatches, "
+              f"{consumed:.0%} of the text read before acting")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,121 @@
+import argparse
+import datetime
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+from audio.transcript_store import TranscriptStore, transcript_lines
+from audio.benchmark_entity_index import make_name
+from replay.bench_util import ROOT, percentile
+
+SEGMENT_SECONDS = 15  # Spacing of the synthetic transcripts within a session
+SESSION_GAP_SECONDS = 7 * 24 * 3600  # One session a week
+
+
+def campaign(sessions, per_session, entities, seed=0):
+    """Synthetic transcripts: recorded lines with one or two campaign names worked in."""
+    rng = random.Random(seed)
+    lines = transcript_lines(os.path.join(ROOT, "transcription_memory.txt"))
+    names = set()
+    while len(names) < entities:
+        names.add(make_name(rng))
+    names = sorted(names)
+    start = time.time() - sessions * SESSION_GAP_SECONDS
+    rows = []
+    for session in range(sessions):
+        for i in range(per_session):
+            mentioned = rng.sample(names, rng.randint(1, 2))
+            words = rng.choice(lines).split()
+            for name in mentioned:
+                words.insert(rng.randrange(len(words) + 1), name)
+            rows.append((f"session-{session}", start + session * SESSION_GAP_SECONDS + i * SEGMENT_SECONDS,
+                         " ".join(words), mentioned))
+    return rows, names
+
+
+def legacy_save(path, started, text):
+    """What save_transcription() used to do for every transcript."""
+    stamp = datetime.datetime.fromtimestamp(started).strftime('%Y-%m-%d %H:%M:%S')
+    with open(path, 'a') as f:
+        f.write(f"[{stamp}] {text}\n")
+
+
+def legacy_last_mention(path, name):
+    """Finding a mention in the text file means reading all of it."""
+    found = None
+    with open(path) as f:
+        for line in f:
+            if name.lower() in line.lower():
+                found = line
+    return found
+
+
+def legacy_between(path, start, end):
+    found = []
+    with open(path) as f:
+        for line in f:
+            match = re.match(r"^\[([^\]]*)\]", line)
+            if match and start <= time.mktime(time.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")) < end:
+                found.append(line)
+    return found
+
+
+def timed(func, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(label, samples):
+    print(f"{label:<44} p50 {percentile(samples, 50) * 1000:8.3f} ms  p99 {percentile(samples, 99) * 1000:8.3f} ms")
+
+
+def run(sessions, per_session, entities, queries, seed=0):
+    rng = random.Random(seed)
+    rows, names = campaign(sessions, per_session, entities, seed)
+    workdir = tempfile.mkdtemp(prefix="dnd_transcripts_")
+    text_path = os.path.join(workdir, "transcription_memory.txt")
+    store = TranscriptStore(os.path.join(workdir, "transcripts.db"))
+    print(f"{len(rows)} transcripts in {sessions} sessions mentioning {entities} entities")
+
+    report("write: append to text file", timed(legacy_save, [(text_path, r[1], r[2]) for r in rows]))
+    start = time.perf_counter()
+    adds = timed(lambda r: store.add(r[2], r[1], r[1] + SEGMENT_SECONDS, f"segment_{int(r[1])}.wav", r[3], r[0]),
+                 [(r,) for r in rows])
+    store.flush()
+    report("write: TranscriptStore.add (queued)", adds)
+    print(f"{'':<44} all written after {time.perf_counter() - start:.2f} s in {store.flushes} transactions")
+
+    picked = [rng.choice(names) for _ in range(queries)]
+    report("last mention: scan text file", timed(legacy_last_mention, [(text_path, n) for n in picked[:20]]))
+    report("last mention: mentions(name, 1)", timed(store.mentions, [(n, 1) for n in picked]))
+    windows = []
+    for _ in range(queries):
+        session_start = rows[rng.randrange(sessions) * per_session][1]
+        windows.append((session_start + 600, session_start + 1800))
+    report("20 minute window: scan text file", timed(legacy_between, [(text_path,) + w for w in windows[:20]]))
+    report("20 minute window: between()", timed(store.between, windows))
+    report("full text: search()", timed(store.search, [(f"{n} OR dragon",) for n in picked]))
+    report("prompt recall of 3 names: recall(..., 300)",
+           timed(store.recall, [(rng.sample(names, 3), 300) for _ in range(queries)]))
+    size = sum(os.path.getsize(os.path.join(workdir, f)) for f in os.listdir(workdir) if f.startswith("transcripts"))
+    print(f"text file {os.path.getsize(text_path) / 1e6:.1f} MB, store {size / 1e6:.1f} MB; {store.stats()}")
+    store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the transcript store with the old append-only text file.")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--per-session", type=int, default=400, help="transcripts per session")
+    parser.add_argument("--entities", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    run(args.sessions, args.per_session, args.entities, args.queries, args.seed)
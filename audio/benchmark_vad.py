@@ -0,0 +1,91 @@
+import argparse
+import glob
+import os
+import time
+import numpy as np
+from audio.vad import VoiceActivityDetector, frame_features, classify_frames
+from audio.resample import resample
+from replay.bench_util import ROOT, load_wav
+
+FIXED_SEGMENT_SECONDS = 10  # What DNDApp.process_audio used to cut on
+CALLS_PER_SEGMENT = 3  # One Google transcription + two OpenAI calls
+
+
+def fixed_windows(samples, rate, seconds=FIXED_SEGMENT_SECONDS):
+    """Split samples the way the old 10-second sleep did."""
+    step = rate * seconds
+    return [samples[i:i + step] for i in range(0, len(samples), step)]
+
+
+def run(paths, block_ms=100, target_rate=None, **vad_options):
+    rate = None
+    fixed_total = fixed_silent = fixed_cuts_in_speech = 0
+    vad_segments = []
+    audio_seconds = 0.0
+    vad_cpu = 0.0
+    vad = None
+
+    for path in paths:
+        samples, file_rate = load_wav(path)
+        if target_rate:
+            samples, file_rate = resample(samples, file_rate, target_rate), target_rate
+        if rate is None:
+            rate = file_rate
+            vad = VoiceActivityDetector(rate, **vad_options)
+        audio_seconds += len(samples) / rate
+
+        # Baseline: each file is one fixed window (that is how they were produced)
+        for window in fixed_windows(samples, rate):
+            fixed_total += 1
+            energy_db, zcr = frame_features(window, rate)
+            speech = classify_frames(energy_db, zcr)
+            if np.count_nonzero(speech) < vad.min_speech_frames:
+                fixed_silent += 1
+            elif len(speech) and speech[-1]:
+                fixed_cuts_in_speech += 1  # Window boundary landed mid-word
+
+        # VAD: stream the same audio in small blocks like the recorder does
+        block = int(rate * block_ms / 1000)
+        start = time.perf_counter()
+        for i in range(0, len(samples), block):
+            vad_segments.extend(vad.feed(samples[i:i + block]))
+        vad_cpu += time.perf_counter() - start
+
+    tail = vad.flush()
+    if tail is not None:
+        vad_segments.append(tail)
+
+    seg_seconds = [len(s) / rate for s in vad_segments]
+    fixed_calls = fixed_total * CALLS_PER_SEGMENT
+    vad_calls = len(vad_segments) * CALLS_PER_SEGMENT
+
+    print(f"Files: {len(paths)}  audio: {audio_seconds:.1f} s  speech frames: "
+          f"{100.0 * vad.speech_frames_seen / max(vad.frames_seen, 1):.1f}%")
+    print(f"Fixed {FIXED_SEGMENT_SECONDS}s windows: {fixed_total}  (silent: {fixed_silent}, "
+          f"cut mid-speech: {fixed_cuts_in_speech})  -> {fixed_calls} network calls")
+    print(f"VAD segments: {len(vad_segments)}  (noise bursts dropped: {vad.segments_dropped})  "
+          f"-> {vad_calls} network calls")
+    if seg_seconds:
+        print(f"VAD segment length: mean {np.mean(seg_seconds):.1f} s, "
+              f"min {np.min(seg_seconds):.1f} s, max {np.max(seg_seconds):.1f} s, "
+              f"audio sent {sum(seg_seconds):.1f} s of {audio_seconds:.1f} s")
+    print(f"Network calls saved: {fixed_calls - vad_calls} "
+          f"({100.0 * (fixed_calls - vad_calls) / max(fixed_calls, 1):.1f}%)")
+    print(f"VAD CPU: {1000.0 * vad_cpu:.1f} ms total, "
+          f"{1000.0 * vad_cpu / max(audio_seconds, 1e-9):.3f} ms per second of audio")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare VAD segmentation with fixed 10 s windows.")
+    parser.add_argument("paths", nargs="*", help="wav files (default: the checked-in segment_*.wav)")
+    parser.add_argument("--target-rate", type=int, help="resample before running the VAD")
+    parser.add_argument("--energy-threshold-db", type=float)
+    parser.add_argument("--zcr-threshold", type=float)
+    parser.add_argument("--hangover-ms", type=int)
+    parser.add_argument("--min-segment-ms", type=int)
+    parser.add_argument("--max-segment-ms", type=int)
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(ROOT, "segment_*.wav")))
+    options = {k: v for k, v in vars(args).items() if k != "paths" and v is not None}
+    run(paths, **options)
@@ -0,0 +1,189 @@
+import re
+import threading
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+MATCH_CUTOFF = 0.8  # Same similarity cutoff the old get_close_matches calls used
+MIN_FUZZY_LENGTH = 4  # Shorter words are only ever matched exactly
+MAX_CANDIDATES = 8  # Candidates re-scored with SequenceMatcher after trigram filtering
+
+_PUNCTUATION = re.compile(r"^(\W*)(.*?)(\W*)$")
+
+
+def normalize(text):
+    """Lower-case and collapse whitespace so aliases compare equal."""
+    return " ".join(text.lower().split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EntityIndex:
+    """Incrementally maintained index of entity names and their aliases.
+
+    Exact aliases (case-insensitive, multi-word allowed) resolve through a dict.
+    Fuzzy lookups first narrow the candidates with a trigram inverted index and
+    only run SequenceMatcher on the few best, so cost no longer grows with
+    every word times every entity. Lookups read the index under the same lock
+    as the writers (names are indexed on a background thread while transcripts
+    are corrected), but score the candidates after releasing it.
+    """
+
+    def __init__(self):
+        self.aliases = {}  # normalized alias -> canonical name
+        self.categories = {}  # canonical name -> category
+        self.learned = 0
+        self._postings = defaultdict(set)  # trigram -> aliases containing it
+        self._trigram_count = {}  # alias -> number of distinct trigrams
+        self._lengths = defaultdict(int)  # alias token count -> number of aliases with it
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.categories)
+
+    def add(self, name, category=None, aliases=()):
+        """Add or refresh an entity; its own name is always an alias."""
+        with self._lock:
+            self.categories[name] = category
+            for alias in (name, *aliases):
+                self._add_alias(normalize(alias), name)
+
+    def learn_alias(self, alias, name):
+        """Remember that `alias` means `name` (e.g. a transcription error we corrected)."""
+        key = normalize(alias)
+        with self._lock:
+            if name in self.categories and self.aliases.get(key) != name:
+                self._add_alias(key, name)
+                self.learned += 1
+
+    def remove(self, name):
+        with self._lock:
+            self.categories.pop(name, None)
+            for key in [k for k, v in self.aliases.items() if v == name]:
+                self._remove_alias(key)
+
+    def clear(self):
+        with self._lock:
+            self.aliases.clear()
+            self.categories.clear()
+            self._postings.clear()
+            self._trigram_count.clear()
+            self._lengths.clear()
+
+    def _add_alias(self, key, name):
+        if not key:
+            return
+        if key in self.aliases:
+            self.aliases[key] = name
+            return
+        self.aliases[key] = name
+        grams = trigrams(key)
+        for gram in grams:
+            self._postings[gram].add(key)
+        self._trigram_count[key] = len(grams)
+        self._lengths[len(key.split())] += 1
+
+    def _remove_alias(self, key):
+        self.aliases.pop(key, None)
+        for gram in trigrams(key):
+            self._postings[gram].discard(key)
+        self._trigram_count.pop(key, None)
+        n = len(key.split())
+        self._lengths[n] -= 1
+        if self._lengths[n] <= 0:
+            del self._lengths[n]
+
+    def match(self, phrase, cutoff=MATCH_CUTOFF):
+        """Return the canonical name for a phrase, or None if nothing is close enough."""
+        key = normalize(phrase)
+        grams = trigrams(key)
+        with self._lock:
+            name = self.aliases.get(key)
+            if name is not None or len(key) < MIN_FUZZY_LENGTH:
+                return name
+
+            # Only compare against aliases with the same number of words, so a neighbouring
+            # word is never swallowed into a multi-word name
+            words = key.count(" ")
+            counts = defaultdict(int)
+            for gram in grams:
+                for alias in self._postings.get(gram, ()):
+                    if alias.count(" ") == words:
+                        counts[alias] += 1
+            if not counts:
+                return None
+
+            # Dice coefficient on trigrams is a cheap upper-ish proxy for SequenceMatcher.ratio()
+            scored = sorted(((2.0 * c / (len(grams) + self._trigram_count[a]), a) for a, c in counts.items()),
+                            reverse=True)[:MAX_CANDIDATES]
+            names = {alias: self.aliases[alias] for _, alias in scored}
+
+        # SequenceMatcher is the slow part, so it runs on the copied candidates without the lock
+        best, best_ratio = None, cutoff
+        matcher = SequenceMatcher()
+        matcher.set_seq2(key)
+        for dice, alias in scored:
+            if dice < cutoff / 2:
+                break
+            matcher.set_seq1(alias)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = alias, ratio
+        return names[best] if best else None
+
+    def _scan(self, tokens, cutoff):
+        """Yield (start, length, core phrase, lead, trail, name) for every entity mention."""
+        with self._lock:
+            lengths = sorted(self._lengths, reverse=True)
+        i = 0
+        while i < len(tokens):
+            for n in lengths:
+                if i + n > len(tokens):
+                    continue
+                window = tokens[i:i + n]
+                lead = _PUNCTUATION.match(window[0]).group(1)
+                trail = _PUNCTUATION.match(window[-1]).group(3)
+                phrase = " ".join(window)
+                core = phrase[len(lead):len(phrase) - len(trail)] if trail else phrase[len(lead):]
+                if not core:
+                    continue
+                name = self.match(core, cutoff)
+                if name is None:
+                    continue
+                yield i, n, core, lead, trail, name
+                i += n
+                break
+            else:
+                i += 1
+
+    def correct(self, text, cutoff=MATCH_CUTOFF):
+        """Replace misheard entity names in a transcript.
+
+        Returns (corrected_text, corrections) where corrections is a list of
+        (original phrase, canonical name) pairs for every fuzzy replacement.
+        Multi-word names are matched greedily, longest first.
+        """
+        tokens = text.split()
+        out, corrections, position = [], [], 0
+        for start, n, core, lead, trail, name in self._scan(tokens, cutoff):
+            out.extend(tokens[position:start])
+            with self._lock:
+                known = normalize(core) in self.aliases
+            if normalize(core) != normalize(name) and not known:
+                corrections.append((core, name))
+            out.append(f"{lead}{name}{trail}")
+            position = start + n
+        out.extend(tokens[position:])
+        return " ".join(out), corrections
+
+    def find(self, text, cutoff=MATCH_CUTOFF):
+        """Canonical names of the entities mentioned (or aliased) in `text`, in order of appearance."""
+        names = []
+        for _, _, _, _, _, name in self._scan(text.split(), cutoff):
+            if name not in names:
+                names.append(name)
+        return names
@@ -0,0 +1,84 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = "llm_cache.db"
+MAX_ENTRIES = 5000  # Least recently used responses are evicted beyond this
+TTL_SECONDS = 7 * 24 * 3600  # Responses older than this are treated as misses
+
+
+def prompt_key(model, prompt, memory_version=None):
+    """SHA-256 of the model, the whitespace-normalized prompt and the memory version."""
+    digest = hashlib.sha256(model.encode("utf-8"))
+    digest.update(b"\0" + " ".join(prompt.split()).encode("utf-8"))
+    digest.update(b"\0" + str(memory_version).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LLMCache:
+    """Persistent SQLite store of chat completion texts keyed by prompt_key()."""
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, text TEXT, created REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached response text for `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT text, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row[0]
+
+    def put(self, key, model, text):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                               (key, model, text, now, now))
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used LIMIT ?)", (excess,))
+                self.evictions += excess
+            self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
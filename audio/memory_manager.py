@@ -1,38 +1,405 @@
+import hashlib
+import json
 import logging
-from collections import defaultdict
+import threading
+from contextlib import nullcontext
+from audio.entity_index import EntityIndex
+from audio.text_summarize import RollingSummary, estimate_tokens
+from audio.memory_store import CLEARED, HISTORY
+from services.event_log import log_event
+
+ENTITY_CATEGORIES = ("characters", "items", "locations")
+MAX_CHANGELOG = 10000  # Entity changes kept for diff(); older versions diff as "everything added"
+CONTEXT_TOKEN_BUDGET = 1000  # Default size limit of the memory context sent with each prompt
+RECENT_ENTITIES = 5  # Most recently updated entities always offered to the prompt, mentioned or not
+RECALL_TOKEN_BUDGET = 300  # Default size limit of the earlier transcripts recalled for a prompt
+
+
+class FrozenDict(dict):
+    """A dict that refuses mutation, so snapshots can be shared without copying."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("memory snapshots are read-only; use MemoryManager.update_memory")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def content_hash(description):
+    """Hash of a description, ignoring whitespace-only differences."""
+    return hashlib.sha1(" ".join(str(description).split()).encode("utf-8")).hexdigest()
+
+
+class MemoryDiff:
+    """Entities added, changed or removed between two memory versions.
+
+    `added` and `changed` map (category, name) to the new description, `removed`
+    lists (category, name) pairs. `activity` is the new recent activity summary,
+    or None if it did not change. A diff is truthy only when an entity changed.
+    """
+
+    def __init__(self, old_version, version, added=None, changed=None, removed=None, activity=None):
+        self.old_version = old_version
+        self.version = version
+        self.added = added or {}
+        self.changed = changed or {}
+        self.removed = removed or []
+        self.activity = activity
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def as_dict(self):
+        """Plain lists for structured logging."""
+        return {
+            "old_version": self.old_version,
+            "version": self.version,
+            "added": [[category, name, description] for (category, name), description in self.added.items()],
+            "changed": [[category, name, description] for (category, name), description in self.changed.items()],
+            "removed": [list(key) for key in self.removed],
+            "activity": self.activity,
+        }
+
+    def __repr__(self):
+        return (f"MemoryDiff({self.old_version}->{self.version}, added={list(self.added)}, "
+                f"changed={list(self.changed)}, removed={self.removed})")
+
 
 class MemoryManager:
-    def __init__(self):
-        # Initialize memory as a dictionary with categories for characters, items, locations, and recent activity
-        self.memory_table = {
-            "characters": defaultdict(str),
-            "items": defaultdict(str),
-            "locations": defaultdict(str),
+    def __init__(self, history=None, store=None, transcripts=None):
+        # Initialize memory as a dictionary with categories for characters, items, locations, and recent activity.
+        # The table is copy-on-write: every update publishes a new FrozenDict, so readers
+        # can hold on to a snapshot without locks and never see it change underneath them.
+        self.memory_table = FrozenDict({
+            "characters": FrozenDict(),
+            "items": FrozenDict(),
+            "locations": FrozenDict(),
             "recent_activity_summary": "",
-        }
-        # Set up logger to ensure all log entries are written to the dnd_app_log.txt
-        logging.basicConfig(
-            filename="dnd_app_log.txt",
-            filemode="a",
-            format="%(asctime)s - %(levelname)s - %(message)s",
-            level=logging.INFO
-        )
+        })
+        self.version = 0  # Incremented on every change that actually alters the table
+        self.hashes = {}  # (category, name) -> content hash of its description, see _stored_hash()
+        self.touched = {}  # (category, name) -> version of its last change, for recency
+        self._changelog = []  # (version, category, name, old hash, new hash), oldest first
+        self._changelog_floor = 0  # Oldest version diff() can answer exactly
+        self._lock = threading.Lock()
+        # Names (and learned misspellings) of every entity, for transcript correction
+        self.entity_index = EntityIndex()
+        # Every recent activity event, compacted into scene, session and campaign summaries;
+        # the table's recent_activity_summary only holds its latest raw events
+        self.history = history or RollingSummary()
+        self.history.on_compact = self._save_history
+        # Optional MemoryStore that journals every change so the campaign survives restarts
+        self.store = store
+        self.store_seq = 0  # Every journal entry up to this one is in the table, see refresh()
+        # Optional TranscriptStore: every transcript with its audio and image, searchable for recall()
+        self.transcripts = transcripts
+        self._snapshotting = None
+        self._indexing = None
+        if store is not None:
+            self._load(store.load())
+
+    def _publish(self, category, entries):
+        """Swap in a new table with one category replaced. Caller holds the lock."""
+        table = dict(self.memory_table)
+        table[category] = entries
+        self.memory_table = FrozenDict(table)
+
+    def _load(self, state):
+        """Replace the table and history with a (version, table, touched, seq, history) state read from the store."""
+        version, table, touched, seq, history = state
+        activity = table.get("recent_activity_summary", "")
+        with self._lock:
+            self.memory_table = FrozenDict({
+                category: FrozenDict(table.get(category, {})) for category in ENTITY_CATEGORIES
+            } | {"recent_activity_summary": activity})
+            self.version = max(self.version, version)  # Reloading never moves the version back
+            self.hashes = {}  # Filled in by _stored_hash() as entities are touched
+            self.touched = dict(touched)
+            self._changelog = []
+            self._changelog_floor = self.version  # Nothing older can be diffed exactly
+            self.store_seq = seq
+        # Stores written before the history was journaled only kept the latest events, joined into one
+        self.history.restore(history if history is not None else {"events": [activity] if activity else []})
+        # Indexing every name takes longer than reading the table, so it finishes in the background;
+        # until then transcript correction and select_context() just see fewer names
+        self.entity_index.clear()
+        self._indexing = threading.Thread(target=self._index_entities, args=(self.memory_table,),
+                                          name="entity-indexing", daemon=True)
+        self._indexing.start()
+        logging.info(f"Loaded memory version {version} with {len(self.touched)} entities")
+
+    def _index_entities(self, table):
+        for category in ENTITY_CATEGORIES:
+            for name in table[category]:
+                if name in self.memory_table[category]:  # Not removed meanwhile
+                    self.entity_index.add(name, category)
+
+    def _stored_hash(self, key):
+        """Content hash of a stored entity, or None. Caller holds the lock.
+
+        Entities loaded from the store are only hashed when first needed, which
+        keeps loading a large campaign fast.
+        """
+        content = self.hashes.get(key)
+        if content is None:
+            category, name = key
+            description = self.memory_table[category].get(name) if category in ENTITY_CATEGORIES else None
+            if description is not None:
+                content = self.hashes[key] = content_hash(description)
+        return content
+
+    def _journal(self, category, name, description):
+        """Write a change to the store and return its version. Caller holds the lock.
+
+        The store hands out versions, so a process sharing it never reuses one.
+        """
+        if self.store is None:
+            return self.version + 1
+        seq, version = self.store.append(category, name, description, self.version)
+        if seq == self.store_seq + 1:
+            self.store_seq = seq  # No other process wrote in between, so nothing was skipped
+        return version
+
+    def _journal_history(self):
+        """Write the history tiers to the store. Caller holds the lock."""
+        if self.store is not None:
+            self._journal(HISTORY, None, json.dumps(self.history.state(), separators=(",", ":")))
+
+    def _save_history(self):
+        # Called after a background compaction, so the summaries survive a restart
+        with self._lock:
+            self._journal_history()
+
+    def _snapshot_if_due(self):
+        # The table is immutable, so the snapshot is written in the background while updates go on
+        if self.store is None or not self.store.snapshot_due():
+            return
+        if self._snapshotting is not None and self._snapshotting.is_alive():
+            return
+        # Take in other writers' entries first, or the snapshot could only cover the journal up to theirs
+        self.refresh()
+        with self._lock:
+            args = (self.version, self.memory_table, dict(self.touched), self.store_seq, self.history.state())
+        self._snapshotting = threading.Thread(target=self.store.write_snapshot, args=args,
+                                              name="memory-snapshot", daemon=True)
+        self._snapshotting.start()
+
+    def _record(self, category, name, old_hash, new_hash, version=None):
+        self.version = self.version + 1 if version is None else version
+        self._changelog.append((self.version, category, name, old_hash, new_hash))
+        if len(self._changelog) > MAX_CHANGELOG:
+            dropped = len(self._changelog) - MAX_CHANGELOG
+            self._changelog_floor = self._changelog[dropped - 1][0]
+            del self._changelog[:dropped]
+
+    def _set_entities(self, category, descriptions):
+        """Store the entities of one category whose content changed. Returns their names.
+
+        The category is copied once for the whole batch, not once per entity.
+        """
+        new_hashes = {name: content_hash(description) for name, description in descriptions.items()}
+        changed = []
+        with self._lock:
+            entries = None
+            for name, description in descriptions.items():
+                old_hash = self._stored_hash((category, name))
+                if old_hash == new_hashes[name]:
+                    continue
+                if entries is None:
+                    entries = dict(self.memory_table[category])
+                entries[name] = description
+                self.hashes[(category, name)] = new_hashes[name]
+                self._record(category, name, old_hash, new_hashes[name], self._journal(category, name, description))
+                self.touched[(category, name)] = self.version
+                changed.append(name)
+            if entries is not None:
+                self._publish(category, FrozenDict(entries))
+        for name in changed:
+            self.entity_index.add(name, category)
+        if changed:
+            self._snapshot_if_due()
+        return changed
+
+    def _set_entity(self, category, name, description):
+        """Store one entity if its content changed. Returns True when it did."""
+        return bool(self._set_entities(category, {name: description}))
 
     def update_memory(self, category, name, description):
         """Update a specific memory category with a new or existing entry."""
-        if category in self.memory_table:
-            self.memory_table[category][name] = description
-            logging.info(f"Updated {category} memory for {name}: {description}")
-            self.log_memory_table()  # Log memory table after each update
+        if category in ENTITY_CATEGORIES:
+            if self._set_entity(category, name, description):
+                log_event("memory_delta", version=self.version, changed=[[category, name, description]])
+        elif category == "recent_activity_summary":
+            self.update_recent_activity(description)
+
+    def remove_entity(self, category, name):
+        """Forget an entity. Returns True if it was present."""
+        with self._lock:
+            if name not in self.memory_table.get(category, {}):
+                return False
+            entries = dict(self.memory_table[category])
+            del entries[name]
+            self._publish(category, FrozenDict(entries))
+            old_hash = self._stored_hash((category, name))
+            self.hashes.pop((category, name), None)
+            self.touched.pop((category, name), None)
+            self._record(category, name, old_hash, None, self._journal(category, name, None))
+        self.entity_index.remove(name)
+        self._snapshot_if_due()
+        log_event("memory_delta", version=self.version, removed=[[category, name]])
+        return True
+
+    def apply_update(self, updated_memory):
+        """Merge a parsed memory update (same layout as the table) in one go.
+
+        Entities whose description did not change are skipped, so they neither
+        bump the version nor show up in diff(). Returns the resulting MemoryDiff.
+        """
+        old_version = self.version
+        changed = False
+        # One journal transaction for the whole update
+        with self.store.batch() if self.store is not None else nullcontext():
+            for category in ENTITY_CATEGORIES:
+                entries = updated_memory.get(category) or {}
+                if not isinstance(entries, dict):
+                    logging.warning(f"Ignoring {category} update that is not a mapping: {entries!r}")
+                    continue
+                changed = bool(self._set_entities(category, {str(name): description
+                                                             for name, description in entries.items()})) or changed
+            activity = updated_memory.get("recent_activity_summary")
+            if activity:
+                self.update_recent_activity(activity)
+        diff = self.diff(old_version)
+        if diff or diff.activity is not None:
+            # Only what changed is logged; the table itself can be thousands of entities
+            log_event("memory_delta", **diff.as_dict())
+        return diff
+
+    def add_aliases(self, name, aliases):
+        """Register alternative spellings (e.g. common mishearings) for an entity or vocabulary word."""
+        self.entity_index.add(name, self.entity_index.categories.get(name), aliases)
 
     def update_recent_activity(self, activity):
-        """Update recent activity with new actions or descriptions."""
-        self.memory_table["recent_activity_summary"] = activity
-        logging.info(f"Updated recent activity: {activity}")
-        self.log_memory_table()  # Log memory table after each update
+        """Add new actions or descriptions (a string or a list of events) to the recent activity.
+
+        The table keeps only the latest events; older ones live on, summarized, in `history`.
+        """
+        new_events = self.history.add(activity)
+        if not new_events:
+            return
+        with self._lock:
+            window = " ".join(self.history.recent())
+            if self.memory_table["recent_activity_summary"] == window:
+                return
+            self._publish("recent_activity_summary", window)
+            self._record("recent_activity_summary", None, None, content_hash(window),
+                         self._journal("recent_activity_summary", None, window))
+            self._journal_history()
+        logging.debug(f"Updated recent activity: {' '.join(new_events)}")
+
+    def diff(self, old_version):
+        """Return the MemoryDiff between `old_version` and the current version."""
+        with self._lock:
+            version = self.version
+            table = self.memory_table
+            if old_version < self._changelog_floor:
+                # Too old to answer from the changelog: report every current entity as added
+                changes = [(category, name, None, self._stored_hash((category, name)))
+                           for category in ENTITY_CATEGORIES for name in table[category]]
+                changes.append(("recent_activity_summary", None, None, "?"))
+            else:
+                changes = [entry[1:] for entry in self._changelog if entry[0] > old_version]
+
+        first_old, last_new = {}, {}
+        for category, name, old_hash, new_hash in changes:
+            first_old.setdefault((category, name), old_hash)
+            last_new[(category, name)] = new_hash
+
+        result = MemoryDiff(old_version, version)
+        for key, new_hash in last_new.items():
+            category, name = key
+            old_hash = first_old[key]
+            if category == "recent_activity_summary":
+                result.activity = table["recent_activity_summary"]
+            elif old_hash == new_hash:
+                continue
+            elif old_hash is None:
+                result.added[key] = table[category][name]
+            elif new_hash is None:
+                result.removed.append(key)
+            else:
+                result.changed[key] = table[category][name]
+        return result
+
+    def select_context(self, text, token_budget=CONTEXT_TOKEN_BUDGET, recent=RECENT_ENTITIES):
+        """Pick the part of memory relevant to `text`, within a token budget.
+
+        Entities mentioned (or aliased) in the text come first, then the
+        `recent` most recently updated ones. Their descriptions are added until
+        the budget runs out. Returns (table, other_names): `table` has the usual
+        layout holding only the selected entities, `other_names` lists every
+        remaining entity name that still fits, so a prompt can refer to them.
+        """
+        with self._lock:
+            table = self.memory_table
+            touched = dict(self.touched)
+
+        def located(name):
+            category = self.entity_index.categories.get(name)
+            if category in ENTITY_CATEGORIES and name in table[category]:
+                return [(category, name)]
+            return [(c, name) for c in ENTITY_CATEGORIES if name in table[c]]
+
+        wanted = []
+        for name in self.entity_index.find(text):
+            wanted.extend(located(name))
+        by_recency = sorted(touched, key=touched.get, reverse=True)
+        wanted.extend(key for key in by_recency[:recent] if key not in wanted)
+
+        selected = {category: {} for category in ENTITY_CATEGORIES}
+        activity = table["recent_activity_summary"]
+        used = estimate_tokens(str(activity)) + 20  # Category headers and punctuation
+        for category, name in wanted:
+            description = table[category][name]
+            cost = estimate_tokens(f"'{name}': '{description}', ")
+            if used + cost > token_budget:
+                continue
+            selected[category][name] = description
+            used += cost
+
+        other_names = []
+        for key in by_recency:
+            category, name = key
+            if name in selected[category] or name in other_names:
+                continue
+            cost = estimate_tokens(name) + 1
+            if used + cost > token_budget:
+                break
+            other_names.append(name)
+            used += cost
+
+        selected["recent_activity_summary"] = activity
+        return selected, other_names
+
+    def recall(self, text, token_budget=RECALL_TOKEN_BUDGET):
+        """Earlier transcripts about the entities mentioned in `text`, as prompt text ("" without a store)."""
+        if self.transcripts is None:
+            return ""
+        names = self.entity_index.find(text)
+        return self.transcripts.recall(names, token_budget) if names else ""
+
+    def snapshot(self):
+        """Return (version, table) as an immutable pair that is safe to read without locks."""
+        with self._lock:
+            return self.version, self.memory_table
 
     def log_memory_table(self):
-        """Log the full current state of the memory table to the log file."""
+        """Log the full current state of the memory table, e.g. when debugging. Updates only log deltas."""
         logging.info("Current Memory Table State:")
         for category, entries in self.memory_table.items():
             if isinstance(entries, dict):
@@ -42,14 +409,106 @@ class MemoryManager:
                 logging.info(f"{category.capitalize()}: {entries}")
 
     def get_memory(self):
-        """Return the entire memory table."""
+        """Return the entire memory table (a read-only snapshot)."""
         return self.memory_table
-    
+
     def clear_memory(self):
-        # Clear all memory entries
-        self.memory = {
-            'characters': defaultdict(str),
-            'items': defaultdict(str),
-            'locations': defaultdict(str),
-            'recent_activity_summary': ''
-        }
+        """Forget every entity and the recent activity, and start the journal over."""
+        with self._lock:
+            removed = [(category, name) for category in ENTITY_CATEGORIES for name in self.memory_table[category]]
+            for category, name in removed:
+                self._record(category, name, self._stored_hash((category, name)), None)
+            self._record("recent_activity_summary", None, None, content_hash(""))
+            self.memory_table = FrozenDict({
+                "characters": FrozenDict(),
+                "items": FrozenDict(),
+                "locations": FrozenDict(),
+                "recent_activity_summary": "",
+            })
+            self.hashes = {}
+            self.touched = {}
+            if self.store is not None:
+                self.store_seq, self.version = self.store.clear(self.version)
+        self.entity_index.clear()
+        old = self.history
+        old.on_compact = None  # Its summaries belong to the forgotten campaign
+        self.history = RollingSummary(old.summarize, old.event_window, old.scene_window, old.session_window)
+        self.history.on_compact = self._save_history
+        old.close(wait=False)
+        logging.info("Cleared memory")
+
+    def refresh(self):
+        """Catch up with changes another process journaled to the same store. Returns True if any.
+
+        Every entry after `store_seq` is applied in journal order, including
+        this manager's own writes that followed another process's: applying
+        them again restores the order they were committed in. Entries that
+        change nothing are skipped, and the version only moves forward.
+        """
+        if self.store is None:
+            return False
+        entries = self.store.changes(self.store_seq)
+        if entries is None or any(entry[2] == CLEARED for entry in entries):
+            self._load(self.store.load())  # Folded into a newer snapshot, or cleared, meanwhile
+            return True
+        if not entries:
+            return False
+        added, removed, history = [], [], None
+        with self._lock:
+            categories = {}
+            for _, version, category, name, description in entries:
+                if category == HISTORY:
+                    history = json.loads(description)
+                    continue
+                if category == "recent_activity_summary":
+                    description = description or ""
+                    if description == self.memory_table[category]:
+                        continue
+                    old_hash, new_hash = None, content_hash(description)
+                    self._publish(category, description)
+                else:
+                    if category not in categories:
+                        categories[category] = dict(self.memory_table[category])
+                    current = categories[category].get(name)
+                    old_hash = None if current is None else self.hashes.get((category, name)) or content_hash(current)
+                    new_hash = None if description is None else content_hash(description)
+                    if old_hash == new_hash:
+                        continue
+                    if description is None:
+                        categories[category].pop(name, None)
+                        self.hashes.pop((category, name), None)
+                        self.touched.pop((category, name), None)
+                        removed.append(name)
+                    else:
+                        categories[category][name] = description
+                        self.hashes[(category, name)] = new_hash
+                        added.append((name, category))
+                # The writer's version, unless this manager is already past it
+                self._record(category, name, old_hash, new_hash, max(version, self.version + 1))
+                if new_hash is not None and category != "recent_activity_summary":
+                    self.touched[(category, name)] = self.version
+            for category, category_entries in categories.items():
+                self._publish(category, FrozenDict(category_entries))
+            self.store_seq = entries[-1][0]
+        if history is not None:
+            self.history.restore(history)
+        for name in removed:
+            self.entity_index.remove(name)
+        for name, category in added:
+            self.entity_index.add(name, category)
+        return True
+
+    def wait(self):
+        """Wait for a snapshot or name indexing still running in the background."""
+        for thread in (self._snapshotting, self._indexing):
+            if thread is not None:
+                thread.join()
+
+    def close(self):
+        """Finish background work and close the stores."""
+        self.history.wait()  # A compaction still running journals its summaries when done
+        self.wait()
+        if self.store is not None:
+            self.store.close()
+        if self.transcripts is not None:
+            self.transcripts.close()
@@ -0,0 +1,221 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+STORE_PATH = "campaign_memory.db"
+SNAPSHOT_EVERY = 2000  # Journal entries written before the table is snapshotted and the journal trimmed
+BUSY_TIMEOUT_MS = 5000  # How long a writer waits for another process holding the write lock
+CLEARED = "*"  # Journal category of a clear_memory() entry
+HISTORY = "history"  # Journal category of the rolling history's tiers, stored as JSON
+
+
+class MemoryStore:
+    """Durable SQLite home of a MemoryManager's table: an append-only journal plus snapshots.
+
+    Every change is one journal row (description NULL means the entity was
+    removed). Every SNAPSHOT_EVERY entries the whole table is written as one
+    compact snapshot row and the journal before it is deleted, so loading is
+    one snapshot read plus a short replay. The database is in WAL mode: other
+    processes (e.g. the Tk app and the Flask server) can read the campaign
+    while it is written, and catch up with changes().
+
+    Several processes may also write the same campaign. Versions are assigned
+    here, inside the write transaction, so two writers never hand out the same
+    one, and a snapshot records the journal seq it covers rather than a
+    version: only entries its writer had applied are ever trimmed.
+    """
+
+    def __init__(self, path=STORE_PATH, snapshot_every=SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.since_snapshot = 0  # Journal entries written after the newest snapshot
+        self.snapshots = 0
+        self._batch = 0
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # Durable across crashes of the app; WAL keeps it consistent
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, version INTEGER, category TEXT, name TEXT,"
+            " description TEXT, created REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots (version INTEGER PRIMARY KEY, seq INTEGER, created REAL, data TEXT)"
+        )
+        self._conn.commit()
+
+    def _begin(self):
+        """Take the database write lock unless this connection already holds it. Caller holds the lock."""
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN IMMEDIATE")
+
+    def _next_version(self, after):
+        """One more than any version in the store and `after`. Caller holds the write lock."""
+        # Versions grow with seq, so the newest journal row has the highest
+        journal = self._conn.execute("SELECT version FROM journal ORDER BY seq DESC LIMIT 1").fetchone()
+        snapshot = self._conn.execute("SELECT MAX(version) FROM snapshots").fetchone()
+        return max(journal[0] if journal else 0, snapshot[0] or 0, after) + 1
+
+    def _insert(self, version, category, name, description):
+        cursor = self._conn.execute("INSERT INTO journal (version, category, name, description, created) "
+                                    "VALUES (?, ?, ?, ?, ?)", (version, category, name, description, time.time()))
+        self.since_snapshot += 1
+        return cursor.lastrowid
+
+    def append(self, category, name, description, after=0):
+        """Journal one change and return its (seq, version). Committed at once unless inside batch().
+
+        The version is higher than any in the store and than `after`, the
+        caller's current version.
+        """
+        with self._lock:
+            self._begin()
+            version = self._next_version(after)
+            seq = self._insert(version, category, name, description)
+            if not self._batch:
+                self._conn.commit()
+            return seq, version
+
+    @contextmanager
+    def batch(self):
+        """Commit the journal entries written inside the block in one transaction.
+
+        The store lock is not held in between, so other threads can keep
+        appending; their entries are committed with the batch.
+        """
+        with self._lock:
+            self._batch += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch -= 1
+                if not self._batch:
+                    self._conn.commit()
+
+    def snapshot_due(self):
+        return self.since_snapshot >= self.snapshot_every
+
+    def write_snapshot(self, version, table, touched, seq, history=None):
+        """Store the table as of `version` and drop the journal entries up to `seq` it covers.
+
+        `table` must be an immutable snapshot (MemoryManager.snapshot()), so this
+        can run on a background thread while updates continue. It must hold
+        every journal entry up to `seq`; later ones it already holds are
+        harmless, since replaying them sets the same values again. `history`
+        is the rolling history's state(). Nothing is written if another writer
+        already stored a snapshot covering as much. Inside a batch() the
+        snapshot is committed along with it.
+        """
+        data = json.dumps({
+            "table": table,
+            # (category, name) -> version of its last change, so recency survives a restart
+            "touched": [[category, name, v] for (category, name), v in touched.items()],
+            "history": history,
+        }, separators=(",", ":"))
+        with self._lock:
+            self._begin()
+            newest = self._conn.execute("SELECT MAX(seq) FROM snapshots").fetchone()[0]
+            written = newest is None or newest < seq
+            if written:
+                self._conn.execute("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)",
+                                   (version, seq, time.time(), data))
+                self._conn.execute("DELETE FROM snapshots WHERE seq < ?", (seq,))
+                self._conn.execute("DELETE FROM journal WHERE seq <= ?", (seq,))
+            if not self._batch:  # Otherwise it is committed with the batch, never half of it
+                self._conn.commit()
+            self.since_snapshot = self._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+            if written:
+                self.snapshots += 1
+        if written:
+            logging.info(f"Memory snapshot written at version {version} (journal seq {seq})")
+
+    def load(self):
+        """Return (version, table, touched, seq, history) from the newest snapshot plus the journal after it.
+
+        `table` has the usual layout with plain dicts; `seq` is the last journal
+        entry applied, for changes(). `history` is the last state() of the
+        rolling history, or None if none was stored.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, seq, data FROM snapshots ORDER BY seq DESC LIMIT 1").fetchone()
+            version, seq, table, touched, history = 0, 0, None, {}, None
+            if row is not None:
+                version, seq = row[0], row[1]
+                data = json.loads(row[2])
+                table = data["table"]
+                touched = {(category, name): v for category, name, v in data["touched"]}
+                history = data.get("history")
+            entries = self._conn.execute(
+                "SELECT seq, version, category, name, description FROM journal WHERE seq > ? ORDER BY seq",
+                (seq,)).fetchall()
+            self.since_snapshot = len(entries)
+        return replay_journal(version, table, touched, entries, seq, history)
+
+    def changes(self, seq):
+        """Journal entries after `seq`, as (seq, version, category, name, description) rows.
+
+        None when entries were already folded into a newer snapshot; load() again then.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(seq) FROM snapshots").fetchone()
+            if row[0] is not None and row[0] > seq:
+                return None
+            return self._conn.execute(
+                "SELECT seq, version, category, name, description FROM journal WHERE seq > ? ORDER BY seq",
+                (seq,)).fetchall()
+
+    def clear(self, after=0):
+        """Forget the whole campaign: the journal restarts from an empty table.
+
+        Returns the (seq, version) of the clearing entry; the version is still
+        higher than any handed out before.
+        """
+        with self._lock:
+            self._begin()
+            version = self._next_version(after)
+            self._conn.execute("DELETE FROM snapshots")
+            self._conn.execute("DELETE FROM journal")
+            seq = self._insert(version, CLEARED, None, None)
+            if not self._batch:
+                self._conn.commit()
+            self.since_snapshot = 0
+            return seq, version
+
+    def stats(self):
+        with self._lock:
+            journal = self._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+        return {"journal_entries": journal, "since_snapshot": self.since_snapshot, "snapshots": self.snapshots}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def empty_table():
+    return {"characters": {}, "items": {}, "locations": {}, "recent_activity_summary": ""}
+
+
+def replay_journal(version, table, touched, entries, seq=0, history=None):
+    """Apply journal rows to a table. Returns (version, table, touched, last seq, history)."""
+    table = table or empty_table()
+    for seq, entry_version, category, name, description in entries:
+        version = max(version, entry_version)
+        if category == CLEARED:
+            table, touched, history = empty_table(), {}, None
+        elif category == HISTORY:
+            history = json.loads(description)
+        elif category == "recent_activity_summary":
+            table[category] = description or ""
+        elif description is None:
+            table.setdefault(category, {}).pop(name, None)
+            touched.pop((category, name), None)
+        else:
+            table.setdefault(category, {})[name] = description
+            touched[(category, name)] = entry_version
+    return version, table, touched, seq, history
@@ -0,0 +1,74 @@
+import math
+import numpy as np
+
+TARGET_RATE = 16000  # Speech recognition does not need more than 16 kHz
+TAPS_PER_PHASE = 24  # Filter length per polyphase branch; longer = sharper anti-aliasing
+
+
+def design_filter(up, down, taps_per_phase=TAPS_PER_PHASE, beta=8.0):
+    """Kaiser-windowed sinc low-pass for rational resampling by up/down."""
+    length = up * taps_per_phase
+    cutoff = 0.5 / max(up, down) * 0.95  # Normalised to the upsampled rate, a little under Nyquist
+    n = np.arange(length) - (length - 1) / 2.0
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, beta)
+    return (h / h.sum() * up).astype(np.float32)  # Unity gain per output phase
+
+
+class Resampler:
+    """Streaming polyphase resampler for int16 mono audio.
+
+    Conceptually upsamples by `up`, low-pass filters and keeps every `down`-th
+    sample, but only the filter taps that land on real input samples are
+    evaluated, all outputs of a block at once. State is carried across calls so
+    blocks from the audio callback can be fed one at a time without seams.
+    """
+
+    def __init__(self, in_rate, out_rate, taps_per_phase=TAPS_PER_PHASE):
+        g = math.gcd(int(in_rate), int(out_rate))
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.up = int(out_rate) // g
+        self.down = int(in_rate) // g
+        self.taps = taps_per_phase
+        h = design_filter(self.up, self.down, taps_per_phase)
+        # bank[p, k] = h[p + k * up]: the taps applied to x[i - k] for output phase p
+        self.bank = h.reshape(taps_per_phase, self.up).T.copy()
+        self.reset()
+
+    def reset(self):
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._history_start = -(self.taps - 1)  # Global input index of _history[0]
+        self._next_out = 0  # Global index of the next output sample
+
+    def process(self, samples):
+        """Resample a block of int16 samples and return the int16 output produced so far."""
+        x = np.concatenate((self._history, np.asarray(samples, dtype=np.float32)))
+        end = self._history_start + len(x)  # One past the last global input index available
+
+        # Output n sits at upsampled position n * down, i.e. input index (n * down) // up
+        last_out = (end * self.up - 1) // self.down  # Largest n whose input index is < end
+        n = np.arange(self._next_out, last_out + 1, dtype=np.int64)
+        if len(n):
+            pos = n * self.down
+            idx = pos // self.up - self._history_start
+            phase = pos % self.up
+            window = idx[:, None] - np.arange(self.taps)[None, :]
+            y = np.einsum('ij,ij->i', x[window], self.bank[phase])
+            self._next_out = int(n[-1]) + 1
+        else:
+            y = np.empty(0, dtype=np.float32)
+
+        self._history = x[-(self.taps - 1):].copy()
+        self._history_start = end - (self.taps - 1)
+        return np.clip(np.rint(y), -32768, 32767).astype(np.int16)
+
+
+def resample(samples, in_rate, out_rate=TARGET_RATE):
+    """Resample a complete int16 buffer in one call."""
+    if in_rate == out_rate:
+        return np.asarray(samples, dtype=np.int16)
+    resampler = Resampler(in_rate, out_rate)
+    # Flush the filter delay with trailing zeros so the end of the buffer is not lost
+    out = resampler.process(np.concatenate((np.asarray(samples, dtype=np.int16),
+                                            np.zeros(resampler.taps, dtype=np.int16))))
+    return out[:int(round(len(samples) * out_rate / in_rate))]
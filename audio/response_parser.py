@@ -0,0 +1,219 @@
+import ast
+import logging
+import re
+
+# Section headers of a memory-update response, mapped to memory table keys
+MEMORY_SECTIONS = {
+    "characters": "characters",
+    "items": "items",
+    "locations": "locations",
+    "recent activity": "recent_activity_summary",
+}
+MAX_DECISION_PREAMBLE = 300  # Give up on a decision reply that has not said what it wants by now
+
+_SECTION_HEADER = re.compile(r"(characters|items|locations|recent activity)\s*:\s*", re.IGNORECASE)
+# "no image" opening the reply or one of its lines, as a whole phrase (not "no imagery"); the
+# character after it must have arrived, so a stream stopping at "no image" is settled by finish()
+_NO_IMAGE = re.compile(r"^[^\w\n]*no image(?=\W)", re.IGNORECASE | re.MULTILINE)
+_NO_IMAGE_AT_END = re.compile(r"^[^\w\n]*no image\W*$", re.IGNORECASE | re.MULTILINE)
+_NO_IMAGE_LINE = re.compile(r"^[^\w\n]*no image(?!\w)", re.IGNORECASE | re.MULTILINE)
+# Only this much of a decision reply is searched for its answer, so the outcome never depends on
+# how the stream was chunked: an answer starting within the preamble limit has arrived in full by then
+_DECISION_WINDOW = MAX_DECISION_PREAMBLE + len("generate image:")
+_CLOSING = {"{": "}", "[": "]"}
+# 'name': 'description' pairs, for dicts literal_eval rejects (e.g. an unescaped apostrophe)
+_LENIENT_PAIR = re.compile(r"""(['"])(.+?)\1\s*:\s*(['"])(.*?)\3\s*(?=,\s*['"]|\s*$)""", re.DOTALL)
+_LENIENT_ITEM = re.compile(r"""(['"])(.*?)\1\s*(?=,\s*['"]|\s*$)""", re.DOTALL)
+
+
+def parse_literal(text):
+    """Parse a dict or list literal from model output without executing anything.
+
+    Tries ast.literal_eval first and falls back to picking out quoted pairs or
+    items, which copes with the unescaped apostrophes the model often writes.
+    Returns None when nothing usable is found.
+    """
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        pass
+    inner = text.strip()[1:-1].strip()
+    if text.lstrip().startswith("{"):
+        pairs = _LENIENT_PAIR.findall(inner)
+        return {key: value for _, key, _, value in pairs} if pairs else None
+    items = _LENIENT_ITEM.findall(inner)
+    return [value for _, value in items] if items else None
+
+
+def _as_entities(value, section):
+    if isinstance(value, dict):
+        return {str(name).strip(): str(description).strip() for name, description in value.items()}
+    # e.g. "Locations: {'King r'}" parses as a set: names without descriptions, nothing to store
+    logging.warning(f"Ignoring {section} section that is not a name: description mapping: {value!r}")
+    return None
+
+
+def _as_activity(value):
+    if isinstance(value, (list, tuple)):
+        return [str(entry).strip() for entry in value if str(entry).strip()]
+    if isinstance(value, str):
+        return [value.strip()]
+    return None
+
+
+class MemoryUpdateParser:
+    """Incrementally parses a "Characters: {...}  Items: {...} ..." memory update.
+
+    Feed it text as it streams in; each section is parsed as soon as its
+    closing bracket arrives. `done` turns True once the recent activity list
+    (always the last section) is complete, so the rest of the stream can be
+    dropped. `result()` has the memory table layout and only holds the
+    sections the reply contained.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.sections = {}
+        self.done = False
+        self._position = 0  # Everything before this has been consumed
+
+    def feed(self, chunk):
+        """Add streamed text. Returns the table keys of the sections completed by it."""
+        self.text += chunk
+        completed = []
+        while not self.done:
+            header = _SECTION_HEADER.search(self.text, self._position)
+            if header is None:
+                break
+            start = header.end()
+            if start >= len(self.text):
+                break  # The value has not started yet
+            opening = self.text[start]
+            if opening not in _CLOSING:
+                self._position = start  # e.g. "Items: none"; skip it
+                continue
+            end = self._find_closing(start)
+            if end is None:
+                break  # Wait for more text
+            key = MEMORY_SECTIONS[header.group(1).lower()]
+            value = parse_literal(self.text[start:end + 1])
+            if key == "recent_activity_summary":
+                value = _as_activity(value)
+                self.done = True
+            else:
+                value = _as_entities(value, key)
+            if value is not None:
+                self.sections[key] = value
+                completed.append(key)
+            self._position = end + 1
+        return completed
+
+    def _find_closing(self, start):
+        # Plain bracket depth: quotes are not tracked because the model's quoting is
+        # unreliable, and braces inside descriptions are far rarer than apostrophes
+        opening, closing = self.text[start], _CLOSING[self.text[start]]
+        depth = 0
+        for i in range(start, len(self.text)):
+            if self.text[i] == opening:
+                depth += 1
+            elif self.text[i] == closing:
+                depth -= 1
+                if depth == 0:
+                    return i
+        return None
+
+    def result(self):
+        return dict(self.sections)
+
+    @property
+    def remainder(self):
+        """Text after the last parsed section."""
+        return self.text[self._position:]
+
+
+class DecisionParser:
+    """Incrementally parses an image decision: "generate image: <prompt>" or "no image".
+
+    `decision` becomes "generate" once the prompt line is complete (at its
+    newline, or when the stream ends), "none" as soon as a line starts with "no image",
+    and "unexpected" when the reply says neither within MAX_DECISION_PREAMBLE
+    characters (an answer after that is ignored). `done` is True once it is known.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.decision = None
+        self.prompt = None
+
+    @property
+    def done(self):
+        return self.decision is not None
+
+    def feed(self, chunk):
+        self.text += chunk
+        if self.done:
+            return True
+        lower = self.text.lower()
+        marker = lower.find("generate image:", 0, _DECISION_WINDOW)
+        if marker >= 0:
+            rest = self.text[marker + len("generate image:"):].lstrip()
+            line_end = rest.find("\n")
+            if line_end > 0:
+                self.prompt = rest[:line_end].strip()
+                self.decision = "generate"
+        elif _NO_IMAGE.search(self.text, 0, _DECISION_WINDOW):
+            self.decision = "none"
+        elif len(self.text) >= _DECISION_WINDOW:
+            self.decision = "unexpected"
+        return self.done
+
+    def finish(self):
+        """Call when the stream ends; settles a prompt that ran to the end of the reply."""
+        if self.done:
+            return self.decision
+        marker = self.text.lower().find("generate image:")
+        if marker >= 0:
+            self.prompt = self.text[marker + len("generate image:"):].strip()
+        if self.prompt:
+            self.decision = "generate"
+        elif _NO_IMAGE_AT_END.search(self.text):
+            self.decision = "none"
+        else:
+            self.decision = "unexpected"
+        return self.decision
+
+
+class SceneAnalysisParser:
+    """Parses a combined reply: a memory update followed by an image decision.
+
+    The decision line is only looked for after the recent activity section, so
+    words in descriptions cannot be mistaken for it; if the model puts it
+    elsewhere, finish() searches the whole reply.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.memory = MemoryUpdateParser()
+        self.decision = DecisionParser()
+
+    @property
+    def done(self):
+        return self.decision.done
+
+    def feed(self, chunk):
+        self.text += chunk
+        if not self.memory.done:
+            self.memory.feed(chunk)
+            if self.memory.done:
+                self.decision.feed(self.memory.remainder)
+        elif not self.decision.done:
+            self.decision.feed(chunk)
+        return self.done
+
+    def finish(self):
+        if not self.memory.done and not self.decision.done:
+            # The memory update never completed, so the decision may be anywhere: start at its line
+            starts = [match.start() for match in _NO_IMAGE_LINE.finditer(self.text)]
+            start = max(starts + [self.text.lower().rfind("generate image:"), 0])
+            self.decision.feed(self.text[start:])
+        return self.decision.finish()
@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-size single-producer/single-consumer ring buffer of int16 samples.
+
+    Every sample is written twice (at ``i`` and ``i + capacity``) so any window of up
+    to ``capacity`` samples is contiguous in memory and can be handed out as a numpy
+    view without copying. The producer (the PyAudio callback) never waits on the
+    consumer: if the consumer falls more than ``capacity`` samples behind, the oldest
+    audio is overwritten and counted in ``overruns`` / ``dropped_frames``.
+    """
+
+    def __init__(self, capacity, dtype=np.int16):
+        self.capacity = int(capacity)
+        self._buffer = np.zeros(2 * self.capacity, dtype=dtype)
+        self.write_pos = 0  # Total samples ever written (monotonic)
+        self.read_pos = 0  # Total samples ever handed to the consumer
+        self.overruns = 0  # Number of reads that found overwritten audio
+        # Each side counts its own losses, so every counter has a single writer thread
+        self._write_dropped = 0  # Samples cut from writes larger than the buffer (producer)
+        self._read_dropped = 0  # Samples overwritten before they were read (consumer)
+
+    @property
+    def dropped_frames(self):
+        """Samples lost to overruns."""
+        return self._write_dropped + self._read_dropped
+
+    def write(self, samples):
+        """Copy samples into the buffer. Called from the audio callback thread."""
+        samples = np.asarray(samples, dtype=self._buffer.dtype)
+        n = len(samples)
+        if n > self.capacity:
+            # A single write larger than the buffer can only keep its tail
+            self._write_dropped += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+
+        cap = self.capacity
+        start = self.write_pos % cap
+        first = min(n, cap - start)
+        rest = n - first
+        self._buffer[start:start + first] = samples[:first]
+        self._buffer[start + cap:start + cap + first] = samples[:first]
+        if rest:
+            self._buffer[:rest] = samples[first:]
+            self._buffer[cap:cap + rest] = samples[first:]
+
+        # Publish only after the copy so the reader never sees half-written audio
+        self.write_pos += n
+
+    def available(self):
+        """Return the number of unread samples (capped at capacity)."""
+        return min(self.write_pos - self.read_pos, self.capacity)
+
+    def read(self, max_samples=None):
+        """Return unread samples as a zero-copy view and advance the read cursor.
+
+        The view aliases the ring storage. Its first sample is overwritten once the
+        producer writes ``capacity - unread`` more samples, where ``unread`` is what
+        was pending when read() was called (including anything beyond
+        ``max_samples``). After an overrun the buffer is full, so the head of the
+        view is overwritten by the very next write. Copy it if it needs to live
+        longer, or read often enough that little is pending.
+        """
+        write_pos = self.write_pos
+        pending = write_pos - self.read_pos
+        if pending > self.capacity:
+            lost = pending - self.capacity
+            self.overruns += 1
+            self._read_dropped += lost
+            self.read_pos = write_pos - self.capacity
+            pending = self.capacity
+
+        if max_samples is not None:
+            pending = min(pending, int(max_samples))
+
+        start = self.read_pos % self.capacity
+        view = self._buffer[start:start + pending]
+        self.read_pos += pending
+        return view
+
+    def clear(self):
+        """Drop any unread audio without touching the counters."""
+        self.read_pos = self.write_pos
@@ -0,0 +1,60 @@
+import logging
+import queue
+import threading
+import wave
+import numpy as np
+
+SPOOL_QUEUE_SIZE = 32  # Segments waiting to be written before new ones are dropped
+
+
+class SegmentSpooler:
+    """Writes audio segments to .wav files on a background thread.
+
+    The processing loop hands segments over with `submit` and never waits on the
+    disk. If the writer falls behind and the queue fills up, new segments are
+    dropped (and counted) rather than stalling transcription.
+    """
+
+    def __init__(self, rate, channels=1, sample_width=2, max_queue=SPOOL_QUEUE_SIZE):
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, filename, samples):
+        """Queue a segment for writing. Returns False if it had to be dropped."""
+        try:
+            self.queue.put_nowait((filename, samples))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logging.warning(f"Segment spool queue full, not archiving {filename}")
+            return False
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            filename, samples = item
+            try:
+                with wave.open(filename, 'wb') as wf:
+                    wf.setnchannels(self.channels)
+                    wf.setsampwidth(self.sample_width)
+                    wf.setframerate(self.rate)
+                    wf.writeframes(np.ascontiguousarray(samples).tobytes())
+                self.written += 1
+            except OSError as e:
+                logging.error(f"Error archiving segment {filename}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def close(self):
+        """Write out everything still queued and stop the writer thread."""
+        self.queue.put(None)
+        self._thread.join()
@@ -0,0 +1,161 @@
+import bisect
+import glob
+import json
+import logging
+import os
+import struct
+import time
+import numpy as np
+
+HEADER_BYTES = 44  # Canonical PCM WAV header
+HEADER_FIXUP_SECONDS = 5  # How often the RIFF/data sizes are patched so a crash leaves a playable file
+INDEX_INTERVAL_SECONDS = 1.0  # Spacing of timestamp -> offset entries in the sidecar index
+MAX_FILE_BYTES = 512 * 1024 * 1024  # Rotate before files get unwieldy (~4.6 h at 16 kHz mono)
+MAX_FILE_SECONDS = 60 * 60  # ...or after an hour, whichever comes first
+
+
+def _wav_header(rate, channels, sample_width, data_bytes):
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_bytes, b'WAVE',
+        b'fmt ', 16, 1, channels, rate, rate * channels * sample_width,
+        channels * sample_width, sample_width * 8,
+        b'data', data_bytes,
+    )
+
+
+class SessionArchive:
+    """Constant-memory session recorder that streams audio to rotating .wav files.
+
+    Audio is appended as it is captured instead of being joined at the end of the
+    session. Each file gets a sidecar ``.idx`` (JSON lines) mapping wall-clock
+    times to frame and byte offsets, so `read_range` can pull any stretch back with
+    a memory map instead of loading the session.
+    """
+
+    def __init__(self, directory=".", rate=16000, channels=1, sample_width=2, prefix="recording",
+                 max_file_bytes=MAX_FILE_BYTES, max_file_seconds=MAX_FILE_SECONDS):
+        self.directory = directory
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.prefix = prefix
+        self.max_file_bytes = max_file_bytes
+        self.max_file_seconds = max_file_seconds
+        self.files = []  # Every .wav written by this archive, oldest first
+        self.path = None  # The .wav currently being written
+        self._file = None
+        self._index = None
+
+    def append(self, samples, timestamp=None):
+        """Append int16 samples. `timestamp` is the wall-clock time of the first sample."""
+        samples = np.ascontiguousarray(samples, dtype=np.int16)
+        if len(samples) == 0:
+            return
+        if timestamp is None:
+            timestamp = time.time() - len(samples) / (self.rate * self.channels)
+
+        if self._file is None or self._should_rotate(len(samples) * self.sample_width):
+            self._open(timestamp)
+
+        frame = self._data_bytes // (self.sample_width * self.channels)
+        if timestamp - self._last_index_time >= INDEX_INTERVAL_SECONDS:
+            self._write_index(timestamp, frame)
+
+        self._file.write(samples.tobytes())
+        self._data_bytes += samples.nbytes
+        if time.monotonic() - self._last_fixup >= HEADER_FIXUP_SECONDS:
+            self._fix_header()
+
+    def _should_rotate(self, incoming_bytes):
+        too_big = HEADER_BYTES + self._data_bytes + incoming_bytes > self.max_file_bytes
+        too_long = self._data_bytes / (self.rate * self.channels * self.sample_width) >= self.max_file_seconds
+        return too_big or too_long
+
+    def _open(self, timestamp):
+        self.close()
+        base = os.path.join(self.directory, f"{self.prefix}_{int(timestamp)}")
+        path, n = base + ".wav", 1
+        while os.path.exists(path):
+            path, n = f"{base}_{n}.wav", n + 1
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(_wav_header(self.rate, self.channels, self.sample_width, 0))
+        self._index = open(os.path.splitext(path)[0] + ".idx", 'w')
+        self._data_bytes = 0
+        self._last_index_time = float('-inf')
+        self._last_fixup = time.monotonic()
+        self.files.append(path)
+        logging.info(f"Archiving session audio to {path}")
+
+    def _write_index(self, timestamp, frame):
+        entry = {"time": round(timestamp, 3), "frame": frame,
+                 "offset": HEADER_BYTES + frame * self.sample_width * self.channels}
+        self._index.write(json.dumps(entry) + "\n")
+        self._index.flush()
+        self._last_index_time = timestamp
+
+    def _fix_header(self):
+        self._file.flush()
+        position = self._file.tell()
+        self._file.seek(4)
+        self._file.write(struct.pack('<I', 36 + self._data_bytes))
+        self._file.seek(40)
+        self._file.write(struct.pack('<I', self._data_bytes))
+        self._file.seek(position)
+        self._file.flush()
+        self._last_fixup = time.monotonic()
+
+    def close(self):
+        """Finalize the current file. The archive reopens a new file on the next append."""
+        if self._file is not None:
+            self._fix_header()
+            self._file.close()
+            self._index.close()
+            self._file = self._index = None
+
+
+def _load_index(idx_path):
+    with open(idx_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def read_range(directory, start_time, end_time, prefix="recording"):
+    """Return int16 audio between two wall-clock times from an archive directory.
+
+    Only the index files are read in full; audio is sliced out of memory-mapped
+    .wav files, so this is cheap even for multi-hour sessions.
+    """
+    pieces = []
+    for idx_path in sorted(glob.glob(os.path.join(directory, f"{prefix}_*.idx"))):
+        entries = _load_index(idx_path)
+        wav_path = os.path.splitext(idx_path)[0] + ".wav"
+        if not entries or not os.path.exists(wav_path):
+            continue
+
+        with open(wav_path, 'rb') as f:
+            header = f.read(HEADER_BYTES)
+        channels, rate = struct.unpack('<HI', header[22:28])
+        sample_width = struct.unpack('<H', header[34:36])[0] // 8
+        n_frames = (os.path.getsize(wav_path) - HEADER_BYTES) // (sample_width * channels)
+        file_end = entries[-1]["time"] + (n_frames - entries[-1]["frame"]) / rate
+        if end_time <= entries[0]["time"] or start_time >= file_end or n_frames == 0:
+            continue
+
+        times = [e["time"] for e in entries]
+
+        def to_frame(t):
+            # Interpolate from the nearest index entry at or before t
+            i = max(bisect.bisect_right(times, t) - 1, 0)
+            frame = entries[i]["frame"] + int(round((t - entries[i]["time"]) * rate))
+            return min(max(frame, 0), n_frames)
+
+        first, last = to_frame(start_time), to_frame(end_time)
+        if last > first:
+            data = np.memmap(wav_path, dtype=np.int16, mode='r', offset=HEADER_BYTES,
+                             shape=(n_frames * channels,))
+            pieces.append(np.array(data[first * channels:last * channels]))
+
+    if not pieces:
+        return np.empty(0, dtype=np.int16)
+    return np.concatenate(pieces)
@@ -0,0 +1,112 @@
+import logging
+import time
+from collections import namedtuple
+import numpy as np
+import speech_recognition as sr
+
+PARTIAL_INTERVAL_SECONDS = 1.5  # Re-decode the growing utterance after this much new audio
+STABLE_AGREEMENT = 2  # A word is stable once this many consecutive partials agree on it
+
+# kind is "partial" or "final"; stable_text is the prefix that later partials will not change
+TranscriptEvent = namedtuple("TranscriptEvent", "kind text stable_text audio_seconds latency")
+
+
+def sphinx_engine(recognizer=None):
+    """Offline CPU engine using speech_recognition's PocketSphinx recognizer."""
+    recognizer = recognizer or sr.Recognizer()
+
+    def recognize(audio):
+        return recognizer.recognize_sphinx(audio)
+    return recognize
+
+
+def _common_prefix(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x.lower() != y.lower():
+            break
+        n += 1
+    return a[:n]
+
+
+class StreamingTranscriber:
+    """Incremental recognizer that emits partial and final hypotheses.
+
+    Audio for one utterance is fed with `accept` as it is captured. Every
+    PARTIAL_INTERVAL_SECONDS of new audio the utterance so far is re-decoded and a
+    "partial" event is emitted; words that the last STABLE_AGREEMENT partials
+    agree on are reported as `stable_text`, which downstream stages can act on
+    before the speaker finishes. `finish` decodes the whole utterance once more
+    and emits the "final" event.
+
+    `engine` is any callable taking an sr.AudioData and returning text (for
+    example sphinx_engine(), which works offline).
+    """
+
+    def __init__(self, rate, engine=None, on_event=None, partial_interval=PARTIAL_INTERVAL_SECONDS,
+                 stable_agreement=STABLE_AGREEMENT, sample_width=2):
+        self.rate = rate
+        self.engine = engine or sphinx_engine()
+        self.on_event = on_event
+        self.partial_interval = partial_interval
+        self.stable_agreement = stable_agreement
+        self.sample_width = sample_width
+        self.reset()
+
+    def reset(self):
+        """Forget the current utterance."""
+        self._chunks = []
+        self._samples = 0
+        self._samples_at_last_decode = 0
+        self._history = []  # Word lists of recent partials
+        self.stable_words = []
+
+    def _decode(self):
+        audio = sr.AudioData(np.concatenate(self._chunks).tobytes(), self.rate, self.sample_width)
+        start = time.perf_counter()
+        try:
+            text = self.engine(audio) or ""
+        except sr.UnknownValueError:
+            text = ""
+        except sr.RequestError as e:
+            logging.error(f"Streaming recognizer failed: {e}")
+            text = ""
+        return text, time.perf_counter() - start
+
+    def _emit(self, event):
+        if self.on_event:
+            self.on_event(event)
+        return event
+
+    def accept(self, samples):
+        """Add audio to the current utterance. Returns a partial event or None."""
+        samples = np.asarray(samples, dtype=np.int16)
+        if len(samples) == 0:
+            return None
+        self._chunks.append(samples.copy())
+        self._samples += len(samples)
+        if (self._samples - self._samples_at_last_decode) / self.rate < self.partial_interval:
+            return None
+
+        self._samples_at_last_decode = self._samples
+        text, latency = self._decode()
+        words = text.split()
+        self._history = (self._history + [words])[-self.stable_agreement:]
+        if len(self._history) == self.stable_agreement:
+            stable = self._history[0]
+            for other in self._history[1:]:
+                stable = _common_prefix(stable, other)
+            # Stability only ever grows within an utterance
+            if len(stable) > len(self.stable_words):
+                self.stable_words = stable
+        return self._emit(TranscriptEvent("partial", text, " ".join(self.stable_words),
+                                          self._samples / self.rate, latency))
+
+    def finish(self):
+        """Decode the complete utterance, emit the final event and reset."""
+        if not self._chunks:
+            return None
+        text, latency = self._decode()
+        event = TranscriptEvent("final", text, text, self._samples / self.rate, latency)
+        self.reset()
+        return self._emit(event)
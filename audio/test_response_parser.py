@@ -0,0 +1,113 @@
+import os
+import random
+import pytest
+from audio.response_parser import (MemoryUpdateParser, DecisionParser, SceneAnalysisParser,
+                                   MAX_DECISION_PREAMBLE)
+from audio.benchmark_response_parser import logged_cases, chunked, entity_outcome
+from replay.bench_util import ROOT
+
+MEMORY_CASES, DECISION_CASES = logged_cases(os.path.join(ROOT, "dnd_text_log.txt"))
+CHUNKINGS = 10  # Random chunkings per response, plus one character at a time
+
+
+def chunkings(text, seed=0):
+    rng = random.Random(seed)
+    yield list(text)
+    for _ in range(CHUNKINGS):
+        yield list(chunked(text, rng))
+
+
+def parse(parser_class, pieces):
+    parser = parser_class()
+    for piece in pieces:
+        parser.feed(piece)
+    if hasattr(parser, "finish"):
+        parser.finish()
+    return parser
+
+
+def decision_of(parser):
+    return parser.decision, parser.prompt
+
+
+def scene_outcome(parser):
+    return entity_outcome(parser.memory), decision_of(parser.decision)
+
+
+def test_log_has_cases():
+    assert MEMORY_CASES and DECISION_CASES
+    assert {expected[0] for _, expected in DECISION_CASES} >= {"generate", "none"}
+
+
+@pytest.mark.parametrize("response,expected", MEMORY_CASES)
+def test_memory_update_matches_log(response, expected):
+    whole = parse(MemoryUpdateParser, [response])
+    assert entity_outcome(whole) == expected
+    for pieces in chunkings(response):
+        assert parse(MemoryUpdateParser, pieces).result() == whole.result()
+
+
+@pytest.mark.parametrize("response,expected", DECISION_CASES)
+def test_decision_matches_log(response, expected):
+    whole = parse(DecisionParser, [response])
+    assert decision_of(whole) == expected
+    for pieces in chunkings(response):
+        assert decision_of(parse(DecisionParser, pieces)) == expected
+
+
+@pytest.mark.parametrize("index", range(len(DECISION_CASES)))
+def test_scene_analysis_matches_log(index):
+    # A combined reply is a memory update followed by the decision line
+    memory_response, memory_expected = MEMORY_CASES[index % len(MEMORY_CASES)]
+    decision_response, decision_expected = DECISION_CASES[index]
+    if decision_expected[0] == "unexpected":
+        pytest.skip("prose replies are only logged as image decisions")
+    reply = f"{memory_response}\n{decision_response}"
+    whole = parse(SceneAnalysisParser, [reply])
+    assert scene_outcome(whole) == (memory_expected, decision_expected)
+    for pieces in chunkings(reply, seed=index):
+        assert scene_outcome(parse(SceneAnalysisParser, pieces)) == scene_outcome(whole)
+
+
+@pytest.mark.parametrize("reply,expected", [
+    ("no image", ("none", None)),
+    ("No image.", ("none", None)),
+    ("NO IMAGE\n", ("none", None)),
+    ("'no image'", ("none", None)),
+    ("The scene is unchanged.\nno image", ("none", None)),
+    ("no imagery has changed", ("unexpected", None)),
+    ("There is no image worth making", ("unexpected", None)),
+    ("generate image: a dragon over the keep\n", ("generate", "a dragon over the keep")),
+    ("Generate image: a dragon over the keep", ("generate", "a dragon over the keep")),
+    ("Nothing has no imagery yet, generate image: a misty grove\n", ("generate", "a misty grove")),
+])
+def test_decision_anchoring(reply, expected):
+    for pieces in [[reply], *chunkings(reply)]:
+        assert decision_of(parse(DecisionParser, pieces)) == expected
+
+
+def test_long_preamble_is_unexpected():
+    preamble = "The party looks around the tavern. " * (MAX_DECISION_PREAMBLE // 30 + 1)
+    assert len(preamble) > MAX_DECISION_PREAMBLE
+    parser = DecisionParser()
+    assert parser.feed(preamble)  # Settled before the stream ends
+    assert parser.decision == "unexpected"
+    # A decision arriving after the preamble limit is not taken any more
+    assert decision_of(parse(DecisionParser, [preamble + "\ngenerate image: a tavern\n"])) == ("unexpected", None)
+    assert decision_of(parse(DecisionParser, [preamble + "\nno image"])) == ("unexpected", None)
+
+
+def test_prompt_within_preamble_waits_for_its_line():
+    prompt = "a tavern " * (MAX_DECISION_PREAMBLE // 9 + 1)
+    parser = DecisionParser()
+    assert not parser.feed("generate image: " + prompt)
+    assert parser.feed("\n")
+    assert decision_of(parser) == ("generate", prompt.strip())
+
+
+def test_scene_analysis_without_activity_finds_a_late_decision():
+    # No recent activity section, so the memory update never completes
+    reply = "Characters: {'Bruce': 'A ranger'}\n" + "Bruce keeps walking. " * 30 + "\ngenerate image: bruce in fog"
+    parser = parse(SceneAnalysisParser, [reply])
+    assert decision_of(parser.decision) == ("generate", "bruce in fog")
+    assert entity_outcome(parser.memory) == {"characters": ["Bruce"]}
@@ -2,7 +2,6 @@ import logging
 import time
 from memory_manager import MemoryManager
 from analyze_text_for_image import analyze_text_for_image
-from difflib import get_close_matches
 
 # Initialize memory manager
 memory_manager = MemoryManager()
@@ -63,10 +62,9 @@ dnd_vocabulary = {
     "Castle": ["castle", "casal", "cassel"],
 }
 
-# Helper function to correct terms in transcription based on vocabulary
-def correct_spelling(term, vocab):
-    matches = get_close_matches(term.lower(), vocab, n=1, cutoff=0.8)
-    return matches[0] if matches else term
+# Register the vocabulary as aliases so analyze_text_for_image corrects them through the entity index
+for name, aliases in dnd_vocabulary.items():
+    memory_manager.add_aliases(name, aliases)
 
 # Example transcriptions for testing
 transcriptions = [
@@ -84,18 +82,10 @@ transcriptions = [
 
 # Process each transcription
 for transcription in transcriptions:
-    # Correct spelling in transcription based on vocabulary
-    words = transcription.split()
-    corrected_transcription = ' '.join(
-        correct_spelling(word, [item for sublist in dnd_vocabulary.values() for item in sublist])
-        for word in words
-    )
+    logging.info(f"Processing transcription: {transcription}")
 
-    # Log the corrected transcription
-    logging.info(f"Processing corrected transcription: {corrected_transcription}")
-    
-    # Analyze the transcription for image generation
-    image_prompt = analyze_text_for_image(corrected_transcription, memory_manager)
+    # Analyze the transcription for image generation (entity names are corrected inside)
+    image_prompt = analyze_text_for_image(transcription, memory_manager)
 
     # Log the memory and the final prompt for image generation
     logging.info(f"Current memory for this transcription: {memory_manager.get_memory()}")
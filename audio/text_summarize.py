@@ -1,13 +1,246 @@
-import os
-from openai import OpenAI
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-client = OpenAI(api_key=os.environ['OPENAI_API_KEY'])
+MODEL = "gpt-3.5-turbo"
+EVENT_WINDOW = 8  # Latest raw events kept word for word
+EVENTS_PER_SCENE = 6  # Older events are compacted into one scene summary this many at a time
+SCENE_WINDOW = 6  # Scene summaries kept before the oldest are folded into a session summary
+SCENES_PER_SESSION = 4
+SESSION_WINDOW = 4  # Session summaries kept before the oldest are folded into the campaign summary
+MAX_BATCH_FACTOR = 4  # A backlog is compacted up to this many batches per summary
+HISTORY_TOKEN_BUDGET = 400  # Default size limit of the history rendered into a prompt
+# Rough length of each kind of summary, in words
+SUMMARY_WORDS = {"scene": 40, "session": 70, "campaign": 120}
+CHARS_PER_TOKEN = 4  # Rough token estimate for English text
 
-try:
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": "Hello, how are you?"}],
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def clip_words(text, words):
+    """Cut text to at most `words` words, marking the cut with an ellipsis."""
+    parts = text.split()
+    return " ".join(parts) if len(parts) <= words else " ".join(parts[:words]) + "..."
+
+
+def extractive_summary(entries, level):
+    """Fallback summary without the model: the first sentence of each entry, clipped to length."""
+    firsts = [_SENTENCE_END.split(entry.strip(), 1)[0] for entry in entries if entry.strip()]
+    return clip_words(" ".join(firsts), SUMMARY_WORDS[level])
+
+
+def summary_prompt(entries, level):
+    words = SUMMARY_WORDS[level]
+    return (
+        f"Summarize the following notes from a Dungeons and Dragons game into one {level} summary "
+        f"of at most {words} words. Keep the names of characters, items and locations exactly as written, "
+        "keep events in order, and leave out anything not stated in the notes. "
+        "Reply with the summary only.\n\n"
+        "Notes:\n" + "\n".join(f"- {entry}" for entry in entries)
     )
-    print(response.choices[0].message.content)
-except Exception as e:
-    print(f"Error occurred: {e}")
+
+
+def llm_summary(entries, level):
+    """Summarize with the chat model, falling back to extractive_summary() when it is unavailable."""
+    try:
+        from services.transport import openai_client  # Not needed until the first compaction
+        response = openai_client().chat.completions.create(
+            model=MODEL, messages=[{"role": "user", "content": summary_prompt(entries, level)}],
+            max_tokens=SUMMARY_WORDS[level] * 2)
+        summary = (response.choices[0].message.content or "").strip()
+        if summary:
+            return summary
+    except Exception as e:
+        logging.warning(f"Could not summarize {level} with the model, using an extract instead: {e}")
+    return extractive_summary(entries, level)
+
+
+class RollingSummary:
+    """Campaign history in tiers that stays the same size however long the campaign runs.
+
+    New events are kept verbatim in a short window. Older events are compacted
+    into scene summaries, older scenes into session summaries, and older
+    sessions into a single campaign summary. Compaction runs on a background
+    thread, so add() never waits for the model; until a batch is compacted its
+    events simply stay in the raw window. `summarize(entries, level)` returns
+    the summary text for a level of "scene", "session" or "campaign".
+    state() and restore() carry the tiers across a restart; `on_compact`, if
+    set, is called after every fold so they can be saved.
+    """
+
+    def __init__(self, summarize=llm_summary, event_window=EVENT_WINDOW, scene_window=SCENE_WINDOW,
+                 session_window=SESSION_WINDOW):
+        self.summarize = summarize
+        self.event_window = event_window
+        self.scene_window = scene_window
+        self.session_window = session_window
+        self.events = []
+        self.scenes = []
+        self.sessions = []
+        self.campaign = ""
+        self.compactions = 0
+        self.on_compact = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-compaction")
+        self._pending = None
+
+    def add(self, events):
+        """Append new events (a string or a list of strings). Returns the ones that were new.
+
+        Events identical to one still in the raw window are skipped, since the
+        model often repeats earlier activity in its update.
+        """
+        if isinstance(events, str):
+            events = [events]
+        added = []
+        with self._lock:
+            for event in events:
+                event = " ".join(str(event).split())
+                if event and event not in self.events:
+                    self.events.append(event)
+                    added.append(event)
+            self._schedule()
+        return added
+
+    def _schedule(self):
+        """Start a compaction if the raw window is full and none is running. Caller holds the lock."""
+        if len(self.events) > self.event_window and (self._pending is None or self._pending.done()):
+            self._pending = self._executor.submit(self.compact)
+
+    def state(self):
+        """The tiers as plain lists and strings, for restore()."""
+        with self._lock:
+            return {"events": list(self.events), "scenes": list(self.scenes), "sessions": list(self.sessions),
+                    "campaign": self.campaign}
+
+    def restore(self, state):
+        """Replace the tiers with an earlier state(); missing tiers start empty."""
+        with self._lock:
+            self.events = list(state.get("events", []))
+            self.scenes = list(state.get("scenes", []))
+            self.sessions = list(state.get("sessions", []))
+            self.campaign = state.get("campaign", "")
+            self._schedule()
+
+    def recent(self, count=None):
+        """The latest raw events, oldest first."""
+        with self._lock:
+            return list(self.events[-(count or self.event_window):])
+
+    def _fold(self, lower, limit, batch, level):
+        """Summarize the oldest entries of tier `lower` into tier `level` if it holds more than `limit`.
+
+        Takes `batch` entries, or more when summaries have fallen behind. Returns True if it folded.
+        """
+        with self._lock:
+            entries = getattr(self, lower)
+            if len(entries) <= limit:
+                return False
+            oldest = entries[:min(max(batch, len(entries) - limit), batch * MAX_BATCH_FACTOR)]
+        summary = self.summarize(oldest, level)  # Slow; new entries may arrive meanwhile
+        with self._lock:
+            # Only compact() removes from the front, so the batch is still there unless restore() ran
+            if getattr(self, lower)[:len(oldest)] != oldest:
+                return False
+            del getattr(self, lower)[:len(oldest)]
+            getattr(self, level + "s").append(summary)
+            self.compactions += 1
+        return True
+
+    def _fold_campaign(self):
+        """Merge the sessions beyond the window into the single campaign summary."""
+        with self._lock:
+            if len(self.sessions) <= self.session_window:
+                return False
+            oldest = self.sessions[:len(self.sessions) - self.session_window]
+            earlier = [self.campaign] if self.campaign else []
+        summary = self.summarize(earlier + oldest, "campaign")
+        with self._lock:
+            if self.sessions[:len(oldest)] != oldest:
+                return False
+            del self.sessions[:len(oldest)]
+            self.campaign = summary
+            self.compactions += 1
+        return True
+
+    def compact(self):
+        """Fold every tier that is over its window. Runs in the background after add()."""
+        try:
+            while True:
+                # One step per tier at a time, so a stream of new events cannot starve the upper tiers
+                folded = self._fold("events", self.event_window, EVENTS_PER_SCENE, "scene")
+                folded = self._fold("scenes", self.scene_window, SCENES_PER_SESSION, "session") or folded
+                folded = self._fold_campaign() or folded
+                if not folded:
+                    break
+                if self.on_compact is not None:
+                    self.on_compact()
+        except Exception as e:
+            logging.error(f"History compaction failed: {e}")
+
+    def wait(self):
+        """Block until any scheduled compaction has finished."""
+        pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def render(self, token_budget=HISTORY_TOKEN_BUDGET, events=True):
+        """The history as prompt text within `token_budget`, most recent details kept first.
+
+        With events=False only the compacted tiers are included, e.g. when the
+        latest events are already part of the prompt.
+        """
+        with self._lock:
+            sections = [("Campaign so far", [self.campaign] if self.campaign else []),
+                        ("Earlier sessions", list(self.sessions)),
+                        ("Earlier scenes", list(self.scenes)),
+                        ("Latest events", list(self.events) if events else [])]
+        # The campaign summary goes in first, then the budget is spent from the newest
+        # entry back, so what gets cut is the detail in between
+        used = 0
+        kept = {title: [] for title, _ in sections}
+        for title, entries in sections[:1] + sections[:0:-1]:
+            for entry in reversed(entries):
+                cost = estimate_tokens(entry) + 1
+                if used + cost > token_budget:
+                    break
+                kept[title].insert(0, entry)
+                used += cost
+            else:
+                continue
+            break
+        return "\n".join(f"{title}: " + " ".join(kept[title]) for title, _ in sections if kept[title])
+
+    def stats(self):
+        with self._lock:
+            return {"events": len(self.events), "scenes": len(self.scenes), "sessions": len(self.sessions),
+                    "campaign_words": len(self.campaign.split()), "compactions": self.compactions}
+
+    def close(self, wait=True):
+        """Stop the compaction thread; with wait=False a compaction still running finishes on its own."""
+        self._executor.shutdown(wait=wait)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compact a transcript file or store into a tiered history.")
+    parser.add_argument("transcripts", nargs="?", default="transcription_memory.txt")
+    parser.add_argument("--tokens", type=int, default=HISTORY_TOKEN_BUDGET)
+    parser.add_argument("--extractive", action="store_true", help="summarize without the model")
+    args = parser.parse_args()
+
+    import os
+    import sys
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from audio.transcript_store import transcript_lines
+    history = RollingSummary(extractive_summary if args.extractive else llm_summary)
+    for text in transcript_lines(args.transcripts):
+        history.add(text)
+        history.wait()
+    print(history.render(args.tokens))
+    print(history.stats())
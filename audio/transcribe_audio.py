@@ -1,37 +1,105 @@
 import speech_recognition as sr
-import os
-import datetime
+import numpy as np
+from audio.resample import resample
+from audio.transcription_backends import FallbackTranscriber
+from audio.transcription_cache import CachedTranscriber, TranscriptionCache, CACHE_PATH
+from audio.transcript_store import TranscriptStore, TRANSCRIPT_PATH
 
-# Define the path to the memory file
-MEMORY_FILE = 'transcription_memory.txt'
+_default_transcriber = None
+_default_transcripts = None
 
-def save_transcription(text):
-    """Saves the transcribed text to a file for future reference."""
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    with open(MEMORY_FILE, 'a') as f:  # 'a' mode opens the file for appending
-        f.write(f"[{timestamp}] {text}\n")  # Append the transcription with timestamp
-    print(f"Transcription saved to {MEMORY_FILE}")
+def get_transcript_store():
+    """The transcript store save_transcription() writes to, opened at TRANSCRIPT_PATH on first use."""
+    global _default_transcripts
+    if _default_transcripts is None:
+        _default_transcripts = TranscriptStore(TRANSCRIPT_PATH)
+    return _default_transcripts
 
-def transcribe_audio(filename):
+def save_transcription(text, **links):
+    """Saves the transcribed text to the transcript store for future reference.
+
+    Extra keyword arguments (started, audio_path, mentions...) go to TranscriptStore.add().
+    """
+    store = get_transcript_store()
+    store.add(text, **links)
+    print(f"Transcription saved to {store.path}")
+
+def samples_to_audio_data(samples, rate, sample_width=2):
+    """Wrap in-memory PCM (int16 numpy array, memoryview or bytes) as sr.AudioData."""
+    if hasattr(samples, "tobytes"):
+        samples = samples.tobytes()
+    return sr.AudioData(bytes(samples), rate, sample_width)
+
+def make_transcriber(primary="google", fallback="local", cache_path=CACHE_PATH, **options):
+    """Return a new transcriber with fallback state of its own, e.g. for one session.
+
+    `fallback` is used automatically when the primary is slow or unreachable
+    (pass None to disable). Results are cached on disk by audio fingerprint at
+    `cache_path` (pass None to disable). Extra options go to FallbackTranscriber.
+    """
+    transcriber = FallbackTranscriber(primary, fallback, **options)
+    if cache_path:
+        transcriber = CachedTranscriber(transcriber, TranscriptionCache(cache_path))
+    return transcriber
+
+def set_transcription_backend(primary="google", fallback="local", cache_path=CACHE_PATH, **options):
+    """Choose the backend used by default; returns the new transcriber (see make_transcriber())."""
+    global _default_transcriber
+    _default_transcriber = make_transcriber(primary, fallback, cache_path, **options)
+    return _default_transcriber
+
+def get_transcriber():
+    """Return the default transcriber, creating the Google + local fallback one on first use."""
+    if _default_transcriber is None:
+        set_transcription_backend()
+    return _default_transcriber
+
+def transcribe_audio(filename, transcriber=None):
     """Transcribes audio from a given file using Google Speech Recognition."""
-    recognizer = sr.Recognizer()
+    transcriber = transcriber or get_transcriber()
     with sr.AudioFile(filename) as source:
-        audio = recognizer.record(source)  # Read the entire audio file
+        audio = transcriber.primary.recognizer.record(source)  # Read the entire audio file
+    return transcribe_audio_data(audio, transcriber)
+
+def transcribe_samples(samples, rate, sample_width=2, target_rate=None, transcriber=None, raise_errors=False,
+                       save=True):
+    """Transcribes in-memory PCM straight from the recorder, without a WAV round trip.
+
+    If `target_rate` is given and lower than `rate`, int16 audio is resampled before upload.
+    """
+    if target_rate and target_rate < rate and sample_width == 2:
+        samples = resample(np.asarray(samples, dtype=np.int16), rate, target_rate)
+        rate = target_rate
+    return transcribe_audio_data(samples_to_audio_data(samples, rate, sample_width), transcriber, raise_errors,
+                                 save)
+
+def transcribe_audio_data(audio, transcriber=None, raise_errors=False, save=True):
+    """Transcribes an sr.AudioData with the selected backend (Google by default).
+
+    Service errors return None unless `raise_errors` is set, so callers that retry can see them.
+    With save=False the caller records the transcript itself (the scene pipeline does, with its links).
+    """
+    transcriber = transcriber or get_transcriber()
     try:
-        text = recognizer.recognize_google(audio)
-        print("Transcription: " + text)
-        
-        # Save the transcription to the memory file
-        save_transcription(text)
-        
-        return text
-    except sr.UnknownValueError:
-        print("Google Speech Recognition could not understand audio")
-        return None
+        result = transcriber.transcribe(audio)
     except sr.RequestError as e:
-        print(f"Could not request results from Google Speech Recognition service; {e}")
+        print(f"Could not request results from the speech recognition service; {e}")
+        if raise_errors:
+            raise
+        return None
+
+    if not result.text:
+        print(f"{result.backend} speech recognition could not understand audio")
         return None
 
+    print(f"Transcription ({result.backend}, {result.seconds:.2f}s, confidence {result.confidence}): {result.text}")
+
+    # Save the transcription to the transcript store
+    if save:
+        save_transcription(result.text)
+
+    return result.text
+
 if __name__ == "__main__":
     filename = 'output.wav'  # This should match the filename from audio_record.py
     transcribe_audio(filename)  # Call the function if this file is run directly
@@ -0,0 +1,310 @@
+import atexit
+import datetime
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from audio.text_summarize import estimate_tokens, clip_words
+
+TRANSCRIPT_PATH = "transcripts.db"
+LEGACY_TRANSCRIPT_PATH = "transcription_memory.txt"  # The append-only text file this store replaces
+BATCH_SIZE = 64  # Pending transcripts written in one transaction
+FLUSH_SECONDS = 1.0  # ...or after this long, whichever comes first
+BUSY_TIMEOUT_MS = 5000  # How long a writer waits for another process holding the write lock
+RECALL_PER_ENTITY = 2  # Latest transcripts recalled for each entity a prompt mentions
+RECALL_WORDS = 60  # Recalled transcripts are clipped to this many words
+
+Transcript = namedtuple("Transcript", "id session started ended text audio_path image_path")
+
+_COLUMNS = "id, session, started, ended, text, audio_path, image_path"
+_LEGACY_LINE = re.compile(r"^\[([^\]]*)\]\s*")
+
+
+def phrase_query(text):
+    """An FTS5 query matching `text` as a phrase, with any quotes in it escaped."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+class TranscriptStore:
+    """Campaign transcripts in SQLite with a full-text index.
+
+    Every transcript keeps its session, when it was spoken, the audio it came
+    from (a segment file or the session recording) and the image it led to,
+    plus the entities it mentions. add() only queues the row; a background
+    thread writes queued rows in one transaction every BATCH_SIZE rows or
+    FLUSH_SECONDS. Queries write out what is queued first, so they always see
+    every add() made before them. Text is indexed with FTS5 and mentions in
+    their own table, so recall stays in the milliseconds over many sessions.
+    """
+
+    def __init__(self, path=TRANSCRIPT_PATH, session=None, batch_size=BATCH_SIZE, flush_seconds=FLUSH_SECONDS):
+        self.path = path
+        self.session = session or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.flushes = 0
+        self.written = 0
+        self._pending = []
+        self._closed = False
+        self._lock = threading.RLock()  # Held while using the connection
+        self._cond = threading.Condition()  # Guards _pending
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS transcripts ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE, session TEXT, started REAL, ended REAL,"
+            " created REAL, text TEXT, audio_path TEXT, image_path TEXT);"
+            "CREATE INDEX IF NOT EXISTS transcripts_started ON transcripts(started);"
+            "CREATE INDEX IF NOT EXISTS transcripts_session ON transcripts(session, id);"
+            "CREATE TABLE IF NOT EXISTS mentions (entity TEXT, transcript_id INTEGER,"
+            " PRIMARY KEY (entity, transcript_id)) WITHOUT ROWID;"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS transcripts_fts USING fts5("
+            " text, content='transcripts', content_rowid='id', tokenize='porter unicode61');"
+            # Keep the index in step with the table; only the image link is ever updated
+            "CREATE TRIGGER IF NOT EXISTS transcripts_ai AFTER INSERT ON transcripts BEGIN"
+            " INSERT INTO transcripts_fts(rowid, text) VALUES (new.id, new.text); END;"
+            "CREATE TRIGGER IF NOT EXISTS transcripts_ad AFTER DELETE ON transcripts BEGIN"
+            " INSERT INTO transcripts_fts(transcripts_fts, rowid, text) VALUES ('delete', old.id, old.text);"
+            " DELETE FROM mentions WHERE transcript_id = old.id; END;"
+        )
+        self._conn.commit()
+        self._writer = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)  # Queued transcripts are written out on exit
+
+    def add(self, text, started=None, ended=None, audio_path=None, mentions=(), session=None):
+        """Queue a transcript. Returns its key, for link_image().
+
+        `started`/`ended` are wall-clock times of the speech (default now),
+        `audio_path` the recording it is in and `mentions` the names of the
+        entities it refers to.
+        """
+        key = uuid.uuid4().hex
+        now = time.time()
+        row = (key, session or self.session, started or now, ended, now, text, audio_path,
+               [" ".join(name.lower().split()) for name in mentions])
+        with self._cond:
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return key
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= self.batch_size,
+                                    timeout=self.flush_seconds)
+                closed = self._closed
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logging.error(f"Could not write transcripts: {e}")
+            if closed:
+                break
+
+    def flush(self):
+        """Write every queued transcript now, in one transaction."""
+        with self._lock:
+            with self._cond:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return
+            self._conn.executemany(
+                "INSERT INTO transcripts (key, session, started, ended, created, text, audio_path) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", [row[:7] for row in rows])
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO mentions SELECT ?, id FROM transcripts WHERE key = ?",
+                [(entity, row[0]) for row in rows for entity in row[7]])
+            self._conn.commit()
+            self.flushes += 1
+            self.written += len(rows)
+
+    def link_image(self, key, image_path, superseded=()):
+        """Record that `image_path` was generated from the transcript `key`.
+
+        `superseded` are the keys of transcripts whose prompts were replaced by
+        this one while an image was rendering; they are linked to it too.
+        Returns how many transcripts were linked.
+        """
+        self.flush()
+        keys = [key] + list(superseded)
+        with self._lock:
+            cursor = self._conn.executemany("UPDATE transcripts SET image_path = ? WHERE key = ?",
+                                            [(image_path, k) for k in keys])
+            self._conn.commit()
+            return cursor.rowcount
+
+    def _query(self, sql, params=()):
+        self.flush()
+        with self._lock:
+            return [Transcript(*row) for row in self._conn.execute(sql, params)]
+
+    def get(self, key):
+        rows = self._query(f"SELECT {_COLUMNS} FROM transcripts WHERE key = ?", (key,))
+        return rows[0] if rows else None
+
+    def between(self, start, end, session=None, limit=None):
+        """Transcripts spoken between two wall-clock times (seconds or datetimes), oldest first."""
+        if isinstance(start, datetime.datetime):
+            start = start.timestamp()
+        if isinstance(end, datetime.datetime):
+            end = end.timestamp()
+        sql = f"SELECT {_COLUMNS} FROM transcripts WHERE started >= ? AND started < ?"
+        params = [start, end]
+        if session:
+            sql += " AND session = ?"
+            params.append(session)
+        sql += " ORDER BY started, id LIMIT ?"
+        return self._query(sql, params + [-1 if limit is None else limit])
+
+    def search(self, query, limit=20, session=None):
+        """Full-text search (FTS5 query syntax), best matches first."""
+        sql = ("SELECT t.id, t.session, t.started, t.ended, t.text, t.audio_path, t.image_path FROM transcripts_fts"
+               " JOIN transcripts t ON t.id = transcripts_fts.rowid WHERE transcripts_fts MATCH ?")
+        params = [query]
+        if session:
+            sql += " AND t.session = ?"
+            params.append(session)
+        return self._query(sql + " ORDER BY rank LIMIT ?", params + [limit])
+
+    def mentions(self, name, limit=10, before=None):
+        """Latest transcripts that mention an entity, newest first.
+
+        Matches transcripts recorded with the entity in their mentions as well
+        as any whose text contains the name, so it also finds ones from before
+        the entity was known. `before` limits it to speech before that time.
+        """
+        sql = (f"SELECT {_COLUMNS} FROM transcripts WHERE id IN ("
+               " SELECT transcript_id FROM mentions WHERE entity = ?"
+               " UNION SELECT rowid FROM transcripts_fts WHERE transcripts_fts MATCH ?)")
+        params = [" ".join(name.lower().split()), phrase_query(name)]
+        if before is not None:
+            sql += " AND started < ?"
+            params.append(before)
+        return self._query(sql + " ORDER BY id DESC LIMIT ?", params + [limit])
+
+    def recall(self, names, token_budget, per_entity=RECALL_PER_ENTITY):
+        """Earlier transcripts about the named entities as prompt text within `token_budget`.
+
+        The latest `per_entity` transcripts of each name are taken, in the order
+        the names are given, and listed oldest first with their date.
+        """
+        chosen, used = {}, 0
+        for name in names:
+            for transcript in self.mentions(name, per_entity):
+                if transcript.id in chosen:
+                    continue
+                line = (f"[{time.strftime('%Y-%m-%d %H:%M', time.localtime(transcript.started))}] "
+                        + clip_words(transcript.text, RECALL_WORDS))
+                cost = estimate_tokens(line) + 1
+                if used + cost > token_budget:
+                    break
+                chosen[transcript.id] = line
+                used += cost
+        return "\n".join(chosen[i] for i in sorted(chosen))
+
+    def texts(self, session=None):
+        """Every transcript's text in the order it was recorded."""
+        sql = "SELECT text FROM transcripts" + (" WHERE session = ?" if session else "") + " ORDER BY id"
+        self.flush()
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, (session,) if session else ())]
+
+    def import_text(self, path=LEGACY_TRANSCRIPT_PATH, session="imported"):
+        """Load a transcription_memory.txt written by earlier versions. Returns the number of transcripts."""
+        count = 0
+        with open(path, errors="replace") as f:
+            for line in f:
+                match = _LEGACY_LINE.match(line)
+                text = line[match.end():].strip() if match else line.strip()
+                if not text:
+                    continue
+                started = None
+                if match:
+                    try:
+                        started = time.mktime(time.strptime(match.group(1), "%Y-%m-%d %H:%M:%S"))
+                    except ValueError:
+                        pass
+                self.add(text, started=started, session=session)
+                count += 1
+        self.flush()
+        return count
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        with self._lock:
+            transcripts, sessions = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT session) FROM transcripts").fetchone()
+        return {"transcripts": transcripts, "sessions": sessions, "pending": pending,
+                "written": self.written, "flushes": self.flushes}
+
+    def close(self):
+        """Write out what is queued, stop the writer thread and close the database."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._writer.join()
+        with self._lock:
+            self._conn.close()
+        atexit.unregister(self.close)
+
+
+def transcript_lines(path):
+    """Transcript texts, oldest first, from a transcript store or a legacy transcription_memory.txt."""
+    if path.endswith(".db"):
+        store = TranscriptStore(path)
+        try:
+            return store.texts()
+        finally:
+            store.close()
+    try:
+        with open(path, errors="replace") as f:
+            return [text for text in (_LEGACY_LINE.sub("", line).strip() for line in f) if text]
+    except FileNotFoundError:
+        return []
+
+
+if __name__ == "__main__":
+    import argparse
+    # Run as: python -m audio.transcript_store ...
+    parser = argparse.ArgumentParser(description="Query or fill the campaign transcript store.")
+    parser.add_argument("--db", default=TRANSCRIPT_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("import", help="load a transcription_memory.txt")
+    command.add_argument("path", nargs="?", default=LEGACY_TRANSCRIPT_PATH)
+    command = commands.add_parser("search", help="full-text search")
+    command.add_argument("query")
+    command = commands.add_parser("mentions", help="latest transcripts mentioning an entity")
+    command.add_argument("name")
+    command = commands.add_parser("between", help="transcripts between two times (YYYY-MM-DD HH:MM)")
+    command.add_argument("start")
+    command.add_argument("end")
+    args = parser.parse_args()
+
+    store = TranscriptStore(args.db)
+    start = time.perf_counter()
+    if args.command == "import":
+        print(f"Imported {store.import_text(args.path)} transcripts")
+        results = []
+    elif args.command == "search":
+        results = store.search(args.query)
+    elif args.command == "mentions":
+        results = store.mentions(args.name)
+    else:
+        results = store.between(datetime.datetime.fromisoformat(args.start),
+                                datetime.datetime.fromisoformat(args.end))
+    elapsed = time.perf_counter() - start
+    for transcript in results:
+        when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(transcript.started))
+        links = ", ".join(p for p in (transcript.audio_path, transcript.image_path) if p)
+        print(f"[{when}] {transcript.text}" + (f"  ({links})" if links else ""))
+    print(f"{len(results)} results in {elapsed * 1000:.1f} ms; {store.stats()}")
+    store.close()
@@ -0,0 +1,175 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+import speech_recognition as sr
+
+REMOTE_SLO_SECONDS = 4.0  # Fall back to the local engine when remote recognition is slower than this
+SLO_SMOOTHING = 0.3  # Weight of the newest call in the remote latency average
+REMOTE_TIMEOUT_FACTOR = 2.0  # A remote call stalled this many SLOs is abandoned (per connect or read)
+FALLBACK_COOLDOWN_SECONDS = 60  # How long to stay on the local engine before probing remote again
+GOOGLE_SPEECH_URL = "http://www.google.com/speech-api/v2/recognize"
+
+# text is None when nothing intelligible was heard; confidence is None if the engine does not report one
+TranscriptionResult = namedtuple("TranscriptionResult", "text confidence seconds backend")
+
+
+class TranscriptionBackend:
+    """Common interface: turn an sr.AudioData into a TranscriptionResult.
+
+    Subclasses implement `_recognize(audio)` returning (text, confidence) and
+    raise sr.RequestError when the engine cannot be reached. One sr.Recognizer is
+    created per backend and reused for every call.
+    """
+
+    name = "base"
+    remote = False
+
+    def __init__(self, recognizer=None):
+        self.recognizer = recognizer or sr.Recognizer()
+
+    def transcribe(self, audio):
+        start = time.perf_counter()
+        try:
+            text, confidence = self._recognize(audio)
+        except sr.UnknownValueError:
+            text, confidence = None, None
+        return TranscriptionResult(text or None, confidence, time.perf_counter() - start, self.name)
+
+    def _recognize(self, audio):
+        raise NotImplementedError
+
+
+class GoogleBackend(TranscriptionBackend):
+    """Google Web Speech API (needs network)."""
+
+    name = "google"
+    remote = True
+
+    def __init__(self, recognizer=None, endpoint=None, timeout=REMOTE_SLO_SECONDS * REMOTE_TIMEOUT_FACTOR):
+        super().__init__(recognizer)
+        # GOOGLE_SPEECH_URL lets replays and load tests point at a local stand-in
+        self.endpoint = endpoint or os.environ.get("GOOGLE_SPEECH_URL", GOOGLE_SPEECH_URL)
+        # Without it a hung request would hold a transcribe worker forever
+        self.recognizer.operation_timeout = timeout
+
+    def _recognize(self, audio):
+        try:
+            response = self.recognizer.recognize_google(audio, show_all=True, endpoint=self.endpoint)
+        except TimeoutError as e:
+            # Timeouts while reading the reply are not wrapped by SpeechRecognition
+            raise sr.RequestError(f"recognition timed out: {e}")
+        if not isinstance(response, dict) or not response.get("alternative"):
+            raise sr.UnknownValueError()
+        best = max(response["alternative"], key=lambda alt: alt.get("confidence", 0.0))
+        return best["transcript"], best.get("confidence")
+
+
+class SphinxBackend(TranscriptionBackend):
+    """PocketSphinx running locally on the CPU; works offline."""
+
+    name = "local"
+
+    def _recognize(self, audio):
+        return self.recognizer.recognize_sphinx(audio), None
+
+
+class StubBackend(TranscriptionBackend):
+    """Deterministic backend for tests and replays.
+
+    Returns `responses[fingerprint]` when the audio's SHA-1 is known, otherwise
+    `default` (None means "could not understand"). `delay` simulates latency.
+    """
+
+    name = "stub"
+
+    def __init__(self, recognizer=None, responses=None, default="stub transcription", delay=0.0):
+        super().__init__(recognizer)
+        self.responses = responses or {}
+        self.default = default
+        self.delay = delay
+
+    def _recognize(self, audio):
+        if self.delay:
+            time.sleep(self.delay)
+        fingerprint = hashlib.sha1(audio.get_raw_data()).hexdigest()
+        return self.responses.get(fingerprint, self.default), 1.0
+
+
+BACKENDS = {
+    "google": GoogleBackend,
+    "local": SphinxBackend,
+    "stub": StubBackend,
+}
+
+
+def register_backend(name, factory):
+    """Make a backend available to get_backend() under `name`."""
+    BACKENDS[name] = factory
+
+
+def get_backend(name, **options):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend '{name}'. Available: {', '.join(BACKENDS)}")
+    return BACKENDS[name](**options)
+
+
+class FallbackTranscriber:
+    """Uses the primary backend, degrading to a local one when it is slow or down.
+
+    Remote latency is tracked as an exponential moving average. When it exceeds
+    `slo_seconds`, or a request fails outright, segments go to the fallback
+    backend for `cooldown` seconds before the primary is tried again. A remote
+    primary's calls time out after REMOTE_TIMEOUT_FACTOR times the SLO, so a
+    stalled request fails over too instead of blocking until it returns.
+    """
+
+    def __init__(self, primary="google", fallback="local", slo_seconds=REMOTE_SLO_SECONDS,
+                 cooldown=FALLBACK_COOLDOWN_SECONDS):
+        self.primary = get_backend(primary) if isinstance(primary, str) else primary
+        self.fallback = None
+        if fallback:
+            self.fallback = get_backend(fallback) if isinstance(fallback, str) else fallback
+        self.slo_seconds = slo_seconds
+        if self.primary.remote:
+            self.primary.recognizer.operation_timeout = slo_seconds * REMOTE_TIMEOUT_FACTOR
+        self.cooldown = cooldown
+        self.average_latency = None
+        self.fallback_until = 0.0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def _use_fallback(self):
+        return self.fallback is not None and time.monotonic() < self.fallback_until
+
+    def _trip(self, reason):
+        with self._lock:
+            self.fallback_until = time.monotonic() + self.cooldown
+            self.average_latency = None  # Start fresh when the primary is probed again
+            self.fallbacks += 1
+        logging.warning(f"Transcription falling back to {self.fallback.name} for {self.cooldown}s: {reason}")
+
+    def transcribe(self, audio):
+        if self._use_fallback():
+            return self.fallback.transcribe(audio)
+
+        try:
+            result = self.primary.transcribe(audio)
+        except sr.RequestError as e:
+            if self.fallback is None:
+                raise
+            self._trip(f"{self.primary.name} request failed ({e})")
+            return self.fallback.transcribe(audio)
+
+        if self.primary.remote and self.fallback is not None:
+            with self._lock:
+                if self.average_latency is None:
+                    self.average_latency = result.seconds
+                else:
+                    self.average_latency += SLO_SMOOTHING * (result.seconds - self.average_latency)
+                over_slo = self.average_latency > self.slo_seconds
+            if over_slo:
+                self._trip(f"{self.primary.name} latency {self.average_latency:.1f}s over SLO")
+        return result
@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import numpy as np
+from audio.resample import resample, TARGET_RATE
+from audio.transcription_backends import TranscriptionResult
+
+CACHE_PATH = "transcription_cache.db"
+MAX_ENTRIES = 20000  # Least recently used transcripts are evicted beyond this
+
+
+def audio_fingerprint(audio, settings=""):
+    """SHA-256 of the audio normalized to 16 kHz 16-bit mono, plus backend settings.
+
+    Normalizing first means the same speech hashes the same whether it came from
+    a 44.1 kHz wav on disk or from the 16 kHz capture path.
+    """
+    samples = np.frombuffer(audio.get_raw_data(convert_width=2), dtype=np.int16)
+    if audio.sample_rate != TARGET_RATE:
+        samples = resample(samples, audio.sample_rate, TARGET_RATE)
+    digest = hashlib.sha256(samples.tobytes())
+    digest.update(settings.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class TranscriptionCache:
+    """Persistent SQLite store of transcripts keyed by audio fingerprint."""
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts ("
+            " key TEXT PRIMARY KEY, text TEXT, confidence REAL, backend TEXT,"
+            " created REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS transcripts_last_used ON transcripts(last_used)")
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached TranscriptionResult for `key`, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, confidence, backend FROM transcripts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE transcripts SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return TranscriptionResult(row[0], row[1], 0.0, row[2])
+
+    def put(self, key, result):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?)",
+                (key, result.text, result.confidence, result.backend, now, now))
+            count = self._conn.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM transcripts WHERE key IN "
+                    "(SELECT key FROM transcripts ORDER BY last_used LIMIT ?)", (excess,))
+                self.evictions += excess
+            self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedTranscriber:
+    """Wraps a transcriber so identical audio is only ever sent once.
+
+    Only results produced by the primary backend are stored, so a degraded
+    fallback transcript is not served in place of a later primary one.
+    """
+
+    def __init__(self, transcriber, cache=None, settings=""):
+        self.transcriber = transcriber
+        self.primary = transcriber.primary
+        self.cache = cache or TranscriptionCache()
+        language = getattr(self.primary, "language", "en-US")
+        self.settings = f"{self.primary.name}|{language}|{settings}"
+
+    def transcribe(self, audio):
+        key = audio_fingerprint(audio, self.settings)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logging.info(f"Transcription cache hit ({cached.backend})")
+            return cached
+        result = self.transcriber.transcribe(audio)
+        if result.backend == self.primary.name:
+            self.cache.put(key, result)
+        return result
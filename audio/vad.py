@@ -0,0 +1,179 @@
+import numpy as np
+from collections import deque
+
+# Default VAD parameters, tuned against the checked-in segment_*.wav recordings
+# (room noise sits around -75..-60 dBFS, table talk around -45..-30 dBFS).
+FRAME_MS = 30
+ENERGY_THRESHOLD_DB = -50.0  # Frames louder than this are speech
+FRICATIVE_MARGIN_DB = 8.0  # Quieter frames still count as speech if they are noisy (high ZCR)...
+ZCR_THRESHOLD = 6600.0  # ...with at least this many zero crossings per second
+HANGOVER_MS = 800  # Silence needed after speech before a segment is closed
+PREROLL_MS = 200  # Audio kept from before speech onset so first syllables are not clipped
+MIN_SPEECH_MS = 300  # Segments with less speech than this are treated as noise and dropped
+MIN_SEGMENT_MS = 4000  # Shorter utterances are carried over into the next segment
+MAX_SEGMENT_MS = 20000  # Force a cut during long monologues
+
+
+def frame_features(samples, rate, frame_ms=FRAME_MS):
+    """Return per-frame energy (dBFS) and zero crossings per second for int16 samples.
+
+    Trailing samples that do not fill a whole frame are ignored.
+    """
+    frame_len = int(rate * frame_ms / 1000)
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)
+
+    frames = np.asarray(samples[:n_frames * frame_len], dtype=np.float32).reshape(n_frames, frame_len)
+    frames /= 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    energy_db = 20.0 * np.log10(rms + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) * (rate / (frame_len - 1))
+    return energy_db, zcr.astype(np.float32)
+
+
+def classify_frames(energy_db, zcr, energy_threshold_db=ENERGY_THRESHOLD_DB,
+                    fricative_margin_db=FRICATIVE_MARGIN_DB, zcr_threshold=ZCR_THRESHOLD):
+    """Return a boolean array marking speech frames."""
+    voiced = energy_db > energy_threshold_db
+    unvoiced = (energy_db > energy_threshold_db - fricative_margin_db) & (zcr > zcr_threshold)
+    return voiced | unvoiced
+
+
+def contains_speech(samples, rate, min_speech_ms=MIN_SPEECH_MS, frame_ms=FRAME_MS, **thresholds):
+    """Return True if the samples hold at least `min_speech_ms` of speech frames."""
+    energy_db, zcr = frame_features(samples, rate, frame_ms)
+    speech_frames = np.count_nonzero(classify_frames(energy_db, zcr, **thresholds))
+    return speech_frames * frame_ms >= min_speech_ms
+
+
+class VoiceActivityDetector:
+    """Streaming segmenter that cuts audio on pauses in speech.
+
+    Feed it int16 audio as it arrives (for example the views returned by
+    AudioRecorder.read_segment) and it returns finished speech segments as
+    independent int16 arrays. Pure-silence stretches never produce a segment.
+    """
+
+    def __init__(self, rate, frame_ms=FRAME_MS, energy_threshold_db=ENERGY_THRESHOLD_DB,
+                 fricative_margin_db=FRICATIVE_MARGIN_DB, zcr_threshold=ZCR_THRESHOLD,
+                 hangover_ms=HANGOVER_MS, preroll_ms=PREROLL_MS, min_speech_ms=MIN_SPEECH_MS,
+                 min_segment_ms=MIN_SEGMENT_MS, max_segment_ms=MAX_SEGMENT_MS):
+        self.rate = rate
+        self.frame_ms = frame_ms
+        self.frame_len = int(rate * frame_ms / 1000)
+        self.thresholds = {
+            "energy_threshold_db": energy_threshold_db,
+            "fricative_margin_db": fricative_margin_db,
+            "zcr_threshold": zcr_threshold,
+        }
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.min_segment_frames = min_segment_ms // frame_ms
+        self.max_segment_frames = max(1, max_segment_ms // frame_ms)
+
+        self._pending = np.empty(0, dtype=np.int16)  # Samples not yet filling a frame
+        self._preroll = deque(maxlen=max(1, preroll_ms // frame_ms))
+        self._carry = []  # Short utterance waiting to be joined to the next one
+        self._carry_speech_frames = 0
+        self._reset_segment()
+        # Where each segment returned by the last feed() ended, as offsets into the samples passed to it
+        self.last_cuts = []
+
+        # Counters for tuning and benchmarking
+        self.frames_seen = 0
+        self.speech_frames_seen = 0
+        self.segments_emitted = 0
+        self.segments_dropped = 0
+
+    def _reset_segment(self):
+        self._in_segment = False
+        self._chunks = []
+        self._segment_frames = 0
+        self._speech_frames = 0
+        self._silence_run = 0
+
+    @property
+    def active(self):
+        """True while an utterance is open or a short one is waiting to be joined."""
+        return self._in_segment or bool(self._carry)
+
+    def feed(self, samples):
+        """Consume new audio and return a list of any segments that closed.
+
+        `last_cuts` then holds, for each returned segment, the offset in
+        `samples` just after its last frame.
+        """
+        carried = len(self._pending)
+        samples = np.concatenate((self._pending, np.asarray(samples, dtype=np.int16)))
+        self.last_cuts = []
+        n_frames = len(samples) // self.frame_len
+        cut = n_frames * self.frame_len
+        self._pending = samples[cut:].copy()
+        if n_frames == 0:
+            return []
+
+        energy_db, zcr = frame_features(samples[:cut], self.rate, self.frame_ms)
+        speech = classify_frames(energy_db, zcr, **self.thresholds)
+        self.frames_seen += n_frames
+        self.speech_frames_seen += int(np.count_nonzero(speech))
+
+        segments = []
+        for i in range(n_frames):
+            frame = samples[i * self.frame_len:(i + 1) * self.frame_len]
+            if not self._in_segment:
+                if not speech[i]:
+                    self._preroll.append(frame)
+                    continue
+                self._in_segment = True
+                self._chunks = self._carry + list(self._preroll)
+                self._segment_frames = len(self._carry)
+                self._speech_frames = self._carry_speech_frames
+                self._carry, self._carry_speech_frames = [], 0
+                self._preroll.clear()
+
+            self._chunks.append(frame)
+            self._segment_frames += 1
+            if speech[i]:
+                self._speech_frames += 1
+                self._silence_run = 0
+            else:
+                self._silence_run += 1
+
+            if self._silence_run >= self.hangover_frames or self._segment_frames >= self.max_segment_frames:
+                segment = self._close_segment()
+                if segment is not None:
+                    segments.append(segment)
+                    self.last_cuts.append((i + 1) * self.frame_len - carried)
+        return segments
+
+    def flush(self):
+        """Close whatever is buffered (e.g. when recording stops) and return it, or None."""
+        if self._in_segment:
+            segment = self._close_segment(final=True)
+        elif self._carry:
+            segment = np.concatenate(self._carry)
+            self.segments_emitted += 1
+        else:
+            segment = None
+        self._carry, self._carry_speech_frames = [], 0
+        self._pending = np.empty(0, dtype=np.int16)
+        self._preroll.clear()
+        return segment
+
+    def _close_segment(self, final=False):
+        chunks, segment_frames, speech_frames = self._chunks, self._segment_frames, self._speech_frames
+        self._reset_segment()
+
+        if speech_frames < self.min_speech_frames:
+            # A cough or a door slam; not worth a transcription call
+            self.segments_dropped += 1
+            return None
+        if segment_frames < self.min_segment_frames and not final:
+            # Too short to be worth its own round trip; prepend it to the next utterance
+            self._carry, self._carry_speech_frames = chunks, speech_frames
+            return None
+
+        self.segments_emitted += 1
+        return np.concatenate(chunks)
@@ -0,0 +1,10 @@
+# Scripts named like tests that drive a microphone, a window or a paid API, or rewrite the
+# checked-in logs; they are run by hand, not collected by pytest
+collect_ignore = [
+    "app_image_test.py",
+    "audio/logging_test.py",
+    "audio/test_audio_recorder.py",
+    "audio/test_script.py",
+    "image/test_generate_image.py",
+    "replay/load_test.py",
+]
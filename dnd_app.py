@@ -1,26 +1,26 @@
 import tkinter as tk
-from PIL import Image, ImageTk
-from audio.audio_record import AudioRecorder
-from audio.transcribe_audio import transcribe_audio
-from audio.analyze_text_for_image import analyze_text_for_image
-from image.generate_image_flux import generate_image_flux
 import threading
 import time
-import os
 from audio.memory_manager import MemoryManager
+from audio.memory_store import MemoryStore, STORE_PATH
+from audio.transcript_store import TranscriptStore, TRANSCRIPT_PATH
+from services.registry import ServiceRegistry, registry
+from services.event_log import setup_logging
 import logging
 
-# Set up logging to file and console
-logging.basicConfig(
-    filename="dnd_text_log.txt",
-    filemode="a",
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-logging.getLogger().addHandler(console_handler)
-logging.getLogger().handlers[0].flush()
+VAD_POLL_SECONDS = 0.25  # How often captured audio is handed to the VAD
+ARCHIVE_SEGMENTS = False  # Also write every speech segment to segment_<ts>.wav in the background
+ARCHIVE_SESSION = True  # Stream the whole session to rotating recording_<ts>.wav files
+ARCHIVE_FULL_RATE = False  # Capture and archive at 44.1 kHz; audio is then resampled just before upload
+TRANSCRIPTION_BACKEND = "google"  # "google", "local" (offline PocketSphinx) or "stub"
+TRANSCRIPTION_FALLBACK = "local"  # Used automatically when the primary is slow or down
+STREAMING_TRANSCRIPTION = False  # Decode speech while it is spoken with the offline engine
+MEMORY_STORE = STORE_PATH  # Campaign memory is journaled here and reloaded on start; None keeps it in memory only
+TRANSCRIPT_STORE = TRANSCRIPT_PATH  # Searchable transcripts linked to their audio and images; None keeps none
+WARMUP_DELAY_MS = 100  # Start loading audio and AI services this long after the window is shown
+
+# Log to dnd_text_log.txt, dnd_events.jsonl and the console from a background writer thread
+setup_logging()
 
 class DNDApp:
     def __init__(self, root):
@@ -28,12 +28,20 @@ class DNDApp:
         self.root.title("DND AI Art Companion")
         self.root.geometry("800x600")
 
-        # Set up memory manager and recorder
-        self.memory_manager = MemoryManager()
-        self.recorder = AudioRecorder(recording_callback=self.update_recording_indicator)
+        # Set up memory manager; recorder and pipeline come from the service registry
+        self.memory_manager = MemoryManager(store=MemoryStore(MEMORY_STORE) if MEMORY_STORE else None,
+                                            transcripts=TranscriptStore(TRANSCRIPT_STORE) if TRANSCRIPT_STORE else None)
+        self.recorder = self.vad = self.spooler = self.archive = None
+        self.pipeline = self.streaming = None
+        self.last_segment_ms = 0  # Timestamp in the name of the last spooled segment file
         self.recording = False
         self.lock = threading.Lock()
         self.current_image = None
+        # Capture and the scene pipeline pull in PyAudio, numpy, SpeechRecognition and the
+        # OpenAI SDK, so they are built on first use or warmed once the window is up
+        self.services = ServiceRegistry()
+        self.services.register("capture", self.start_capture)
+        self.services.register("pipeline", self.start_pipeline)
 
         # Set up GUI elements
         self.canvas = tk.Canvas(self.root, bg='black')
@@ -56,6 +64,42 @@ class DNDApp:
         self.recording_indicator = tk.Label(self.root, text="Mic is off", bg="black", fg="white", relief=tk.RAISED)
         self.recording_indicator.place(relx=0.85, rely=0.1, width=120, height=50)
 
+        self.root.after(WARMUP_DELAY_MS, self.warm_services)
+
+    def start_capture(self):
+        from audio.audio_record import AudioRecorder
+        from audio.resample import TARGET_RATE
+        from audio.vad import VoiceActivityDetector
+        from audio.segment_spooler import SegmentSpooler
+        from audio.session_archive import SessionArchive
+        self.recorder = AudioRecorder(recording_callback=self.update_recording_indicator,
+                                      target_rate=None if ARCHIVE_FULL_RATE else TARGET_RATE)
+        self.vad = VoiceActivityDetector(self.recorder.rate)
+        self.spooler = SegmentSpooler(self.recorder.rate) if ARCHIVE_SEGMENTS else None
+        self.archive = SessionArchive(rate=self.recorder.rate) if ARCHIVE_SESSION else None
+        return self.recorder
+
+    def start_pipeline(self):
+        from pipeline.scene_pipeline import build_scene_pipeline, StreamingFrontEnd
+        from audio.transcribe_audio import set_transcription_backend
+        rate = self.services.get("capture").rate
+        # Transcription, analysis and image generation run as separate stages, so a
+        # slow render never holds up the next segment
+        self.pipeline = build_scene_pipeline(
+            self.memory_manager, rate, on_image=self.display_image,
+            transcriber=set_transcription_backend(TRANSCRIPTION_BACKEND, TRANSCRIPTION_FALLBACK)).start()
+        self.streaming = StreamingFrontEnd(self.pipeline, rate) if STREAMING_TRANSCRIPTION else None
+        return self.pipeline
+
+    def warm_services(self):
+        self.services.warm(["capture", "pipeline"], on_done=self.services_ready)
+        registry.warm(["openai"])  # Loads the SDK now; without OPENAI_API_KEY analysis is just skipped
+
+    def services_ready(self, errors):
+        if errors:
+            message = "; ".join(f"{name}: {error}" for name, error in errors.items())
+            self.root.after(0, lambda: self.status_label.config(text=f"Not ready - {message}", fg="red"))
+
     def upload_character(self):
         character_description = self.character_entry.get()
         if character_description:
@@ -72,51 +116,90 @@ class DNDApp:
             self.start_recording()
 
     def start_recording(self):
+        try:
+            # Normally warm already; otherwise this waits for them to finish loading
+            self.services.get("capture")
+            self.services.get("pipeline")
+        except Exception as e:
+            logging.error(f"Cannot start recording: {e}")
+            self.status_label.config(text=f"Cannot start recording: {e}", fg="red")
+            return
         self.recording = True
         self.record_button.config(text="Stop Recording")
-        self.recorder.start_recording()
+        # The recorder captures through a PyAudio callback into its ring buffer,
+        # so no polling thread is needed and capture never waits on processing.
+        self.recorder.start_stream()
         self.update_recording_indicator(True)
-        threading.Thread(target=self.capture_audio_chunks, daemon=True).start()
         threading.Thread(target=self.process_audio, daemon=True).start()
 
     def stop_recording(self):
         self.recording = False
         self.record_button.config(text="Start Recording")
         self.update_recording_indicator(False)
+        self.recorder.stop_stream()
         with self.lock:
-            filename = f"recording_{int(time.time())}.wav"
-            success = self.recorder.stop_recording(filename)
-            if success:
-                logging.info(f"Final audio saved: {filename}")
-
-    def capture_audio_chunks(self):
-        while self.recording:
-            with self.lock:
-                self.recorder.record_chunk()
-            time.sleep(0.1)
+            # The utterance still being spoken when Stop is pressed is transcribed like any other
+            segments = self.consume_audio()
+            tail = self.vad.flush()
+            if tail is not None:
+                segments.append(tail)
+                if self.streaming:
+                    self.streaming.end_utterance()
+            if self.archive:
+                self.archive.close()
+                logging.info(f"Session audio saved: {', '.join(self.archive.files)}")
+        for segment in segments:
+            self.process_segment(segment)
+        logging.info(f"Capture stats: {self.recorder.stats()}")
+        logging.info(f"Pipeline stats: {self.pipeline.stats()}")
+
+    def consume_audio(self):
+        """Drain the recorder into the session archive and the VAD; return closed segments."""
+        samples = self.recorder.read_segment()
+        if self.archive:
+            self.archive.append(samples)
+        segments = self.vad.feed(samples)
+        if self.streaming and (self.vad.active or segments):
+            # Each utterance ends where the VAD cut it; audio after the cut belongs to the next one
+            start = 0
+            for cut in self.vad.last_cuts:
+                self.streaming.feed(samples[start:cut])
+                self.streaming.end_utterance()
+                start = cut
+            if self.vad.active and start < len(samples):
+                self.streaming.feed(samples[start:])
+        return segments
 
     def process_audio(self):
+        # Segments are cut by the VAD on pauses in speech instead of every 10 seconds,
+        # and windows with no speech never reach the network.
         while self.recording:
-            time.sleep(10)
-            filename = f"segment_{int(time.time())}.wav"
-
+            time.sleep(VAD_POLL_SECONDS)
             with self.lock:
-                logging.info("Processing audio...")
-                success = self.recorder.stop_recording(filename)
-
-                if success and os.path.exists(filename) and os.path.getsize(filename) > 0:
-                    logging.info("Transcribing audio...")
-                    text = transcribe_audio(filename)
-                    if text:
-                        logging.info("Analyzing text for image...")
-                        prompt = analyze_text_for_image(text, self.memory_manager)
-                        if prompt != "none":
-                            self.display_image(prompt)
-                self.recorder.start_recording()
-
-    def display_image(self, prompt):
-        image_path = generate_image_flux(prompt)
-        
+                segments = self.consume_audio()
+            for segment in segments:
+                self.process_segment(segment)
+
+    def process_segment(self, samples):
+        from pipeline.scene_pipeline import Segment
+        logging.info("Processing audio...")
+        started = time.time() - len(samples) / self.recorder.rate
+        # The transcript links to the segment's own file, or else to the session recording it is in
+        audio_path = self.archive.path if self.archive else None
+        if self.spooler:
+            # Millisecond names, kept unique even for segments closed in the same millisecond
+            self.last_segment_ms = max(time.time_ns() // 1_000_000, self.last_segment_ms + 1)
+            audio_path = f"segment_{self.last_segment_ms}.wav"
+            self.spooler.submit(audio_path, samples)
+        if len(samples) > 0 and not self.streaming:
+            self.pipeline.submit(Segment(samples, started, audio_path))
+
+    def display_image(self, image_path):
+        # Called from the pipeline's display worker; Tk must only be touched on its own thread
+        self.root.after(0, self.show_image, image_path)
+
+    def show_image(self, image_path):
+        from PIL import Image, ImageTk
         if image_path:
             img = Image.open(image_path)
             img = img.resize((self.root.winfo_width(), self.root.winfo_height()), Image.Resampling.LANCZOS)
@@ -2,41 +2,121 @@ import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from flask import Flask, render_template, request, jsonify
-from audio.audio_record import AudioRecorder
-from audio.transcribe_audio import transcribe_audio
-from audio.analyze_text_for_image import analyze_text_for_image
-from image.generate_image_flux import generate_image_flux
-import threading
+from flask import Flask, render_template, request, jsonify, g
+from audio.memory_manager import MemoryManager
+from audio.memory_store import MemoryStore, STORE_PATH
+from audio.transcript_store import TranscriptStore, TRANSCRIPT_PATH
+from audio.transcribe_audio import make_transcriber
+from pipeline.scene_pipeline import build_scene_pipeline, Segment
+from pipeline.sessions import SessionManager, SessionLimitError
+from audio.resample import TARGET_RATE
+import re
 import time
+import uuid
+import numpy as np
+
+SESSION_COOKIE = "dnd_session"  # Identifies a table's browser; every table gets its own recorder and pipeline
+CAMPAIGN_HEADER = "X-Campaign"  # Or ?campaign=...; tables naming the same campaign share its memory
+DEFAULT_CAMPAIGN = "default"  # Uses the same campaign and transcript files as the desktop app
+SESSION_TRANSCRIBE_WORKERS = 1  # One table produces a segment every few seconds at most
 
 app = Flask(__name__)
 
+
+def open_campaign(name):
+    if name == DEFAULT_CAMPAIGN:
+        return MemoryManager(store=MemoryStore(STORE_PATH), transcripts=TranscriptStore(TRANSCRIPT_PATH))
+    return MemoryManager(store=MemoryStore(f"campaign_{name}.db"),
+                         transcripts=TranscriptStore(f"transcripts_{name}.db"))
+
+
+def build_pipeline(session):
+    # A transcriber per table, so one table's slow uploads do not push every table onto the local engine
+    return build_scene_pipeline(session.campaign.memory_manager, TARGET_RATE,
+                                on_image=lambda path: sessions.on_image(session, path),
+                                transcribe_workers=SESSION_TRANSCRIBE_WORKERS, transcriber=make_transcriber(),
+                                session=session.id).start()
+
+
+sessions = SessionManager(open_campaign, build_pipeline)
+
+
+def make_recorder():
+    """Open the capture for a new recording (replay/load_test.py swaps in recorded audio)."""
+    from audio.audio_record import AudioRecorder  # PyAudio is only loaded once someone records
+    return AudioRecorder()
+
+
+def current_session():
+    """The calling table's open session, or None; only /start_recording creates one."""
+    return sessions.find(request.cookies.get(SESSION_COOKIE))
+
+
+def open_session():
+    """The calling table's session, created (with a new cookie) if it has none."""
+    session_id = request.cookies.get(SESSION_COOKIE)
+    if not session_id:
+        session_id = g.new_session = uuid.uuid4().hex
+    campaign = request.headers.get(CAMPAIGN_HEADER) or request.args.get("campaign") or DEFAULT_CAMPAIGN
+    return sessions.get(session_id, re.sub(r"[^\w-]", "_", campaign)[:64])
+
+
+@app.after_request
+def set_session_cookie(response):
+    if "new_session" in g:
+        response.set_cookie(SESSION_COOKIE, g.new_session, httponly=True, samesite="Lax")
+    return response
+
 @app.route('/')
 def home():
     return render_template('index.html')  # HTML file we'll create for the UI
 
 @app.route('/start_recording', methods=['POST'])
 def start_recording():
-    global recorder
-    recorder = AudioRecorder()
-    recorder.start_recording()
+    try:
+        session = open_session()
+    except SessionLimitError:
+        g.pop("new_session", None)
+        return jsonify({"status": "server busy, try again later"}), 503
+    with session.lock:
+        if session.recorder is not None:
+            session.recorder.close()
+        session.recorder = make_recorder()
+        session.recorder.start_stream()
     return jsonify({"status": "recording started"})
 
 @app.route('/stop_recording', methods=['POST'])
 def stop_recording():
-    filename = f"recording_{int(time.time())}.wav"
-    success = recorder.stop_recording(filename)
-    recorder.close()
-    
-    if success:
-        text = transcribe_audio(filename)
-        if text:
-            prompt = analyze_text_for_image(text)
-            if prompt != "none":
-                image_path = generate_image_flux(prompt)
-                return jsonify({"status": "recording stopped", "image": image_path})
+    session = current_session()
+    if session is None:
+        return jsonify({"status": "not recording"}), 409
+    with session.lock:
+        recorder, session.recorder = session.recorder, None
+        if recorder is None:
+            return jsonify({"status": "not recording"}), 409
+        recorder.stop_stream()
+        samples = np.array(recorder.read_segment())  # Copy out of the ring before closing
+        recorder.close()
+
+    if len(samples) > 0:
+        # Processing continues in the background; poll /latest_image for the result
+        session.pipeline.submit(Segment(samples, time.time() - len(samples) / TARGET_RATE, None))
+        return jsonify({"status": "processing"})
     return jsonify({"status": "no audio frames"})
 
+@app.route('/latest_image', methods=['GET'])
+def get_latest_image():
+    session = current_session()
+    if session is None:
+        return jsonify({"image": None, "version": 0, "pipeline": {}})
+    image = session.image
+    return jsonify({"image": image["path"], "version": image["version"], "pipeline": session.pipeline.stats()})
+
+@app.route('/sessions', methods=['GET'])
+def get_sessions():
+    return jsonify(sessions.stats())
+
 if __name__ == '__main__':
+    from services.event_log import setup_logging
+    setup_logging()
     app.run(debug=True)
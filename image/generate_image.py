@@ -1,11 +1,6 @@
-import os
-from openai import OpenAI
 from PIL import Image
-import requests
 from io import BytesIO
-
-# Initialize the OpenAI client with your API key
-client = OpenAI(api_key=os.environ['OPENAI_API_KEY'])
+from services.transport import get_transport, openai_client
 
 def generate_image(prompt, size="1024x1024"):
     """
@@ -17,7 +12,7 @@ def generate_image(prompt, size="1024x1024"):
     """
     try:
         # Create the image generation request using the correct method
-        response = client.images.generate(
+        response = openai_client().images.generate(
             prompt=prompt,
             n=1,
             size=size
@@ -26,7 +21,8 @@ def generate_image(prompt, size="1024x1024"):
         print("Generated Image URL:", image_url)
 
         # Fetch the image from the URL
-        image_response = requests.get(image_url)
+        image_response = get_transport().get(image_url)
+        image_response.raise_for_status()
         image = Image.open(BytesIO(image_response.content))
 
         # Save the image to a file
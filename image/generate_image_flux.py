@@ -1,53 +1,58 @@
 import os
-import requests
 import time
+import logging
 from PIL import Image
 from io import BytesIO
+from services.transport import get_transport
 
-def generate_image_flux(prompt, width=1024, height=768):
+BFL_API_URL = "https://api.bfl.ml/v1"
+POLL_SECONDS = 0.5
+GENERATION_TIMEOUT_SECONDS = 120  # Give up on a job that is not ready by then
+FAILED_STATUSES = ("Error", "Request Moderated", "Content Moderated", "Task not found")
+
+def generate_image_flux(prompt, width=1024, height=768, image_path="generated_image_flux.png"):
     """
     Generate an image using the Flux 1.1 Pro API.
 
     :param prompt: The text prompt to generate the image from.
     :param width: The width of the image (default is 1024).
     :param height: The height of the image (default is 768).
+    :param image_path: Where to save the image (default is generated_image_flux.png).
     :return: The path of the saved image file or None in case of failure.
     """
+    # BFL_API_URL can point at a local stand-in for replays and load tests
+    api_url = os.environ.get("BFL_API_URL", BFL_API_URL)
     try:
         # Prepend the prefix to the transcribed text
         prompt_prefix = "High-fantasy, photorealistic illustration for a DND campaign. The scene should evoke epic adventure, rich in detail, dramatic lighting, and set in a magical world. The story is about the following: "
         full_prompt = prompt_prefix + prompt
 
-        # Step 1: Send the image generation request
-        request = requests.post(
-            'https://api.bfl.ml/v1/flux-pro-1.1',
-            headers={
-                'accept': 'application/json',
-                'x-key': os.environ.get("BFL_API_KEY"),
-                'Content-Type': 'application/json',
-            },
+        # Step 1: Send the image generation request (pooled keep-alive connection, see services.transport).
+        # Once sent it is not retried, as that could start a second paid job; the polling GETs are retried
+        transport = get_transport()
+        headers = {
+            'accept': 'application/json',
+            'x-key': os.environ.get("BFL_API_KEY"),
+        }
+        response = transport.post(
+            f'{api_url}/flux-pro-1.1',
+            headers=headers,
             json={
                 'prompt': full_prompt,
                 'width': width,
                 'height': height,
             },
-        ).json()
-
-        request_id = request["id"]
+        )
+        response.raise_for_status()
+        request_id = response.json()["id"]
 
         # Step 2: Poll for the result
+        deadline = time.monotonic() + GENERATION_TIMEOUT_SECONDS
         while True:
-            time.sleep(0.5)
-            result = requests.get(
-                'https://api.bfl.ml/v1/get_result',
-                headers={
-                    'accept': 'application/json',
-                    'x-key': os.environ.get("BFL_API_KEY"),
-                },
-                params={
-                    'id': request_id,
-                },
-            ).json()
+            time.sleep(POLL_SECONDS)
+            response = transport.get(f'{api_url}/get_result', headers=headers, params={'id': request_id})
+            response.raise_for_status()
+            result = response.json()
 
             # Check if the result is ready
             if result["status"] == "Ready":
@@ -55,17 +60,23 @@ def generate_image_flux(prompt, width=1024, height=768):
                 print(f"Image URL: {image_url}")
 
                 # Step 3: Fetch the image from the URL
-                image_response = requests.get(image_url)
+                image_response = transport.get(image_url)
+                image_response.raise_for_status()
                 img = Image.open(BytesIO(image_response.content))
 
                 # Step 4: Save the image to a file
-                image_path = "generated_image_flux.png"  # You can adjust the name as needed
                 img.save(image_path)
 
                 return image_path  # Return the path to the saved image
 
+            elif result["status"] in FAILED_STATUSES:
+                print(f"Image generation failed: {result['status']}")
+                return None
+            elif time.monotonic() > deadline:
+                print(f"Image generation timed out after {GENERATION_TIMEOUT_SECONDS}s (status {result['status']})")
+                return None
             else:
-                print(f"Status: {result['status']}")
+                logging.debug(f"Status: {result['status']}")  # Every poll; rate limited by the log pipeline
     except Exception as e:
         print(f"Error occurred: {e}")
         return None
@@ -0,0 +1,226 @@
+import logging
+import threading
+import time
+from collections import deque
+
+LATENCY_SAMPLES = 1000  # Recent per-item timings kept by each stage for percentiles
+
+# Queue policies for what a stage does when its input queue is full
+BLOCK = "block"  # Wait for space: backpressure on the upstream stage
+DROP_NEWEST = "drop_newest"  # Discard the incoming item
+DROP_OLDEST = "drop_oldest"  # Discard the oldest waiting item to make room
+LATEST = "latest"  # Coalesce: only the most recent item is ever waiting
+
+_STOP = object()  # Sentinel that tells a worker to exit
+
+
+class StageQueue:
+    """Bounded queue with a configurable overflow policy."""
+
+    def __init__(self, maxsize, policy=BLOCK):
+        self.maxsize = max(1, maxsize) if policy != LATEST else 1
+        self.policy = policy
+        self.items = deque()
+        self.dropped = 0
+        self.high_water = 0
+        self._next_seq = 0  # Arrival order of items handed to workers
+        self._cond = threading.Condition()
+
+    def put(self, item, force=False):
+        """Add an item according to the policy. Returns False if the item was dropped."""
+        with self._cond:
+            if not force:
+                if self.policy == BLOCK:
+                    while len(self.items) >= self.maxsize:
+                        self._cond.wait()
+                elif len(self.items) >= self.maxsize:
+                    self.dropped += 1
+                    if self.policy == DROP_NEWEST:
+                        return False
+                    self.items.popleft()  # DROP_OLDEST and LATEST both evict the stale item
+            self.items.append(item)
+            self.high_water = max(self.high_water, len(self.items))
+            self._cond.notify_all()
+            return True
+
+    def get(self):
+        """Return (sequence number, item); sequence numbers follow arrival order."""
+        with self._cond:
+            while not self.items:
+                self._cond.wait()
+            item = self.items.popleft()
+            seq = None
+            if item is not _STOP:
+                seq = self._next_seq
+                self._next_seq += 1
+            self._cond.notify_all()
+            return seq, item
+
+    def __len__(self):
+        return len(self.items)
+
+
+class Stage:
+    """One step of a pipeline: a function run by a pool of worker threads.
+
+    `func` takes one item and returns the item for the next stage, or None to
+    stop that item here (for example "no image for this transcript").
+
+    With `ordered=True` results are handed downstream in arrival order even when
+    several workers finish out of order. Calls raising one of `retry_on` are
+    retried up to `retries` times with exponential backoff.
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=4, policy=BLOCK, ordered=False,
+                 retries=0, retry_on=(Exception,), retry_backoff=0.5):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = StageQueue(queue_size, policy)
+        self.next = None
+        self.ordered = ordered
+        self.retries = retries
+        self.retry_on = retry_on
+        self.retry_backoff = retry_backoff
+        self.processed = 0
+        self.errors = 0
+        self.retried = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.busy_seconds = 0.0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._release_lock = threading.Lock()
+        self._finished = {}  # seq -> result, waiting for earlier items (ordered mode)
+        self._next_release = 0
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            seq, item = self.queue.get()
+            if item is _STOP:
+                break
+            with self._lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            start = time.perf_counter()
+            result = self._call(item)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.in_flight -= 1
+                self.processed += 1
+                self.busy_seconds += elapsed
+                self.latencies.append(elapsed)
+            if self.ordered:
+                self._release_in_order(seq, result)
+            elif result is not None and self.next is not None:
+                self.next.queue.put(result)
+
+    def _call(self, item):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.func(item)
+            except self.retry_on as e:
+                if attempt < self.retries:
+                    with self._lock:
+                        self.retried += 1
+                    logging.warning(f"Pipeline stage {self.name} failed ({e}), retrying")
+                    time.sleep(self.retry_backoff * (2 ** attempt))
+                    continue
+                logging.error(f"Error in pipeline stage {self.name}: {e}")
+            except Exception as e:
+                logging.error(f"Error in pipeline stage {self.name}: {e}")
+            with self._lock:
+                self.errors += 1
+            return None
+
+    def _release_in_order(self, seq, result):
+        # Whoever completes the oldest outstanding item forwards every consecutive result
+        with self._release_lock:
+            self._finished[seq] = result
+            while self._next_release in self._finished:
+                ready = self._finished.pop(self._next_release)
+                self._next_release += 1
+                if ready is not None and self.next is not None:
+                    self.next.queue.put(ready)
+
+    def stop(self):
+        """Let the workers finish everything already queued, then exit."""
+        for _ in self._threads:
+            self.queue.put(_STOP, force=True)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def latency_percentile(self, q):
+        """Return the q-th percentile (0-100) of recent item latencies in seconds."""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))]
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "queued": len(self.queue),
+            "high_water": self.queue.high_water,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "reorder_waiting": len(self._finished),
+            "processed": self.processed,
+            "dropped": self.queue.dropped,
+            "retried": self.retried,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "p50_seconds": round(self.latency_percentile(50), 3),
+            "p95_seconds": round(self.latency_percentile(95), 3),
+        }
+
+
+class Pipeline:
+    """Chain of stages connected by bounded queues.
+
+    Every stage runs on its own workers, so segment N+1 can be transcribed while
+    segment N is still being analyzed or rendered.
+    """
+
+    def __init__(self, stages, on_stop=None):
+        self.stages = list(stages)
+        self.on_stop = on_stop  # Called once the stages have drained, to release what their functions share
+        for upstream, downstream in zip(self.stages, self.stages[1:]):
+            upstream.next = downstream
+        self.running = False
+
+    def start(self):
+        if not self.running:
+            for stage in self.stages:
+                stage.start()
+            self.running = True
+        return self
+
+    def submit(self, item, stage=None):
+        """Feed an item to the first stage, or to the stage with the given name.
+
+        Returns False if the stage's queue policy dropped the item.
+        """
+        target = self.stages[0] if stage is None else next(s for s in self.stages if s.name == stage)
+        return target.queue.put(item)
+
+    def stop(self):
+        """Drain every stage in order and stop the workers."""
+        if self.running:
+            for stage in self.stages:
+                stage.stop()
+            self.running = False
+            if self.on_stop is not None:
+                self.on_stop()
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import speech_recognition as sr
+from audio.transcribe_audio import transcribe_samples
+from audio.streaming_transcribe import StreamingTranscriber
+from audio.analyze_text_for_image import analyze_text_for_image
+from audio.resample import TARGET_RATE
+from image.generate_image_flux import generate_image_flux
+from pipeline.executor import Pipeline, Stage, BLOCK, LATEST
+
+# Default concurrency and queue sizes for each stage
+TRANSCRIBE_WORKERS = 3  # Segments are recognized in parallel and put back in capture order
+TRANSCRIBE_RETRIES = 2
+ANALYZE_WORKERS = 1  # Analysis updates the shared memory table, keep it serial
+GENERATE_WORKERS = 1
+QUEUE_SIZE = 8
+STABLE_PARTIAL_WORDS = 8  # Send stable partial text to analysis once this many new words are settled
+STREAM_QUEUE_SIZE = 256  # Audio blocks waiting for the streaming recognizer
+KEEP_IMAGES = True  # With a transcript store, save every image as scene_<ms>.png so transcripts can link to it
+
+# A speech segment with where it came from: `started` is the wall-clock time of its first
+# sample and `audio_path` the file it is archived in, if any. Plain sample arrays work too.
+Segment = namedtuple("Segment", "samples started audio_path")
+
+_END_OF_UTTERANCE = object()
+
+
+def common_prefix_length(sent, words):
+    """Number of leading words two hypotheses share, ignoring case and punctuation."""
+    count = 0
+    for a, b in zip(sent, words):
+        if a.strip(".,!?;:").lower() != b.strip(".,!?;:").lower():
+            break
+        count += 1
+    return count
+
+
+def build_scene_pipeline(memory_manager, rate, on_image, transcribe_workers=TRANSCRIBE_WORKERS,
+                         analyze_workers=ANALYZE_WORKERS, generate_workers=GENERATE_WORKERS,
+                         queue_size=QUEUE_SIZE, transcriber=None, image_path=None, session=None):
+    """Build the capture -> transcribe -> analyze -> generate -> display pipeline.
+
+    Submit int16 speech segments captured at `rate`; `on_image(path)` is called
+    with every generated image. Image generation only ever has the latest scene
+    waiting: if a new prompt arrives while one is rendering, the older pending
+    prompt is discarded. `transcriber` selects the speech backend for this
+    session (see audio.transcription_backends); the default is Google with a
+    local fallback. `image_path` overrides where generated images are saved.
+
+    When the memory manager has a transcript store, every transcript is
+    recorded there after analysis, linked to its audio (submit Segments to
+    pass it) and to the image it led to, under `session` (default: the
+    store's own session name).
+    """
+    transcripts = memory_manager.transcripts
+    # Keys of transcripts that produced a prompt, in order, until generation takes them; the
+    # LATEST queue drops superseded prompts, so their keys are linked to the image that replaced them
+    prompted_keys = []
+    prompted_lock = threading.Lock()
+    # Image decisions running beside memory updates (ANALYSIS_MODE=concurrent), one per analysis worker
+    decisions = ThreadPoolExecutor(max_workers=analyze_workers, thread_name_prefix="image-decision")
+
+    def transcribe(item):
+        samples, started, audio_path = item if isinstance(item, Segment) else (item, None, None)
+        logging.info("Transcribing audio...")
+        text = transcribe_samples(samples, rate, target_rate=TARGET_RATE, transcriber=transcriber,
+                                  raise_errors=True, save=False)
+        if not text:
+            return None
+        return text, started, started + len(samples) / rate if started else None, audio_path
+
+    def analyze(item):
+        # Text from the streaming front end or a replay arrives without its audio
+        text, started, ended, audio_path = item if isinstance(item, tuple) else (item, None, None, None)
+        logging.info("Analyzing text for image...")
+        prompt = analyze_text_for_image(text, memory_manager, executor=decisions)
+        key = None
+        if transcripts is not None:
+            # Recorded after the analysis, so entities it introduced count as mentions too
+            key = transcripts.add(text, started, ended, audio_path, memory_manager.entity_index.find(text), session)
+        if prompt == "none":
+            return None
+        if key:
+            with prompted_lock:
+                prompted_keys.append(key)
+        return prompt, key
+
+    def generate(item):
+        prompt, key = item
+        superseded = []
+        with prompted_lock:
+            if key in prompted_keys:
+                position = prompted_keys.index(key)
+                superseded, prompted_keys[:position + 1] = prompted_keys[:position], []
+        if image_path:
+            path = generate_image_flux(prompt, image_path=image_path)
+        elif transcripts is not None and KEEP_IMAGES:
+            path = generate_image_flux(prompt, image_path=f"scene_{int(time.time() * 1000)}.png")
+        else:
+            path = generate_image_flux(prompt)
+        if path and key:
+            transcripts.link_image(key, path, superseded)
+        return path
+
+    def display(image_path):
+        on_image(image_path)
+
+    return Pipeline([
+        Stage("transcribe", transcribe, transcribe_workers, queue_size, BLOCK, ordered=True,
+              retries=TRANSCRIBE_RETRIES, retry_on=(sr.RequestError,)),
+        Stage("analyze", analyze, analyze_workers, queue_size, BLOCK),
+        Stage("generate", generate, generate_workers, 1, LATEST),
+        Stage("display", display, 1, 1, LATEST),
+    ], on_stop=decisions.shutdown)
+
+
+class StreamingFrontEnd:
+    """Feeds live audio to a StreamingTranscriber and hands settled text to analysis.
+
+    Used instead of the pipeline's transcribe stage: stable partial hypotheses go
+    to the "analyze" stage as soon as STABLE_PARTIAL_WORDS new words are settled,
+    and the final hypothesis only contributes the words not already sent.
+    Sent words are compared with each new hypothesis by their longest common
+    prefix, so a hypothesis that re-segments earlier words neither drops nor
+    repeats the ones after the point where it differs.
+    """
+
+    def __init__(self, pipeline, rate, engine=None, min_words=STABLE_PARTIAL_WORDS):
+        self.pipeline = pipeline
+        self.min_words = min_words
+        self.transcriber = StreamingTranscriber(rate, engine, on_event=self._on_event)
+        self.submitted_words = []  # Words of the current utterance already sent to analysis
+        # Decoding is CPU heavy, so it runs on its own worker rather than the capture poll loop
+        self.stage = Stage("stream", self._handle, 1, STREAM_QUEUE_SIZE, BLOCK)
+        self.stage.start()
+
+    def feed(self, samples):
+        """Queue audio that belongs to the current utterance."""
+        self.stage.queue.put(np.array(samples, dtype=np.int16))
+
+    def end_utterance(self):
+        self.stage.queue.put(_END_OF_UTTERANCE)
+
+    def _handle(self, item):
+        if item is _END_OF_UTTERANCE:
+            self.transcriber.finish()
+        else:
+            self.transcriber.accept(item)
+
+    def _on_event(self, event):
+        words = event.stable_text.split()
+        sent = common_prefix_length(self.submitted_words, words)
+        if event.kind == "final":
+            new_words = words[sent:]
+            self.submitted_words = []
+        elif len(words) - sent >= self.min_words:
+            new_words = words[sent:]
+            self.submitted_words = words
+        else:
+            return
+        if new_words:
+            logging.info(f"Streaming transcript ({event.kind}): {' '.join(new_words)}")
+            self.pipeline.submit(" ".join(new_words), stage="analyze")
+
+    def stop(self):
+        self.stage.stop()
@@ -0,0 +1,278 @@
+import logging
+import threading
+import time
+import zlib
+from concurrent.futures import Future, wait
+
+SESSION_SHARDS = 16  # Sessions and campaigns are spread over this many independently locked shards
+SESSION_IDLE_SECONDS = 15 * 60  # A session with no requests for this long is closed
+EVICT_CHECK_SECONDS = 30  # How often idle sessions are looked for
+MAX_SESSIONS = 64  # Open sessions per process; each holds a pipeline, so new tables are turned away past this
+
+# Counters that add up across sessions; the other stage stats are maxima
+_SUMMED_STATS = ("workers", "queued", "in_flight", "reorder_waiting", "processed", "dropped", "retried", "errors",
+                 "busy_seconds")
+
+
+def merge_stage_stats(total, stats):
+    """Fold one pipeline's stats() into `total`: counts are summed, high waters and latencies are the worst."""
+    for stage, values in stats.items():
+        merged = total.setdefault(stage, {})
+        for name, value in values.items():
+            if name in _SUMMED_STATS:
+                merged[name] = round(merged.get(name, 0) + value, 3)
+            else:
+                merged[name] = max(merged.get(name, 0), value)
+    return total
+
+
+class SessionLimitError(Exception):
+    """Raised by SessionManager.get() when MAX_SESSIONS sessions are already open."""
+
+
+class Session:
+    """One table using the server: its own recorder, pipeline and latest image."""
+
+    def __init__(self, session_id, campaign):
+        self.id = session_id
+        self.campaign = campaign
+        self.pipeline = None
+        self.recorder = None
+        self.image = {"path": None, "version": 0}
+        self.lock = threading.Lock()  # Serializes this table's recorder calls
+        self.last_seen = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+        if self.pipeline is not None:
+            self.pipeline.stop()  # Finishes the segments already submitted
+
+
+class Campaign:
+    """A campaign's memory, shared by the sessions playing it."""
+
+    def __init__(self, name, memory_manager):
+        self.name = name
+        self.memory_manager = memory_manager
+        self.sessions = 0
+
+
+class _Shard:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = {}
+        self.pending = {}  # Key -> Future of an item being created outside the lock
+
+
+class SessionManager:
+    """Session-scoped scene pipelines for a server shared by many tables.
+
+    `open_campaign(name)` returns the MemoryManager of a campaign and
+    `build_pipeline(session)` a started pipeline for a new Session (with
+    `session.campaign.memory_manager` available). Sessions and campaigns live
+    in hashed shards with a lock each. Sessions and campaigns are built
+    outside the shard lock, so a slow pipeline or campaign load only holds up
+    requests for that same session or campaign.
+    Sessions idle for `idle_seconds` are closed by a background thread, and a
+    campaign is closed with its last session. At most `max_sessions` are open
+    at once: get() refuses to create more (SessionLimitError) rather than
+    close a table that may still be playing.
+    """
+
+    def __init__(self, open_campaign, build_pipeline, shards=SESSION_SHARDS, idle_seconds=SESSION_IDLE_SECONDS,
+                 check_seconds=EVICT_CHECK_SECONDS, max_sessions=MAX_SESSIONS):
+        self.open_campaign = open_campaign
+        self.build_pipeline = build_pipeline
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.open = 0
+        self.created = 0
+        self.evicted = 0
+        self.rejected = 0
+        self.images = 0
+        self._sessions = [_Shard() for _ in range(shards)]
+        self._campaigns = [_Shard() for _ in range(shards)]
+        self._stats_lock = threading.Lock()
+        self._closed_stages = {}  # Stage stats of sessions already closed
+        self._stop = threading.Event()
+        self._evictor = threading.Thread(target=self._evict_loop, args=(check_seconds,), name="session-evictor",
+                                         daemon=True)
+        self._evictor.start()
+
+    def _shard(self, shards, key):
+        return shards[zlib.crc32(key.encode("utf-8")) % len(shards)]
+
+    def find(self, session_id):
+        """The open session with this id, or None; never creates one."""
+        if not session_id:
+            return None
+        shard = self._shard(self._sessions, session_id)
+        with shard.lock:
+            session = shard.items.get(session_id)
+            if session is not None:
+                session.last_seen = time.monotonic()
+            return session
+
+    def get(self, session_id, campaign="default"):
+        """The session with this id, created on first use in `campaign`.
+
+        Raises SessionLimitError when it would be created past `max_sessions`.
+        A request arriving while the session is being created waits for it.
+        """
+        shard = self._shard(self._sessions, session_id)
+        with shard.lock:
+            session = shard.items.get(session_id)
+            pending = shard.pending.get(session_id)
+            creating = session is None and pending is None
+            if creating:
+                with self._stats_lock:
+                    if self.open >= self.max_sessions:
+                        self.rejected += 1
+                        raise SessionLimitError(f"{self.open} sessions already open")
+                    self.open += 1  # Reserved before building, so other shards cannot overshoot
+                pending = shard.pending[session_id] = Future()
+        if creating:
+            session = self._create(shard, session_id, campaign, pending)
+        elif session is None:
+            session = pending.result()  # Raises what the creating request raised
+        session.last_seen = time.monotonic()
+        return session
+
+    def _create(self, shard, session_id, campaign, pending):
+        try:
+            session = Session(session_id, self._join(campaign))
+            try:
+                session.pipeline = self.build_pipeline(session)
+            except Exception:
+                self._leave(session.campaign)
+                raise
+        except Exception as e:
+            with shard.lock:
+                del shard.pending[session_id]
+            with self._stats_lock:
+                self.open -= 1
+            pending.set_exception(e)
+            raise
+        with shard.lock:
+            del shard.pending[session_id]
+            shard.items[session_id] = session
+        with self._stats_lock:
+            self.created += 1
+        pending.set_result(session)
+        logging.info(f"Opened session {session_id} in campaign {campaign}")
+        return session
+
+    def _join(self, name):
+        shard = self._shard(self._campaigns, name)
+        while True:
+            with shard.lock:
+                campaign = shard.items.get(name)
+                if campaign is not None:
+                    campaign.sessions += 1
+                    return campaign
+                pending = shard.pending.get(name)
+                creating = pending is None
+                if creating:
+                    pending = shard.pending[name] = Future()
+            if creating:
+                break
+            pending.result()  # Then join it, unless its first session already left and closed it
+        try:
+            campaign = Campaign(name, self.open_campaign(name))
+        except Exception as e:
+            with shard.lock:
+                del shard.pending[name]
+            pending.set_exception(e)
+            raise
+        campaign.sessions = 1
+        with shard.lock:
+            del shard.pending[name]
+            shard.items[name] = campaign
+        pending.set_result(campaign)
+        return campaign
+
+    def _leave(self, campaign):
+        shard = self._shard(self._campaigns, campaign.name)
+        with shard.lock:
+            campaign.sessions -= 1
+            if campaign.sessions > 0:
+                return
+            del shard.items[campaign.name]
+        campaign.memory_manager.close()
+        logging.info(f"Closed campaign {campaign.name}")
+
+    def on_image(self, session, image_path):
+        session.image = {"path": image_path, "version": session.image["version"] + 1}
+        with self._stats_lock:
+            self.images += 1
+
+    def _close(self, session):
+        session.close()
+        with self._stats_lock:
+            merge_stage_stats(self._closed_stages, session.pipeline.stats())
+            self.open -= 1
+        self._leave(session.campaign)
+
+    def evict_idle(self, idle_seconds=None):
+        """Close every session idle for longer than `idle_seconds`. Returns how many were closed."""
+        cutoff = time.monotonic() - (self.idle_seconds if idle_seconds is None else idle_seconds)
+        idle = []
+        for shard in self._sessions:
+            with shard.lock:
+                for session_id in [i for i, s in shard.items.items() if s.last_seen < cutoff]:
+                    idle.append(shard.items.pop(session_id))
+        # Draining pipelines can take a while, so it happens outside the shard locks
+        for session in idle:
+            self._close(session)
+            logging.info(f"Closed idle session {session.id}")
+        with self._stats_lock:
+            self.evicted += len(idle)
+        return len(idle)
+
+    def _evict_loop(self, check_seconds):
+        while not self._stop.wait(check_seconds):
+            try:
+                self.evict_idle()
+            except Exception as e:
+                logging.error(f"Session eviction failed: {e}")
+
+    def sessions(self):
+        result = []
+        for shard in self._sessions:
+            with shard.lock:
+                result.extend(shard.items.values())
+        return result
+
+    def stage_stats(self):
+        """Pipeline stats of every session so far, merged with merge_stage_stats()."""
+        with self._stats_lock:
+            total = {stage: dict(values) for stage, values in self._closed_stages.items()}
+        for session in self.sessions():
+            merge_stage_stats(total, session.pipeline.stats())
+        return total
+
+    def stats(self):
+        campaigns = 0
+        for shard in self._campaigns:
+            with shard.lock:
+                campaigns += len(shard.items)
+        open_sessions = len(self.sessions())  # Shard locks are taken before the stats lock, never inside it
+        with self._stats_lock:
+            return {"sessions": open_sessions, "campaigns": campaigns, "created": self.created,
+                    "evicted": self.evicted, "rejected": self.rejected, "images": self.images}
+
+    def close(self):
+        """Stop evicting and close every session, letting their pipelines finish."""
+        self._stop.set()
+        self._evictor.join()
+        for shard in self._sessions:
+            with shard.lock:
+                pending = list(shard.pending.values())
+            wait(pending)  # Sessions still being created are closed with the rest
+            with shard.lock:
+                sessions, shard.items = list(shard.items.values()), {}
+            for session in sessions:
+                self._close(session)
@@ -0,0 +1,35 @@
+"""Helpers shared by the benchmark, replay and load-test scripts.
+
+The scripts import the app's packages, so they run as modules from the
+repository root, e.g. `python -m audio.benchmark_vad` or
+`python -m replay.load_test --synthetic`.
+"""
+import os
+import subprocess
+import wave
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def percentile(samples, q):
+    """The q-th percentile (0-100) of `samples` by nearest rank; 0.0 for no samples."""
+    samples = sorted(samples)
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))]
+
+
+def load_wav(path):
+    """Read a mono 16-bit wav file into an int16 array. Returns (samples, rate)."""
+    with wave.open(path, 'rb') as wf:
+        return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16), wf.getframerate()
+
+
+def git_revision():
+    """Short hash of the checked-out commit, so reports can be compared across commits."""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
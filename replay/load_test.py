@@ -0,0 +1,297 @@
+import argparse
+import glob
+import importlib.util
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+import httpx
+import numpy as np
+from audio.resample import TARGET_RATE, resample
+from replay.bench_util import ROOT, load_wav, git_revision, percentile
+from replay.replay_session import print_service_stats
+from replay.stub_services import StubServices, Cassette
+
+SESSION_HEADER = "X-Load-Session"  # Tells the playback recorder which simulated table is calling
+CAMPAIGN_HEADER = "X-Campaign"
+REQUEST_TIMEOUT = 30.0
+
+
+def synthetic_clip(seconds, rate=TARGET_RATE, seed=0):
+    """Speech-like test audio: noisy harmonics with a syllable-rate envelope."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    pitch = 120 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    voice = sum(np.sin(2 * np.pi * k * np.cumsum(pitch) / rate) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    signal = voice * envelope + 0.05 * rng.standard_normal(len(t))
+    return (signal / np.abs(signal).max() * 8000).astype(np.int16)
+
+
+def load_clips(wav_paths, rate=TARGET_RATE):
+    """Recorded segments, resampled to the rate the app captures at."""
+    clips = []
+    for path in wav_paths:
+        samples, file_rate = load_wav(path)
+        clips.append(resample(samples, file_rate, rate) if file_rate != rate else samples)
+    return clips
+
+
+class PlaybackRecorder:
+    """Stands in for AudioRecorder's streaming capture, playing a clip instead of the mic.
+
+    Audio "arrives" in real time (times `speed`) between start_stream() and
+    stop_stream(), so read_segment() returns as much as a microphone would have
+    captured. If the app reads it while serving a different session than the one
+    that started it, the read is counted in `misrouted`.
+    """
+
+    misrouted = 0
+    _lock = threading.Lock()
+
+    def __init__(self, clip, owner, rate=TARGET_RATE, speed=1.0):
+        self.clip = clip
+        self.owner = owner
+        self.rate = rate
+        self.speed = speed
+        self.streaming = False
+        self._pending = 0.0
+        self._offset = 0
+        self._since = None
+
+    def _advance(self):
+        if self.streaming:
+            now = time.monotonic()
+            self._pending += (now - self._since) * self.rate * self.speed
+            self._since = now
+
+    def start_stream(self):
+        self._since = time.monotonic()
+        self.streaming = True
+        return True
+
+    def stop_stream(self):
+        self._advance()
+        self.streaming = False
+
+    def read_segment(self):
+        from flask import request, has_request_context
+        self._advance()
+        count = int(self._pending)
+        self._pending -= count
+        if has_request_context() and request.headers.get(SESSION_HEADER) != self.owner:
+            with PlaybackRecorder._lock:
+                PlaybackRecorder.misrouted += 1
+        samples = np.take(self.clip, np.arange(self._offset, self._offset + count), mode="wrap")
+        self._offset = (self._offset + count) % len(self.clip)
+        return samples
+
+    def stats(self):
+        return {"overruns": 0, "dropped_frames": 0, "input_overflows": 0, "buffered_frames": int(self._pending)}
+
+    def close(self):
+        self.stop_stream()
+
+
+class LoadStats:
+    """Client-side latency and error counts per endpoint."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.outcomes = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def call(self, client, session, method, path, campaign=None):
+        """Make one request; returns the JSON body, or None on an error."""
+        endpoint = f"{method} {path}"
+        headers = {SESSION_HEADER: session}
+        if campaign:
+            headers[CAMPAIGN_HEADER] = campaign
+        start = time.perf_counter()
+        try:
+            response = client.request(method, path, headers=headers)
+            body = response.json() if response.status_code < 400 else None
+        except (httpx.HTTPError, ValueError) as e:
+            logging.debug(f"{endpoint} failed: {e!r}")
+            body = None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[endpoint].append(elapsed)
+            if body is None:
+                self.errors[endpoint] += 1
+            elif path == "/stop_recording":
+                self.outcomes[body.get("status", "unknown")] += 1
+        return body
+
+    def report(self, wall):
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": len(samples),
+                    "errors": self.errors[endpoint],
+                    "error_rate": round(self.errors[endpoint] / len(samples), 3),
+                    "per_second": round(len(samples) / wall, 2) if wall else 0.0,
+                    "p50_seconds": round(percentile(samples, 50), 3),
+                    "p99_seconds": round(percentile(samples, 99), 3),
+                }
+                for endpoint, samples in sorted(self.latencies.items())
+            }
+
+
+def run_session(base_url, session, segments, segment_seconds, speed, poll_seconds, delay, stats, campaign=None):
+    """One table: record, poll for images while talking, stop, repeat.
+
+    The client keeps the server's session cookie, like a browser would.
+    """
+    time.sleep(delay)
+    with httpx.Client(base_url=base_url, timeout=REQUEST_TIMEOUT) as client:
+        for _ in range(segments):
+            stats.call(client, session, "POST", "/start_recording", campaign)
+            end = time.monotonic() + segment_seconds / speed
+            while True:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(poll_seconds / speed, remaining))
+                if time.monotonic() < end:
+                    stats.call(client, session, "GET", "/latest_image", campaign)
+            stats.call(client, session, "POST", "/stop_recording", campaign)
+        stats.call(client, session, "GET", "/latest_image", campaign)
+
+
+def load_test(clips, sessions=4, segments=5, segment_seconds=15.0, speed=10.0, poll_seconds=2.0, cassette=None,
+              openai_latency="fixed:0", google_latency="fixed:0", bfl_latency="fixed:0", token_seconds=0.0,
+              seed=0, campaigns=None):
+    """Drive concurrent simulated sessions against flask/app.py with every remote service stubbed.
+
+    `speed` compresses time: each segment is `segment_seconds` of audio but is
+    "spoken" in segment_seconds / speed wall seconds. Tables play `campaigns`
+    different campaigns (default: one each). Returns a report dict with
+    client-side latency per endpoint plus the app's pipeline and transport stats.
+    """
+    campaigns = campaigns or sessions
+    stubs = StubServices(cassette, openai_latency, google_latency, bfl_latency, seed, token_seconds).start()
+    os.environ.update(stubs.env())
+    workdir = tempfile.mkdtemp(prefix="dnd_load_")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)  # Keep logs, transcripts and images out of the repository
+
+    # Imported only now so the app's clients pick up the stub endpoints
+    from werkzeug.serving import make_server
+    from services.transport import get_transport
+    spec = importlib.util.spec_from_file_location("dnd_flask_app", os.path.join(ROOT, "flask", "app.py"))
+    flask_app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(flask_app)
+
+    rng = random.Random(seed)
+
+    def make_recorder():
+        from flask import request
+        return PlaybackRecorder(rng.choice(clips), request.headers.get(SESSION_HEADER), speed=speed)
+
+    flask_app.make_recorder = make_recorder
+    PlaybackRecorder.misrouted = 0
+    server = make_server("127.0.0.1", 0, flask_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    stats = LoadStats()
+    ramp = segment_seconds / speed  # Sessions start spread over the first segment
+    threads = [
+        threading.Thread(target=run_session, args=(base_url, f"table-{i}", segments, segment_seconds, speed,
+                                                   poll_seconds, ramp * i / sessions, stats,
+                                                   f"campaign-{i % campaigns}"))
+        for i in range(sessions)
+    ]
+    start = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        requests_done = time.perf_counter() - start
+        session_stats = flask_app.sessions.stats()
+        flask_app.sessions.close()  # Let queued segments finish so their images are counted
+    finally:
+        server.shutdown()
+        os.chdir(previous_cwd)
+        stubs.stop()
+    wall = time.perf_counter() - start
+
+    return {
+        "revision": git_revision(),
+        "sessions": sessions,
+        "campaigns": campaigns,
+        "segments_per_session": segments,
+        "segment_seconds": segment_seconds,
+        "speed": speed,
+        "latency": {"openai": openai_latency, "openai_token": token_seconds, "google": google_latency,
+                    "bfl": bfl_latency},
+        "request_seconds": round(requests_done, 3),
+        "wall_seconds": round(wall, 3),
+        "http": stats.report(requests_done),
+        "segments": dict(stats.outcomes, misrouted=PlaybackRecorder.misrouted),
+        "images": flask_app.sessions.images,
+        "server_sessions": session_stats,
+        "requests": dict(stubs.requests),
+        "endpoints": get_transport().stats(),
+        "stages": flask_app.sessions.stage_stats(),
+    }
+
+
+def print_load_report(report):
+    print(f"Revision {report['revision']}: {report['sessions']} sessions in {report['campaigns']} campaigns x "
+          f"{report['segments_per_session']} segments of {report['segment_seconds']} s at {report['speed']}x; requests took "
+          f"{report['request_seconds']} s, pipeline drained after {report['wall_seconds']} s")
+    print(f"{'endpoint':<24}{'reqs':>6}{'errors':>8}{'err %':>7}{'req/s':>8}{'p50 s':>9}{'p99 s':>9}")
+    for name, s in report["http"].items():
+        print(f"{name:<24}{s['requests']:>6}{s['errors']:>8}{s['error_rate'] * 100:>7.1f}{s['per_second']:>8.2f}"
+              f"{s['p50_seconds']:>9.3f}{s['p99_seconds']:>9.3f}")
+    print(f"Segments: {report['segments']}, {report['images']} images; server {report['server_sessions']}")
+    print_service_stats(report)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the Flask app with concurrent simulated sessions.")
+    parser.add_argument("wavs", nargs="*", help="recordings to play (default: the checked-in segment_*.wav)")
+    parser.add_argument("--synthetic", action="store_true", help="use generated speech-like audio instead")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent tables")
+    parser.add_argument("--campaigns", type=int, help="campaigns the sessions play (default: one each)")
+    parser.add_argument("--segments", type=int, default=5, help="recordings per session")
+    parser.add_argument("--segment-seconds", type=float, default=15.0, help="audio captured per recording")
+    parser.add_argument("--speed", type=float, default=10.0, help="multiple of real time to run sessions at")
+    parser.add_argument("--poll-seconds", type=float, default=2.0, help="how often the page polls /latest_image")
+    parser.add_argument("--cassette", help="JSON cassette of recorded responses (default: built from the logs)")
+    parser.add_argument("--openai-latency", default="lognormal:0.8,0.3")
+    parser.add_argument("--google-latency", default="lognormal:1.2,0.3")
+    parser.add_argument("--bfl-latency", default="lognormal:8,0.2")
+    parser.add_argument("--openai-token-latency", type=float, default=0.02,
+                        help="seconds between streamed completion tokens")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report as JSON for comparison across commits")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # One line per request otherwise
+    if args.cassette:
+        cassette = Cassette.load(args.cassette)
+    else:
+        cassette = Cassette.from_logs(os.path.join(ROOT, "dnd_text_log.txt"),
+                                      os.path.join(ROOT, "transcription_memory.txt"))
+    if args.synthetic:
+        clips = [synthetic_clip(args.segment_seconds, seed=i) for i in range(8)]
+    else:
+        clips = load_clips([os.path.abspath(p) for p in args.wavs]
+                           or sorted(glob.glob(os.path.join(ROOT, "segment_*.wav")))[:8])
+
+    report = load_test(clips, args.sessions, args.segments, args.segment_seconds, args.speed, args.poll_seconds,
+                       cassette, args.openai_latency, args.google_latency, args.bfl_latency,
+                       args.openai_token_latency, args.seed, args.campaigns)
+    print_load_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
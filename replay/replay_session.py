@@ -0,0 +1,148 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import tempfile
+import time
+from replay.bench_util import ROOT, load_wav, git_revision
+from replay.stub_services import StubServices, Cassette
+
+
+def replay(wav_paths=(), transcripts=(), speed=0.0, cassette=None, openai_latency="fixed:0",
+           google_latency="fixed:0", bfl_latency="fixed:0", seed=0, transcribe_workers=None, token_seconds=0.0,
+           llm_cache=None):
+    """Run recorded audio or scripted transcripts through the real scene pipeline.
+
+    All network services are local stubs. Returns a report dict with per-stage
+    latency and throughput. `llm_cache` is a response cache file to reuse
+    across replays; by default each replay starts with an empty one.
+    """
+    stubs = StubServices(cassette, openai_latency, google_latency, bfl_latency, seed, token_seconds).start()
+    os.environ.update(stubs.env())
+    if llm_cache:
+        os.environ["LLM_CACHE_PATH"] = os.path.abspath(llm_cache)
+    workdir = tempfile.mkdtemp(prefix="dnd_replay_")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)  # Keep logs, transcripts and images out of the repository
+
+    # Imported only now so module-level API clients pick up the stub endpoints
+    from audio.memory_manager import MemoryManager
+    from audio.analyze_text_for_image import get_llm_cache
+    from services.transport import get_transport
+    from audio.transcribe_audio import set_transcription_backend
+    from pipeline.scene_pipeline import build_scene_pipeline, TRANSCRIBE_WORKERS
+
+    images = []
+    rate = load_wav(wav_paths[0])[1] if wav_paths else 16000
+    pipeline = build_scene_pipeline(
+        MemoryManager(), rate, on_image=images.append,
+        transcribe_workers=transcribe_workers or TRANSCRIBE_WORKERS,
+        transcriber=set_transcription_backend("google", None, cache_path=None),
+        image_path=os.path.join(workdir, "replay_image.png"),
+    ).start()
+
+    audio_seconds = 0.0
+    start = time.perf_counter()
+    try:
+        for path in wav_paths:
+            samples, file_rate = load_wav(path)
+            if file_rate != rate:
+                logging.warning(f"Skipping {path}: {file_rate} Hz does not match {rate} Hz")
+                continue
+            duration = len(samples) / rate
+            audio_seconds += duration
+            pipeline.submit(samples)
+            if speed > 0:
+                time.sleep(duration / speed)
+        for text in transcripts:
+            pipeline.submit(text, stage="analyze")
+            if speed > 0:
+                time.sleep(len(text.split()) * 0.4 / speed)  # Roughly 150 words per minute
+        pipeline.stop()
+    finally:
+        os.chdir(previous_cwd)
+        stubs.stop()
+    wall = time.perf_counter() - start
+
+    inputs = len(wav_paths) + len(transcripts)
+    cache = get_llm_cache()
+    return {
+        "revision": git_revision(),
+        "inputs": inputs,
+        "audio_seconds": round(audio_seconds, 1),
+        "speed": speed,
+        "latency": {"openai": openai_latency, "openai_token": token_seconds, "google": google_latency,
+                    "bfl": bfl_latency},
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(inputs / wall, 3) if wall else 0.0,
+        "images": len(images),
+        "requests": dict(stubs.requests),
+        "llm_cache": cache.stats() if cache else None,
+        "endpoints": get_transport().stats(),
+        "stages": pipeline.stats(),
+    }
+
+
+def print_report(report):
+    print(f"Revision {report['revision']}: {report['inputs']} inputs "
+          f"({report['audio_seconds']} s audio) in {report['wall_seconds']} s "
+          f"-> {report['throughput_per_second']}/s, {report['images']} images")
+    print_service_stats(report)
+
+
+def print_service_stats(report):
+    """Stub request counts, transport stats per endpoint and pipeline stage stats."""
+    print(f"Requests: {report['requests']}")
+    if report.get("llm_cache"):
+        print(f"LLM cache: {report['llm_cache']}")
+    for name, s in report.get("endpoints", {}).items():
+        print(f"  {name:<16}{s['requests']:>5} requests {s['errors']:>3} errors {s['retries']:>3} retries "
+              f"p50 {s['p50_seconds']:.3f}s p95 {s['p95_seconds']:.3f}s circuit {s['circuit']}")
+    print(f"{'stage':<12}{'done':>6}{'drop':>6}{'err':>5}{'p50 s':>9}{'p95 s':>9}{'busy s':>9}{'max q':>7}")
+    for name, s in report["stages"].items():
+        print(f"{name:<12}{s['processed']:>6}{s['dropped']:>6}{s['errors']:>5}{s['p50_seconds']:>9.3f}"
+              f"{s['p95_seconds']:>9.3f}{s['busy_seconds']:>9.2f}{s['high_water']:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a session offline against local service stubs.")
+    parser.add_argument("wavs", nargs="*", help="wav files to replay (default: the checked-in segment_*.wav)")
+    parser.add_argument("--transcripts", help="replay scripted transcripts (one per line) instead of audio")
+    parser.add_argument("--limit", type=int, help="only replay the first N inputs")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="multiple of real time to feed inputs at (0 = as fast as possible)")
+    parser.add_argument("--cassette", help="JSON cassette of recorded responses (default: built from the logs)")
+    parser.add_argument("--openai-latency", default="lognormal:0.8,0.3")
+    parser.add_argument("--google-latency", default="lognormal:1.2,0.3")
+    parser.add_argument("--bfl-latency", default="lognormal:8,0.2")
+    parser.add_argument("--openai-token-latency", type=float, default=0.02,
+                        help="seconds between streamed completion tokens")
+    parser.add_argument("--transcribe-workers", type=int)
+    parser.add_argument("--llm-cache", help="LLM response cache file to reuse (replaying twice is then almost free)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report as JSON for comparison across commits")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.cassette:
+        cassette = Cassette.load(args.cassette)
+    else:
+        cassette = Cassette.from_logs(os.path.join(ROOT, "dnd_text_log.txt"),
+                                      os.path.join(ROOT, "transcription_memory.txt"))
+
+    transcripts, wavs = [], []
+    if args.transcripts:
+        with open(args.transcripts) as f:
+            transcripts = [line.strip() for line in f if line.strip()]
+    else:
+        wavs = [os.path.abspath(p) for p in args.wavs] or sorted(glob.glob(os.path.join(ROOT, "segment_*.wav")))
+    if args.limit:
+        transcripts, wavs = transcripts[:args.limit], wavs[:args.limit]
+
+    report = replay(wavs, transcripts, args.speed, cassette, args.openai_latency, args.google_latency,
+                    args.bfl_latency, args.seed, args.transcribe_workers, args.openai_token_latency, args.llm_cache)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
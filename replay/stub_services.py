@@ -0,0 +1,287 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlparse, parse_qs
+from audio.transcript_store import transcript_lines
+
+# Matches the start of a record in dnd_text_log.txt
+LOG_RECORD = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3} - \w+ - ")
+
+
+class LatencyModel:
+    """Samples service latencies from a simple distribution.
+
+    Specs look like "fixed:0.5", "uniform:0.2,1.0", "normal:0.8,0.2" or
+    "lognormal:0.8,0.4" (median seconds, sigma of the log). Values are in seconds.
+    """
+
+    def __init__(self, spec="fixed:0", seed=None):
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+        self.random = random.Random(seed)
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{spec}'")
+
+    def sample(self):
+        if self.kind == "fixed":
+            value = self.args[0] if self.args else 0.0
+        elif self.kind == "uniform":
+            value = self.random.uniform(self.args[0], self.args[1])
+        elif self.kind == "normal":
+            value = self.random.gauss(self.args[0], self.args[1])
+        else:
+            value = self.args[0] * self.random.lognormvariate(0.0, self.args[1])
+        return max(0.0, value)
+
+
+class Cassette:
+    """Recorded responses, replayed round-robin per kind.
+
+    Kinds: "memory" (memory-update completions), "decision" (image-decision
+    completions), "transcript" (speech recognition results).
+    """
+
+    def __init__(self, responses=None):
+        self.responses = {k: list(v) for k, v in (responses or {}).items()}
+        self._position = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def next(self, kind, default=""):
+        with self._lock:
+            options = self.responses.get(kind)
+            if not options:
+                return default
+            value = options[self._position[kind] % len(options)]
+            self._position[kind] += 1
+            return value
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.responses, f, indent=2)
+
+    @classmethod
+    def from_logs(cls, log_path="dnd_text_log.txt", transcript_path="transcription_memory.txt"):
+        """Build a cassette from the raw model responses and transcripts of past sessions."""
+        records, current = [], None
+        with open(log_path, errors="replace") as f:
+            for line in f:
+                if LOG_RECORD.match(line):
+                    current = [LOG_RECORD.sub("", line, count=1)]
+                    records.append(current)
+                elif current is not None:
+                    current.append(line)
+
+        responses = {"memory": [], "decision": [], "transcript": []}
+        for record in records:
+            message = "".join(record).strip()
+            for marker, kind in (("Raw AI response for memory update:", "memory"),
+                                 ("Raw AI response for scene analysis:", "memory"),
+                                 ("Updated memory table:", "memory"),
+                                 ("Received AI response:", "decision"),
+                                 ("Raw AI response:", "decision")):
+                if message.startswith(marker):
+                    responses[kind].append(message[len(marker):].strip())
+                    break
+
+        # Either a transcript store or the transcription_memory.txt of older versions
+        responses["transcript"].extend(transcript_lines(transcript_path))
+        return cls(responses)
+
+
+def _placeholder_png():
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new("RGB", (64, 48), (90, 60, 120)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class StubServices:
+    """Local HTTP stand-ins for the OpenAI, Google speech and BFL Flux APIs.
+
+    Start it, then apply `env()` to os.environ before the clients are created so
+    every request goes to 127.0.0.1. Each endpoint sleeps for a latency drawn
+    from its LatencyModel and answers from the cassette. Streamed completions
+    send one word per event, `token_seconds` apart; `requests` counts the
+    tokens sent and the streams the client closed early.
+    """
+
+    def __init__(self, cassette=None, openai_latency="fixed:0", google_latency="fixed:0",
+                 bfl_latency="fixed:0", seed=None, token_seconds=0.0):
+        self.cassette = cassette or Cassette()
+        self.token_seconds = token_seconds  # Delay between streamed completion tokens
+        self.latency = {
+            "openai": LatencyModel(openai_latency, seed),
+            "google": LatencyModel(google_latency, seed),
+            "bfl": LatencyModel(bfl_latency, seed),
+        }
+        self.requests = defaultdict(int)
+        self._jobs = {}  # BFL job id -> time it becomes ready
+        self._lock = threading.Lock()
+        self._png = None
+        self.server = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """Environment variables that point the app's clients at this server."""
+        return {
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+            "OPENAI_API_KEY": "stub",
+            "GOOGLE_SPEECH_URL": f"{self.base_url}/speech-api/v2/recognize",
+            "BFL_API_URL": f"{self.base_url}/v1",
+            "BFL_API_KEY": "stub",
+        }
+
+    def start(self, port=0):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                services._dispatch(self, "POST", body)
+
+            def do_GET(self):
+                services._dispatch(self, "GET", b"")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def _count(self, endpoint, n=1):
+        with self._lock:
+            self.requests[endpoint] += n
+
+    def _reply(self, handler, status, payload, content_type="application/json"):
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _dispatch(self, handler, method, body):
+        url = urlparse(handler.path)
+        if method == "POST" and url.path.endswith("/chat/completions"):
+            self._count("openai")
+            time.sleep(self.latency["openai"].sample())
+            request = json.loads(body or b"{}")
+            completion = self._chat_completion(request)
+            if request.get("stream"):
+                self._stream_completion(handler, completion)
+            else:
+                # The whole reply is generated before anything is returned
+                tokens = len(completion["choices"][0]["message"]["content"].split())
+                time.sleep(self.token_seconds * tokens)
+                self._count("openai_tokens", tokens)
+                self._reply(handler, 200, completion)
+        elif method == "POST" and url.path.endswith("/speech-api/v2/recognize"):
+            self._count("google")
+            time.sleep(self.latency["google"].sample())
+            text = self.cassette.next("transcript", "the party walks into the tavern")
+            result = {"result": [{"alternative": [{"transcript": text, "confidence": 0.9}], "final": True}],
+                      "result_index": 0}
+            self._reply(handler, 200, ('{"result":[]}\n' + json.dumps(result) + "\n").encode("utf-8"))
+        elif method == "POST" and url.path.endswith("/flux-pro-1.1"):
+            self._count("bfl")
+            job_id = str(uuid.uuid4())
+            with self._lock:
+                self._jobs[job_id] = time.monotonic() + self.latency["bfl"].sample()
+            self._reply(handler, 200, {"id": job_id})
+        elif method == "GET" and url.path.endswith("/get_result"):
+            self._count("bfl_poll")
+            job_id = parse_qs(url.query).get("id", [""])[0]
+            with self._lock:
+                ready_at = self._jobs.get(job_id)
+            if ready_at is None:
+                self._reply(handler, 200, {"id": job_id, "status": "Task not found"})
+            elif time.monotonic() < ready_at:
+                self._reply(handler, 200, {"id": job_id, "status": "Pending"})
+            else:
+                self._reply(handler, 200, {"id": job_id, "status": "Ready",
+                                           "result": {"sample": f"{self.base_url}/images/{job_id}.png"}})
+        elif method == "GET" and url.path.startswith("/images/"):
+            self._count("image_download")
+            if self._png is None:
+                self._png = _placeholder_png()
+            self._reply(handler, 200, self._png, "image/png")
+        else:
+            self._reply(handler, 404, {"error": f"no stub for {method} {url.path}"})
+
+    def _stream_completion(self, handler, completion):
+        """Send a completion as server-sent events, the way the OpenAI API streams."""
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+
+        def event(delta, finish_reason=None):
+            chunk = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"],
+                     "model": completion["model"],
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            handler.wfile.flush()
+
+        content = completion["choices"][0]["message"]["content"]
+        try:
+            event({"role": "assistant", "content": ""})
+            for token in re.findall(r"\s*\S+", content):
+                if self.token_seconds:
+                    time.sleep(self.token_seconds)
+                event({"content": token})
+                self._count("openai_tokens")
+            event({}, "stop")
+            handler.wfile.write(b"data: [DONE]\n\n")
+            handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self._count("openai_aborted")
+
+    def _chat_completion(self, request):
+        prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+        if prompt.startswith("Summarize the following notes"):
+            # History compaction: the notes themselves, cut to a summary's length
+            notes = [line[2:] for line in prompt.splitlines() if line.startswith("- ")]
+            content = " ".join(" ".join(notes).split()[:40])
+        elif "memory table" in prompt:
+            content = self.cassette.next("memory", "Characters: {}\nItems: {}\nLocations: {}\nRecent activity: []")
+            if "generate image" in prompt:  # Combined scene analysis also wants the image decision
+                content += "\n" + self.cassette.next("decision", "generate image: a quiet tavern at dusk")
+        else:
+            content = self.cassette.next("decision", "generate image: a quiet tavern at dusk")
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-3.5-turbo"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        }
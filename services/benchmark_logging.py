@@ -0,0 +1,103 @@
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+from services.event_log import setup_logging, stop_logging, stats, TEXT_FORMAT
+from audio.memory_manager import MemoryManager, ENTITY_CATEGORIES
+from audio.benchmark_entity_index import make_name
+from audio.benchmark_memory_context import describe
+from replay.bench_util import percentile
+
+
+class SlowFileHandler(logging.FileHandler):
+    """A file handler on a slow or busy disk: every write takes `latency` seconds longer."""
+
+    def __init__(self, path, latency):
+        super().__init__(path)
+        self.latency = latency
+
+    def emit(self, record):
+        time.sleep(self.latency)
+        super().emit(record)
+
+
+def percentiles(timings):
+    """p50, p99 and max in microseconds."""
+    return tuple(percentile(timings, q) * 1e6 for q in (50, 99, 100))
+
+
+def hot_loop(calls):
+    """The same log line from a tight loop, like a per-chunk capture message."""
+    timings = []
+    for i in range(calls):
+        start = time.perf_counter()
+        logging.info(f"Recorded chunk of size: {8192 + i % 3} bytes")
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings)
+
+
+def memory_updates(entities, updates, full_table, rng):
+    """apply_update() on a campaign of `entities`, optionally logging the whole table after each one."""
+    memory_manager = MemoryManager()
+    for _ in range(entities):
+        memory_manager.update_memory(rng.choice(ENTITY_CATEGORIES), make_name(rng), describe(rng))
+    names = [(c, n) for c in ENTITY_CATEGORIES for n in memory_manager.memory_table[c]]
+    timings = []
+    for _ in range(updates):
+        update = {category: {} for category in ENTITY_CATEGORIES}
+        for category, name in rng.sample(names, 3):
+            update[category][name] = describe(rng)
+        start = time.perf_counter()
+        memory_manager.apply_update(update)
+        if full_table:
+            memory_manager.log_memory_table()  # What every update used to do
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings)
+
+
+def run(calls, entities, updates, disk_latency, seed=0):
+    workdir = tempfile.mkdtemp(prefix="dnd_logging_")
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+
+    # Before: a synchronous file handler on the root logger, full table after each update
+    handler = SlowFileHandler(os.path.join(workdir, "sync_log.txt"), disk_latency)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.addHandler(handler)
+    hot_before = hot_loop(calls)
+    memory_before = memory_updates(entities, updates, True, random.Random(seed))
+    root.removeHandler(handler)
+
+    # After: queue handler with a background writer, rate limiting and delta-only memory logging
+    listener = setup_logging(os.path.join(workdir, "events.jsonl"), os.path.join(workdir, "text_log.txt"),
+                             console=False)
+    for writer in listener.handlers:
+        writer.emit = (lambda emit: lambda record: (time.sleep(disk_latency), emit(record)))(writer.emit)
+    hot_after = hot_loop(calls)
+    memory_after = memory_updates(entities, updates, False, random.Random(seed))
+    pipeline_stats = stats()
+    stop_logging()
+
+    print(f"Disk latency {disk_latency * 1000:.2f} ms per record")
+    print(f"{'':<40}{'p50 us':>10}{'p99 us':>10}{'max us':>10}")
+    for label, (p50, p99, worst) in (
+            ("hot-loop log line, synchronous", hot_before), ("hot-loop log line, queued", hot_after),
+            (f"apply_update at {entities} entities, before", memory_before),
+            (f"apply_update at {entities} entities, after", memory_after)):
+        print(f"{label:<40}{p50:>10.1f}{p99:>10.1f}{worst:>10.1f}")
+    print(f"Log pipeline: {pipeline_stats}")
+    for name in sorted(os.listdir(workdir)):
+        print(f"  {name}: {os.path.getsize(os.path.join(workdir, name)) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure what logging costs the capture and analysis paths.")
+    parser.add_argument("--calls", type=int, default=5000, help="hot-loop log calls")
+    parser.add_argument("--entities", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=50)
+    parser.add_argument("--disk-latency", type=float, default=0.0001, help="extra seconds per written record")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.calls, args.entities, args.updates, args.disk_latency, args.seed)
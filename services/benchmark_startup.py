@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Modules the app and the tools import at startup
+MODULES = [
+    "dnd_app",
+    "pipeline.scene_pipeline",
+    "audio.analyze_text_for_image",
+    "image.generate_image",
+    "services.registry",
+]
+
+
+def import_seconds(module, env):
+    """Time importing `module` in a fresh interpreter. Returns (seconds, error or None)."""
+    code = ("import time; start = time.perf_counter(); import importlib; "
+            f"importlib.import_module({module!r}); print(time.perf_counter() - start)")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    return float(result.stdout.strip().splitlines()[-1]), None
+
+
+def run(modules, repeats):
+    env_without_key = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    env_with_key = dict(env_without_key, OPENAI_API_KEY="sk-benchmark")
+    print(f"{'module':<32}{'no key ms':>11}{'with key ms':>13}")
+    for module in modules:
+        row, errors = [], []
+        for env in (env_without_key, env_with_key):
+            timings, error = [], None
+            for _ in range(repeats):
+                seconds, error = import_seconds(module, env)
+                if error:
+                    break
+                timings.append(seconds)
+            row.append(f"{statistics.median(timings) * 1000:.0f}" if not error else "error")
+            if error and error not in errors:
+                errors.append(error)
+        print(f"{module:<32}{row[0]:>11}{row[1]:>13}")
+        for error in errors:
+            print(f"    {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how long the app's modules take to import.")
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeats", type=int, default=5, help="fresh interpreters per measurement")
+    args = parser.parse_args()
+    run(args.modules, args.repeats)
@@ -0,0 +1,154 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+EVENT_LOG_PATH = "dnd_events.jsonl"  # Machine-readable log, one JSON object per line
+TEXT_LOG_PATH = "dnd_text_log.txt"  # The readable log (replays build their cassettes from it)
+LOG_MAX_BYTES = 5 * 1024 * 1024  # Log files are rotated at this size
+LOG_BACKUPS = 3  # Rotated files kept per log
+MAX_QUEUED = 10000  # Records waiting for the writer; beyond this new ones are dropped, never waited on
+RATE_LIMIT = 5  # INFO/DEBUG records per second allowed from one line of code
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the fields of log_event() events kept structured."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "event", None):
+            entry["event"] = record.event
+            entry["fields"] = record.fields
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most `limit` INFO/DEBUG records per second through from each line of code.
+
+    Warnings, errors and log_event() events always pass. The first record let
+    through after some were suppressed carries their count in `record.suppressed`.
+    """
+
+    def __init__(self, limit=RATE_LIMIT):
+        super().__init__()
+        self.limit = limit
+        self.windows = {}  # (pathname, lineno) -> [window start, count, suppressed]
+        self.suppressed = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or getattr(record, "event", None):
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= 1.0:
+                window = self.windows[key] = [now, 0, window[2] if window else 0]
+            window[1] += 1
+            if window[1] > self.limit:
+                window[2] += 1
+                self.suppressed += 1
+                return False
+            record.suppressed, window[2] = window[2], 0
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the writer falls behind."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(jsonl_path=EVENT_LOG_PATH, text_path=TEXT_LOG_PATH, console=True, level=logging.INFO):
+    """Send all logging through a queue to a background writer thread.
+
+    Logging calls only put the record on a queue. The writer appends JSONL to
+    `jsonl_path` and readable lines to `text_path` (either may be None),
+    rotating both, and echoes to the console if asked. Safe to call more than
+    once; returns the running QueueListener.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return _listener
+        handlers = []
+        if jsonl_path:
+            handler = logging.handlers.RotatingFileHandler(jsonl_path, maxBytes=LOG_MAX_BYTES,
+                                                           backupCount=LOG_BACKUPS, encoding="utf-8", delay=True)
+            handler.setFormatter(JsonFormatter())
+            handlers.append(handler)
+        if text_path:
+            handler = logging.handlers.RotatingFileHandler(text_path, maxBytes=LOG_MAX_BYTES,
+                                                           backupCount=LOG_BACKUPS, encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+            handlers.append(handler)
+        if console:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+            handlers.append(handler)
+
+        _queue_handler = DroppingQueueHandler(queue.Queue(MAX_QUEUED))
+        _queue_handler.addFilter(RateLimitFilter())
+        root = logging.getLogger()
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+@atexit.register  # Flush what is still queued on exit
+def stop_logging():
+    """Write out everything queued, stop the writer thread and close the log files."""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = _queue_handler = None
+
+
+def log_event(event, level=logging.INFO, **fields):
+    """Log a structured event; its fields stay separate in the JSONL log."""
+    logging.getLogger("events").log(level, "%s %s", event, fields, extra={"event": event, "fields": fields})
+
+
+def stats():
+    """Records dropped because the queue was full and suppressed by rate limiting."""
+    handler = _queue_handler
+    if handler is None:
+        return {"dropped": 0, "suppressed": 0}
+    return {"dropped": handler.dropped,
+            "suppressed": sum(f.suppressed for f in handler.filters if isinstance(f, RateLimitFilter))}
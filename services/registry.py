@@ -0,0 +1,101 @@
+import importlib
+import logging
+import threading
+import time
+
+
+class ServiceRegistry:
+    """Named services that are only built when first needed.
+
+    A factory is a callable, or a "module:attribute" string naming one, so the
+    module is not even imported until the service is used. `warm()` builds
+    services on a background thread (e.g. once the window is up); a `get()`
+    that races with warming simply waits for the same instance.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._errors = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.load_seconds = {}
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+            self._instances.pop(name, None)
+            self._errors.pop(name, None)
+
+    def get(self, name):
+        """Return the service, building it on first use. Errors from its factory propagate."""
+        if name in self._instances:
+            return self._instances[name]
+        if name not in self._factories:
+            raise KeyError(f"Unknown service '{name}'. Registered: {', '.join(self._factories)}")
+        with self._locks[name]:
+            if name not in self._instances:
+                factory = self._factories[name]
+                if isinstance(factory, str):
+                    module, _, attribute = factory.partition(":")
+                    factory = getattr(importlib.import_module(module), attribute)
+                start = time.perf_counter()
+                try:
+                    instance = factory()
+                except Exception as e:
+                    self._errors[name] = e
+                    raise
+                self.load_seconds[name] = time.perf_counter() - start
+                self._errors.pop(name, None)
+                self._instances[name] = instance
+                logging.info(f"Service '{name}' ready in {self.load_seconds[name]:.2f}s")
+        return self._instances[name]
+
+    def loaded(self, name):
+        return name in self._instances
+
+    def warm(self, names=None, on_done=None):
+        """Build services in the background. `on_done(errors)` gets {name: exception} for failures.
+
+        Failures (e.g. missing credentials) are logged, not raised; the service
+        is simply retried on its next get().
+        """
+        names = list(names or self._factories)
+
+        def run():
+            errors = {}
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logging.warning(f"Service '{name}' could not be started: {e}")
+                    errors[name] = e
+            if on_done:
+                on_done(errors)
+
+        thread = threading.Thread(target=run, name="service-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def reset(self, name=None):
+        """Forget built instances so they are created again on next use."""
+        with self._lock:
+            for key in ([name] if name else list(self._instances)):
+                self._instances.pop(key, None)
+
+    def stats(self):
+        return {
+            name: {
+                "loaded": name in self._instances,
+                "load_seconds": round(self.load_seconds[name], 3) if name in self.load_seconds else None,
+                "error": repr(self._errors[name]) if name in self._errors else None,
+            }
+            for name in self._factories
+        }
+
+
+# Process-wide services shared by every module
+registry = ServiceRegistry()
+registry.register("transport", "services.transport:get_transport")
+registry.register("openai", "services.transport:openai_client")
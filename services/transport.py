@@ -0,0 +1,282 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+import httpx
+
+MAX_CONNECTIONS = 100  # Per process; every table's pipeline draws from this one pool
+MAX_KEEPALIVE_CONNECTIONS = 50
+KEEPALIVE_SECONDS = 30  # Idle pooled connections are closed after this
+CONNECT_TIMEOUT = 5.0
+DEFAULT_TIMEOUT = 30.0  # Read/write timeout for endpoints not listed below
+RETRIES = 2  # Extra attempts after a connection error, timeout, 429 or 5xx
+BACKOFF_SECONDS = 0.5  # Base of the jittered exponential backoff between attempts
+MAX_BACKOFF_SECONDS = 8.0
+BREAKER_THRESHOLD = 5  # Consecutive failures that open an endpoint's circuit
+BREAKER_COOLDOWN_SECONDS = 30  # How long an open circuit rejects calls before letting one probe through
+LATENCY_SAMPLES = 1000  # Recent request timings kept per endpoint for percentiles
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+# Failures that happen before the request reaches the server, so even a POST can be sent again
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Read timeouts per endpoint, in seconds
+ENDPOINT_TIMEOUTS = {
+    "openai": 60.0,
+    "openai_images": 120.0,
+    "bfl": 30.0,
+    "bfl_poll": 10.0,
+    "image_download": 60.0,
+}
+
+# Request path patterns mapped to endpoint names; anything else is named after its host
+ENDPOINT_PATTERNS = [
+    (re.compile(r"/chat/completions$"), "openai"),
+    (re.compile(r"/images/generations$"), "openai_images"),
+    (re.compile(r"/flux-pro-1\.1$"), "bfl"),
+    (re.compile(r"/get_result$"), "bfl_poll"),
+    (re.compile(r"\.(png|jpe?g|webp)$|/images/"), "image_download"),
+]
+
+
+def endpoint_name(url):
+    """Name used for counters, timeouts and the circuit breaker of a request URL."""
+    parsed = urlparse(str(url))
+    for pattern, name in ENDPOINT_PATTERNS:
+        if pattern.search(parsed.path):
+            return name
+    return parsed.hostname or "unknown"
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stops calling an endpoint after repeated failures.
+
+    After `threshold` consecutive failures the circuit opens and calls are
+    rejected for `cooldown` seconds. Then a single probe is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.probing or time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                if self.opened_at is None or self.probing:
+                    logging.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.breaker = CircuitBreaker()
+
+    def latency_percentile(self, q):
+        samples = sorted(self.latencies)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))]
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "p50_seconds": round(self.latency_percentile(50), 3),
+            "p95_seconds": round(self.latency_percentile(95), 3),
+            "circuit": self.breaker.state,
+        }
+
+
+class InstrumentedTransport(httpx.BaseTransport):
+    """httpx transport that counts, times and circuit-breaks every request per endpoint.
+
+    It sits under the shared client, so it also sees requests made by SDKs
+    (like OpenAI's) that were handed that client.
+    """
+
+    def __init__(self, transport, registry):
+        self.transport = transport
+        self.registry = registry
+
+    def handle_request(self, request):
+        name = endpoint_name(request.url)
+        stats = self.registry.endpoint(name)
+        if not stats.breaker.allow():
+            with self.registry.lock:
+                stats.rejected += 1
+            raise CircuitOpenError(f"Circuit open for {name}", request=request)
+
+        start = time.perf_counter()
+        try:
+            response = self.transport.handle_request(request)
+        except httpx.TransportError:
+            with self.registry.lock:
+                stats.requests += 1
+                stats.errors += 1
+            stats.breaker.record_failure()
+            raise
+        with self.registry.lock:
+            stats.requests += 1
+            stats.latencies.append(time.perf_counter() - start)  # Time to response headers
+            if response.status_code >= 500 or response.status_code == 429:
+                stats.errors += 1
+        if response.status_code >= 500 or response.status_code == 429:
+            stats.breaker.record_failure()
+        else:
+            stats.breaker.record_success()
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class Transport:
+    """One pooled keep-alive HTTP client shared by every remote call in the app.
+
+    Use `request()` (or `get()`/`post()`) for direct calls: it applies the
+    endpoint's timeout and retries connection errors, timeouts, 429 and 5xx
+    with jittered exponential backoff. Non-idempotent methods (POST) are only
+    retried when the connection was never made, since a timed out or failed
+    POST may already have started a job that a retry would duplicate.
+    `client` is the underlying httpx.Client for SDKs that accept one; their
+    requests are still counted and circuit broken, but they do their own
+    retrying.
+    """
+
+    def __init__(self, retries=RETRIES, timeouts=None):
+        self.retries = retries
+        self.timeouts = dict(ENDPOINT_TIMEOUTS, **(timeouts or {}))
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                              keepalive_expiry=KEEPALIVE_SECONDS)
+        self.client = httpx.Client(
+            transport=InstrumentedTransport(httpx.HTTPTransport(limits=limits), self),
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=CONNECT_TIMEOUT),
+            follow_redirects=True,
+        )
+
+    def endpoint(self, name):
+        with self.lock:
+            if name not in self.endpoints:
+                self.endpoints[name] = EndpointStats()
+            return self.endpoints[name]
+
+    def timeout(self, name):
+        return httpx.Timeout(self.timeouts.get(name, DEFAULT_TIMEOUT), connect=CONNECT_TIMEOUT)
+
+    def request(self, method, url, retries=None, **kwargs):
+        name = endpoint_name(url)
+        kwargs.setdefault("timeout", self.timeout(name))
+        retries = self.retries if retries is None else retries
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                response = self.client.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt >= retries or not idempotent:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except CircuitOpenError:
+                raise
+            except httpx.TransportError as e:
+                if attempt >= retries or not (idempotent or isinstance(e, UNSENT_ERRORS)):
+                    raise
+                reason = repr(e)
+            attempt += 1
+            delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** attempt))
+            stats = self.endpoint(name)
+            with self.lock:
+                stats.retries += 1
+            logging.info(f"Retrying {name} in {delay:.2f}s (attempt {attempt + 1}, {reason})")
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        """Per-endpoint request, error, retry and rejection counts with latency percentiles."""
+        with self.lock:
+            return {name: stats.as_dict() for name, stats in self.endpoints.items()}
+
+    def close(self):
+        self.client.close()
+
+
+_transport = None
+_openai_client = None
+_lock = threading.Lock()
+
+
+def get_transport():
+    """The process-wide Transport, created on first use."""
+    global _transport
+    with _lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
+
+
+def openai_client():
+    """The process-wide OpenAI client, sharing the pooled transport.
+
+    Reads OPENAI_API_KEY (and OPENAI_BASE_URL, if set) from the environment.
+    """
+    global _openai_client
+    if _openai_client is not None:
+        return _openai_client
+    if not os.environ.get("OPENAI_API_KEY"):
+        raise RuntimeError("OPENAI_API_KEY is not set; LLM analysis and OpenAI images are unavailable")
+    from openai import OpenAI  # Imported here: the SDK alone takes a noticeable part of a second to load
+    transport = get_transport()
+    with _lock:
+        if _openai_client is None:
+            _openai_client = OpenAI(api_key=os.environ['OPENAI_API_KEY'], http_client=transport.client,
+                                    timeout=transport.timeout("openai"), max_retries=RETRIES)
+        return _openai_client